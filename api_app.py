@@ -1,8 +1,16 @@
 import os
-import json
-from fastapi import FastAPI, HTTPException
+import base64
+import binascii
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+
+from my_agent import core
+from my_agent.jobs import JobQueue, WorkerPool
+from my_agent.orders import IdempotencyConflict, get_order_dispatcher
+from my_agent.tracing import read_trace_file, tracer
 
 app = FastAPI(title="Medical Reports API")
 
@@ -15,49 +23,141 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-DATASETS_DIR = os.path.join(os.path.dirname(__file__), 'datasets')
-REPORTS_SUMMARY_FILE = os.path.join(DATASETS_DIR, 'reports_summary.json')
-DOCTORS_FILE = os.path.join(DATASETS_DIR, 'doctors.json')
-APPOINTMENTS_FILE = os.path.join(DATASETS_DIR, 'appointments.json')
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", os.path.join(core.DATASETS_DIR, 'jobs.sqlite3'))
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+# Traces hold conversation metadata and the API has no auth, so /debug/traces is off unless asked for
+DEBUG_TRACES_ENABLED = os.environ.get("DEBUG_TRACES_ENABLED", "0").lower() in ("1", "true", "yes")
 
-def _load_reports_summary():
-    if not os.path.exists(REPORTS_SUMMARY_FILE):
-        return []
-    try:
-        with open(REPORTS_SUMMARY_FILE, 'r') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return []
-
-def _load_doctors():
-    if not os.path.exists(DOCTORS_FILE):
-        return {}
-    try:
-        with open(DOCTORS_FILE, 'r') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return {}
-
-def _load_appointments():
-    if not os.path.exists(APPOINTMENTS_FILE):
-        return []
-    try:
-        with open(APPOINTMENTS_FILE, 'r') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return []
+INGEST_REPORT_JOB = "ingest_report"
+# Uploads may only add reports, never replace the data files kept alongside them
+REPORT_UPLOAD_EXTENSIONS = ('', '.txt', '.pdf', '.png', '.jpg', '.jpeg', '.webp')
+RESERVED_FILENAMES = frozenset(
+    os.path.basename(path) for path in (core.APPOINTMENTS_FILE, core.DOCTORS_FILE, core.REPORTS_SUMMARY_FILE, core.RARE_DISEASES_FILE)
+)
+
+def _run_ingest_report(payload: dict) -> dict:
+    return core.ingest_report(payload["filename"])
+
+job_queue = JobQueue(JOBS_DB_PATH)
+worker_pool = WorkerPool(job_queue, {INGEST_REPORT_JOB: _run_ingest_report}, num_workers=INGEST_WORKERS)
+
+@app.on_event("startup")
+def _start_workers():
+    worker_pool.start()
+    # Sends any orders a previous run left in the outbox
+    get_order_dispatcher()
+
+@app.on_event("shutdown")
+def _stop_workers():
+    worker_pool.stop()
+    get_order_dispatcher().stop()
+
+class ReportUpload(BaseModel):
+    filename: str
+    content: Optional[str] = None
+    content_base64: Optional[str] = None
 
 @app.get("/reports")
 async def list_reports():
     """Lists all available medical report summaries."""
-    summaries = _load_reports_summary()
+    summaries = core._load_reports_summary()
     return JSONResponse(content={"status": "success", "reports": summaries})
 
+# A plain def, so FastAPI runs the file write and the SQLite enqueue in its threadpool, off the event loop
+@app.post("/reports", status_code=202)
+def upload_report(upload: ReportUpload):
+    """Stores a report and queues it for ingestion. Poll the returned job for the summary."""
+    safe_filename = os.path.basename(upload.filename)
+    if not safe_filename:
+        raise HTTPException(status_code=400, detail="A filename is required")
+    if (safe_filename.startswith('.') or safe_filename in RESERVED_FILENAMES
+            or os.path.isdir(os.path.join(core.DATASETS_DIR, safe_filename))):
+        raise HTTPException(status_code=400, detail=f"'{safe_filename}' is not a valid report filename")
+    if os.path.splitext(safe_filename)[1].lower() not in REPORT_UPLOAD_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Reports must be text, PDF or image files (.txt, .pdf, .png, .jpg, .jpeg, .webp)")
+    if (upload.content is None) == (upload.content_base64 is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of 'content' or 'content_base64'")
+    
+    if upload.content is not None:
+        data = upload.content.encode('utf-8')
+    else:
+        try:
+            data = base64.b64decode(upload.content_base64, validate=True)
+        except (binascii.Error, ValueError):
+            raise HTTPException(status_code=400, detail="'content_base64' is not valid base64")
+    
+    os.makedirs(core.DATASETS_DIR, exist_ok=True)
+    try:
+        # Exclusive create, so two uploads with the same name cannot replace each other's report
+        with open(os.path.join(core.DATASETS_DIR, safe_filename), 'xb') as f:
+            f.write(data)
+    except FileExistsError:
+        raise HTTPException(status_code=409, detail=f"A report named '{safe_filename}' already exists")
+    
+    job_id = job_queue.enqueue(INGEST_REPORT_JOB, {"filename": safe_filename})
+    return JSONResponse(status_code=202, content={
+        "status": "accepted",
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}"
+    })
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Reports the status of a background job, and its result once finished."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content={
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "error": job["error"]
+    })
+
+class MedicineOrder(BaseModel):
+    medicine_name: str
+    quantity: int
+
+def _order_response(order: dict) -> dict:
+    return {
+        "order_id": order["id"],
+        "status": order["status"],
+        "medicine_name": order["medicine_name"],
+        "quantity": order["quantity"],
+        "pharmacy_order_id": order["pharmacy_order_id"],
+        "attempts": order["attempts"],
+        "error": order["error"]
+    }
+
+@app.post("/orders", status_code=202)
+def create_order(order: MedicineOrder, idempotency_key: str = Header(...)):
+    """Queues a medicine order. Sending the same Idempotency-Key again returns the original order."""
+    if order.quantity <= 0:
+        raise HTTPException(status_code=400, detail="'quantity' must be at least 1")
+    try:
+        saved, created = get_order_dispatcher().submit(idempotency_key, order.medicine_name, order.quantity)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return JSONResponse(status_code=202 if created else 200, content={
+        **_order_response(saved),
+        "status_url": f"/orders/{saved['id']}"
+    })
+
+@app.get("/orders/{order_id}")
+def get_order(order_id: str):
+    """Reports the status of a medicine order: pending, sending, placed or failed."""
+    order = get_order_dispatcher().outbox.get(order_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return JSONResponse(content=_order_response(order))
+
 @app.get("/reports/{filename}")
 async def get_report_detail(filename: str):
     """Retrieves the full content of a specific report."""
     safe_filename = os.path.basename(filename)
-    file_path = os.path.join(DATASETS_DIR, safe_filename)
+    file_path = os.path.join(core.DATASETS_DIR, safe_filename)
     
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Report not found")
@@ -72,15 +172,49 @@ async def get_report_detail(filename: str):
 @app.get("/doctors")
 async def list_doctors():
     """Lists all available doctors."""
-    doctors = _load_doctors()
+    doctors = core._load_doctors()
     return JSONResponse(content=doctors)
 
 @app.get("/appointments")
 async def list_appointments():
     """Lists all scheduled appointments."""
-    appointments = _load_appointments()
+    appointments = core._load_appointments()
     return JSONResponse(content={"status": "success", "appointments": appointments})
 
+@app.get("/debug/traces")
+async def get_traces(
+    limit: int = 100,
+    trace_id: Optional[str] = None,
+    kind: Optional[str] = None,
+    name: Optional[str] = None,
+    min_duration_ms: float = 0,
+    source: str = "memory"
+):
+    """Recent tracing spans, most recent first.
+
+    `source=memory` queries the ring buffer of agents running in this process; `source=file` reads the
+    trace file, which also holds spans from agents running elsewhere (e.g. under `adk web`).
+    Returns 404 unless DEBUG_TRACES_ENABLED is set.
+    """
+    if not DEBUG_TRACES_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if source == "file":
+        spans = [
+            s for s in read_trace_file(limit=max(limit, 1000))
+            if (trace_id is None or s.get("trace_id") == trace_id)
+            and (kind is None or s.get("kind") == kind)
+            and (name is None or s.get("name") == name)
+            and s.get("duration_ms", 0) >= min_duration_ms
+        ][:limit]
+        return JSONResponse(content={"status": "success", "spans": spans})
+    if source != "memory":
+        raise HTTPException(status_code=400, detail="source must be 'memory' or 'file'")
+    return JSONResponse(content={
+        "status": "success",
+        "spans": tracer.recent(limit, trace_id, kind, name, min_duration_ms),
+        "summary": tracer.summary()
+    })
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
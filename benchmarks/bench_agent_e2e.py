@@ -0,0 +1,283 @@
+"""End-to-end benchmark of the agents over a corpus of scripted conversations.
+
+Each conversation in `conversations.json` (booking, rescheduling, saving a
+report, the report verification loop, research, a medicine order and an
+emergency) is a list of user turns, each with the fake model's replies for
+that turn: tool calls and text. The harness runs the corpus against the
+offline fake model at each concurrency level and reports, per level:
+
+- per-turn latency percentiles, tokens per turn, and throughput;
+- time spent in model calls and in tools per turn, from the tracing spans.
+  Tool time for the research agent includes its own model call.
+
+Tools run for real, on a copy of `datasets/` in a temporary folder, so every
+level starts from the same data. One unrecorded pass over the corpus runs
+first, to warm up. Save a run with `--output` and compare a
+later run to it with `--compare`. The process exits with status 1 if a metric
+regressed by more than `--max-regression`.
+
+    python benchmarks/bench_agent_e2e.py [--concurrency 1 8 32] [--output run.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "conversations.json")
+DATASET_FILES = ("appointments.json", "doctors.json", "reports_summary.json", "*.txt")
+
+# metric: True if higher is better
+COMPARED_METRICS = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "model_ms_per_turn": False,
+    "tool_ms_per_turn": False,
+    "tokens_per_turn": False,
+    "turns_per_s": True,
+}
+
+
+def percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def fake_model_config(corpus: list, latency_ms: float, sigma: float, seed: int) -> dict:
+    """Fake model config answering each scripted user message, and each sub-agent request, with its steps."""
+    scripts = []
+    for conversation in corpus:
+        scripts += [{"match": f"^{re.escape(turn['user'])}$", "steps": turn["steps"]} for turn in conversation["turns"]]
+        scripts += conversation.get("scripts", [])
+    return {
+        "latency_ms": {"distribution": "lognormal", "median": latency_ms, "sigma": sigma},
+        "seed": seed,
+        "scripts": scripts,
+    }
+
+
+def reset_datasets(core, source_dir: str, directory: str):
+    """Fresh copy of the dataset files in `directory`, with the tools pointed at it."""
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    for pattern in DATASET_FILES:
+        for path in glob.glob(os.path.join(source_dir, pattern)):
+            shutil.copy(path, directory)
+    core.DATASETS_DIR = directory
+    core.APPOINTMENTS_FILE = os.path.join(directory, "appointments.json")
+    core.DOCTORS_FILE = os.path.join(directory, "doctors.json")
+    core.REPORTS_SUMMARY_FILE = os.path.join(directory, "reports_summary.json")
+
+
+async def run_conversation(runner, conversation: dict, user_id: str) -> list:
+    from google.genai import types
+
+    session = await runner.session_service.create_session(
+        app_name=runner.app_name, user_id=user_id, state=dict(conversation.get("state", {}))
+    )
+    turns = []
+    for i, turn in enumerate(conversation["turns"]):
+        prompt_tokens = output_tokens = 0
+        invocations = set()
+        started = time.perf_counter()
+        message = types.Content(role="user", parts=[types.Part(text=turn["user"])])
+        async for event in runner.run_async(user_id=user_id, session_id=session.id, new_message=message):
+            invocations.add(event.invocation_id)
+            if event.usage_metadata:
+                prompt_tokens += event.usage_metadata.prompt_token_count or 0
+                output_tokens += event.usage_metadata.candidates_token_count or 0
+        turns.append({
+            "conversation": conversation["name"],
+            "turn": i,
+            "latency_ms": (time.perf_counter() - started) * 1000,
+            "tokens": prompt_tokens + output_tokens,
+            "invocations": invocations,
+        })
+    return turns
+
+
+async def run_level(runners: dict, corpus: list, concurrency: int, rounds: int) -> tuple:
+    """Runs `concurrency` workers, each going through `rounds` conversations in a row. Returns (turns, wall seconds)."""
+    async def worker(w: int) -> list:
+        turns = []
+        for r in range(rounds):
+            conversation = corpus[(w + r) % len(corpus)]
+            runner = runners[conversation.get("agent", "root_agent")]
+            turns += await run_conversation(runner, conversation, user_id=f"bench_{concurrency}_{w}_{r}")
+        return turns
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[worker(w) for w in range(concurrency)])
+    return [t for turns in results for t in turns], time.perf_counter() - started
+
+
+def add_span_times(turns: list, spans: list):
+    """Sets model_ms and tool_ms on each turn: the summed duration of its model-call and tool-call spans."""
+    by_trace = {}
+    for span in spans:
+        if span["kind"] in ("model", "tool"):
+            totals = by_trace.setdefault(span["trace_id"], {"model": 0.0, "tool": 0.0})
+            totals[span["kind"]] += span["duration_ms"]
+    for turn in turns:
+        turn["model_ms"] = sum(by_trace.get(i, {}).get("model", 0.0) for i in turn["invocations"])
+        turn["tool_ms"] = sum(by_trace.get(i, {}).get("tool", 0.0) for i in turn["invocations"])
+
+
+def summarize(turns: list, wall_s: float) -> dict:
+    latencies = [t["latency_ms"] for t in turns]
+    conversations = {}
+    for turn in turns:
+        conversations.setdefault(turn["conversation"], []).append(turn)
+    return {
+        "turns": len(turns),
+        "wall_s": round(wall_s, 3),
+        "turns_per_s": round(len(turns) / wall_s, 2),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "model_ms_per_turn": round(statistics.mean(t["model_ms"] for t in turns), 1),
+        "tool_ms_per_turn": round(statistics.mean(t["tool_ms"] for t in turns), 1),
+        "tokens_per_turn": round(statistics.mean(t["tokens"] for t in turns), 1),
+        "conversations": {
+            name: {
+                "p50_ms": round(percentile([t["latency_ms"] for t in group], 50), 1),
+                "tokens_per_turn": round(statistics.mean(t["tokens"] for t in group), 1),
+            }
+            for name, group in sorted(conversations.items())
+        },
+    }
+
+
+def print_level(concurrency: int, result: dict):
+    print(f"\nConcurrency {concurrency}: {result['turns']} turns in {result['wall_s']:.2f} s, {result['turns_per_s']:.1f} turns/s")
+    print(f"  latency p50 {result['p50_ms']:.0f} ms, p95 {result['p95_ms']:.0f} ms, p99 {result['p99_ms']:.0f} ms")
+    print(f"  per turn: model {result['model_ms_per_turn']:.0f} ms, tools {result['tool_ms_per_turn']:.0f} ms, "
+          f"{result['tokens_per_turn']:.0f} tokens")
+    print(f"  {'conversation':<20} {'p50_ms':>8} {'tokens/turn':>12}")
+    for name, entry in result["conversations"].items():
+        print(f"  {name:<20} {entry['p50_ms']:>8.0f} {entry['tokens_per_turn']:>12.0f}")
+
+
+def compare(current: dict, baseline: dict, max_regression: float, noise_floor_ms: float) -> list:
+    """Prints each metric against the baseline; returns the (level, metric) pairs that regressed.
+
+    Time metrics also have to grow by more than `noise_floor_ms`, so a tool
+    taking 3 ms instead of 2 does not count as a regression.
+    """
+    regressions = []
+    print(f"\nCompared with the baseline (regression threshold {max_regression:.0%}):")
+    print(f"  {'level':>5} {'metric':<18} {'baseline':>10} {'current':>10} {'change':>8}")
+    for level, result in current["levels"].items():
+        old = baseline["levels"].get(level)
+        if old is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = old[metric], result[metric]
+            change = (after - before) / before if before else 0.0
+            regressed = (-change if higher_is_better else change) > max_regression
+            if metric.endswith("_ms") or metric.endswith("_ms_per_turn"):
+                regressed = regressed and after - before > noise_floor_ms
+            if regressed:
+                regressions.append((level, metric))
+            print(f"  {level:>5} {metric:<18} {before:>10.1f} {after:>10.1f} {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--rounds", type=int, default=None, help="Conversations per worker (default: the corpus size)")
+    parser.add_argument("--latency-ms", type=float, default=150, help="Median fake model latency per call")
+    parser.add_argument("--latency-sigma", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with the results in this JSON file")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    parser.add_argument("--noise-floor-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with open(args.corpus, 'r') as f:
+        corpus = json.load(f)
+    rounds = args.rounds or len(corpus)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = fake_model_config(corpus, args.latency_ms, args.latency_sigma, args.seed)
+        with open(os.path.join(tmp, "fake_model.json"), 'w') as f:
+            json.dump(config, f)
+        os.environ["MEDICAL_AGENT_FAKE_MODEL"] = "1"
+        os.environ["FAKE_MODEL_CONFIG"] = os.path.join(tmp, "fake_model.json")
+        # Measure the agents, not the client-side rate limit
+        os.environ.setdefault("GEMINI_REQUESTS_PER_MINUTE", "1000000")
+        os.environ.setdefault("GEMINI_BURST", "1000000")
+        # Spans give the model and tool time; keep every span of the run, and keep the caches out of datasets/
+        os.environ["TRACING_ENABLED"] = "1"
+        os.environ["TRACE_FILE"] = os.path.join(tmp, "traces.jsonl")
+        os.environ["TRACE_BUFFER_SPANS"] = "10000000"
+        os.environ["RESEARCH_CACHE_DB"] = os.path.join(tmp, "research_cache.sqlite3")
+        os.environ["MEMORY_DB_PATH"] = os.path.join(tmp, "memory.sqlite3")
+        os.environ["ORDERS_DB_PATH"] = os.path.join(tmp, "orders.sqlite3")
+
+        from google.adk.runners import InMemoryRunner
+        from my_agent import agent, core
+        from my_agent.tracing import tracer
+
+        logging.getLogger("google_adk").setLevel(logging.ERROR)
+        source_dir = core.DATASETS_DIR
+        reset_datasets(core, source_dir, os.path.join(tmp, "datasets"))
+        runners = {
+            name: InMemoryRunner(agent=getattr(agent, name), app_name="bench")
+            for name in {c.get("agent", "root_agent") for c in corpus}
+        }
+
+        results = {
+            "config": {
+                "corpus": os.path.basename(args.corpus),
+                "conversations": len(corpus),
+                "rounds": rounds,
+                "latency_ms": args.latency_ms,
+                "latency_sigma": args.latency_sigma,
+                "seed": args.seed,
+                "fast_path_enabled": os.environ.get("FAST_PATH_ENABLED", "1"),
+            },
+            "levels": {},
+        }
+        print(f"Fake model latency: median {args.latency_ms:.0f} ms (lognormal, sigma {args.latency_sigma}); "
+              f"{len(corpus)} conversations, {rounds} per worker")
+        # One unrecorded pass, so first-use costs (lazy imports, index builds) are not in the first level
+        asyncio.run(run_level(runners, corpus, 1, len(corpus)))
+        for concurrency in args.concurrency:
+            reset_datasets(core, source_dir, os.path.join(tmp, "datasets"))
+            seen = len(tracer.recent(limit=10 ** 9))
+            turns, wall = asyncio.run(run_level(runners, corpus, concurrency, rounds))
+            # recent() is newest first, so this level's spans are the ones before those already seen
+            spans = tracer.recent(limit=10 ** 9)
+            add_span_times(turns, spans[:len(spans) - seen])
+            results["levels"][str(concurrency)] = summarize(turns, wall)
+            print_level(concurrency, results["levels"][str(concurrency)])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.output}")
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            print("\nNote: the baseline was run with a different configuration:", json.dumps(baseline.get("config")))
+        if compare(results, baseline, args.max_regression, args.noise_floor_ms):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Concurrent sessions in one process with the synchronous tools vs the async tools.
+
+Each session asks the root agent to read a different image report and then
+list appointments, against the offline fake model with a fixed latency per
+model call. The synchronous tools block the event loop for the length of the
+document upload and analysis, so sessions queue behind each other. The async
+tools let them overlap.
+
+    python benchmarks/bench_concurrent_sessions.py [--sessions 1 10 50] [--latency-ms 200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def write_config(directory: str, max_sessions: int, latency_ms: float) -> str:
+    scripts = [{
+        "match": rf"\bbench_{i}\b",
+        "steps": [
+            {"tool": "read_report", "args": {"report_name": f"bench_{i}.png"}},
+            {"tool": "list_appointments", "args": {}},
+            {"text": "Done."},
+        ],
+    } for i in range(max_sessions)]
+    path = os.path.join(directory, "fake_model.json")
+    with open(path, 'w') as f:
+        json.dump({"latency_ms": {"distribution": "fixed", "value": latency_ms}, "scripts": scripts}, f)
+    return path
+
+
+async def run_sessions(agent, count: int) -> dict:
+    from google.adk.runners import InMemoryRunner
+    from google.genai import types
+
+    runner = InMemoryRunner(agent=agent, app_name="bench")
+
+    async def session(i: int) -> float:
+        created = await runner.session_service.create_session(app_name="bench", user_id=f"user_{i}")
+        started = time.perf_counter()
+        message = types.Content(role="user", parts=[types.Part(text=f"Read report bench_{i} and list my appointments")])
+        async for _ in runner.run_async(user_id=created.user_id, session_id=created.id, new_message=message):
+            pass
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*[session(i) for i in range(count)])
+    wall = time.perf_counter() - started
+    return {
+        "wall_s": wall,
+        "sessions_per_s": count / wall,
+        "p50_s": statistics.median(latencies),
+        "max_s": max(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--latency-ms", type=float, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["MEDICAL_AGENT_FAKE_MODEL"] = "1"
+        os.environ["FAKE_MODEL_CONFIG"] = write_config(tmp, max(args.sessions), args.latency_ms)
+        # Measure the tools, not the client-side rate limit
+        os.environ.setdefault("GEMINI_REQUESTS_PER_MINUTE", "1000000")
+        os.environ.setdefault("GEMINI_BURST", "1000000")
+        os.environ.setdefault("FAST_PATH_ENABLED", "0")
+
+        from my_agent import agent, core
+
+        for i in range(max(args.sessions)):
+            with open(os.path.join(tmp, f"bench_{i}.png"), 'wb') as f:
+                f.write(b"\x89PNG\r\n\x1a\n" + bytes([i % 256]) * (64 + i))
+        for name in ("appointments.json", "doctors.json", "reports_summary.json"):
+            with open(os.path.join(core.DATASETS_DIR, name), 'r') as src, open(os.path.join(tmp, name), 'w') as dst:
+                dst.write(src.read())
+        core.DATASETS_DIR = tmp
+        core.APPOINTMENTS_FILE = os.path.join(tmp, "appointments.json")
+        core.DOCTORS_FILE = os.path.join(tmp, "doctors.json")
+        core.REPORTS_SUMMARY_FILE = os.path.join(tmp, "reports_summary.json")
+
+        # The async tools wrap the synchronous ones, which functools.wraps exposes as __wrapped__
+        sync_tools = [getattr(tool, "__wrapped__", tool) for tool in agent.root_agent.tools]
+        variants = (("sync", agent.root_agent.clone(update={"tools": sync_tools})), ("async", agent.root_agent))
+
+        print(f"Fake model latency per call: {args.latency_ms:.0f} ms")
+        print(f"{'sessions':>8} {'tools':<6} {'wall_s':>8} {'sessions/s':>11} {'p50_s':>7} {'max_s':>7}")
+        for count in args.sessions:
+            for name, variant in variants:
+                result = asyncio.run(run_sessions(variant, count))
+                print(f"{count:>8} {name:<6} {result['wall_s']:>8.2f} {result['sessions_per_s']:>11.2f} "
+                      f"{result['p50_s']:>7.2f} {result['max_s']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
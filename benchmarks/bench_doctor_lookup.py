@@ -0,0 +1,161 @@
+"""Doctor-name lookup over a generated directory of 50k doctors: latency and accuracy by kind of query.
+
+Each query names one doctor from the directory the way a model might: the
+exact key, lowercased without the title, with "Doctor" spelled out, with two
+letters swapped, or by last name only. For each kind it reports how often
+`get_doctor_schedule` resolved the intended doctor in one call, resolved a
+different doctor, or returned candidates with the intended doctor among
+them, and the p50/p99 latency. A last name alone is shared by many doctors,
+so those queries are expected to return candidates, and with only five
+candidates the intended doctor is usually not among them. The write columns
+show how the same queries resolve for tools that book or change appointments,
+which only accept an exact name; `write_wrong` must stay at zero.
+For comparison it also times a scan of every name with `difflib`, for a few
+queries. The process exits with status 1 if the p99 latency of any kind is
+over the target or any write resolved the wrong doctor.
+
+    python benchmarks/bench_doctor_lookup.py [--doctors 50000] [--queries 500] [--target-ms 20]
+"""
+import argparse
+import difflib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIRST_NAMES = (
+    "James Mary John Patricia Robert Jennifer Michael Linda William Elizabeth David Barbara Richard Susan Joseph "
+    "Jessica Thomas Sarah Charles Karen Christopher Nancy Daniel Lisa Matthew Betty Anthony Margaret Mark Sandra "
+    "Donald Ashley Steven Kimberly Paul Emily Andrew Donna Joshua Michelle Kenneth Carol Kevin Amanda Brian Melissa "
+    "George Deborah Timothy Stephanie Ronald Rebecca Edward Sharon Jason Laura Jeffrey Cynthia Ryan Kathleen Jacob "
+    "Amy Gary Angela Nicholas Shirley Eric Anna Jonathan Brenda Stephen Pamela Larry Emma Justin Nicole Scott Helen "
+    "Brandon Samantha Benjamin Katherine Samuel Christine Gregory Debra Alexander Rachel Frank Carolyn Raymond Janet "
+    "Priya Arjun Nikhil Ananya Wei Mei Hiroshi Yuki Omar Fatima Carlos Sofia Ahmed Aisha Ivan Olga"
+).split()
+LAST_NAMES = (
+    "Smith Johnson Williams Brown Jones Garcia Miller Davis Rodriguez Martinez Hernandez Lopez Gonzalez Wilson "
+    "Anderson Thomas Taylor Moore Jackson Martin Lee Perez Thompson White Harris Sanchez Clark Ramirez Lewis Robinson "
+    "Walker Young Allen King Wright Scott Torres Nguyen Hill Flores Green Adams Nelson Baker Hall Rivera Campbell "
+    "Mitchell Carter Roberts Gomez Phillips Evans Turner Diaz Parker Cruz Edwards Collins Reyes Stewart Morris "
+    "Morales Murphy Cook Rogers Gutierrez Ortiz Morgan Cooper Peterson Bailey Reed Kelly Howard Ramos Kim Cox Ward "
+    "Richardson Watson Brooks Chavez Wood James Bennett Gray Mendoza Ruiz Hughes Price Alvarez Castillo Sanders "
+    "Patel Myers Long Ross Foster Jimenez Powell Jenkins Perry Russell Sullivan Bell Coleman Butler Henderson Barnes "
+    "Gonzales Fisher Vasquez Simmons Romero Jordan Patterson Alexander Hamilton Graham Reynolds Griffin Wallace "
+    "Moreno West Cole Hayes Bryant Herrera Gibson Ellis Tran Medina Aguilar Stevens Murray Ford Castro Marshall "
+    "Owens Harrison Fernandez McDonald Woods Washington Kennedy Wells Vargas Henry Chen Freeman Webb Tucker Guzman "
+    "Burns Crawford Olson Simpson Porter Hunter Gordon Mendez Silva Shaw Snyder Mason Dixon Munoz Hunt Hicks Holmes "
+    "Palmer Wagner Black Robertson Boyd Rose Stone Salazar Fox Warren Mills Meyer Rice Schmidt Garza Daniels Ferguson "
+    "Nichols Stephens Soto Weaver Ryan Gardner Payne Grant Dunn Kelley Spencer Hawkins Arnold Pierce Vazquez Hansen "
+    "Peters Santos Hart Bradley Knight Elliott Cunningham Duncan Armstrong Hudson Carroll Lane Riley Andrews Alvarado "
+    "Ray Delgado Berry Perkins Hoffman Johnston Matthews Pena Richards Contreras Willis Carpenter Lawrence Sandoval "
+    "Mehta Sharma Gupta Tanaka Suzuki Wang Zhang Ivanov Kowalski Novak Rossi Bianchi Muller Schneider Dubois Moreau"
+).split()
+SPECIALTIES = (
+    "Cardiology Dermatology General Practice Neurology Oncology Pediatrics Psychiatry Radiology Orthopedics "
+    "Gastroenterology Endocrinology Nephrology Pulmonology Rheumatology Urology Ophthalmology Otolaryngology "
+    "Obstetrics Gynecology Hematology Infectious Disease Allergy Immunology Geriatrics Anesthesiology"
+).split()
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday")
+
+
+def make_directory(n: int, rng: random.Random) -> dict:
+    """`n` doctors with unique names: first and last name, and a middle initial once the pairs run out."""
+    doctors = {}
+    pairs = [(f, l) for f in FIRST_NAMES for l in LAST_NAMES]
+    rng.shuffle(pairs)
+    i = 0
+    while len(doctors) < n:
+        first, last = pairs[i % len(pairs)]
+        middle = f" {chr(65 + (i // len(pairs)) % 26)}." if i >= len(pairs) else ""
+        doctors[f"Dr. {first}{middle} {last}"] = {
+            "specialty": rng.choice(SPECIALTIES),
+            "free_time": [f"{rng.choice(DAYS)} {h:02d}:00-{h + 2:02d}:00" for h in rng.sample(range(8, 17), 2)],
+        }
+        i += 1
+    return doctors
+
+
+def swap_letters(text: str, rng: random.Random) -> str:
+    """`text` with two neighbouring letters of one word swapped."""
+    i = rng.choice([i for i in range(len(text) - 1) if text[i:i + 2].isalpha() and text[i] != text[i + 1]])
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+QUERY_KINDS = {
+    "exact": lambda name, rng: name,
+    "no_title": lambda name, rng: name[len("Dr. "):].lower(),
+    "doctor_title": lambda name, rng: "Doctor " + name[len("Dr. "):],
+    "typo": lambda name, rng: "Dr. " + swap_letters(name[len("Dr. "):], rng),
+    "last_name": lambda name, rng: "Dr. " + name.split()[-1],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--doctors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500, help="Queries per kind")
+    parser.add_argument("--baseline-queries", type=int, default=5, help="Queries timed with the difflib scan")
+    parser.add_argument("--target-ms", type=float, default=20, help="p99 lookup latency target")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from my_agent import core
+
+    rng = random.Random(args.seed)
+    doctors = make_directory(args.doctors, rng)
+    names = list(doctors)
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        core.DOCTORS_FILE = os.path.join(tmp, "doctors.json")
+        with open(core.DOCTORS_FILE, 'w') as f:
+            json.dump(doctors, f)
+        started = time.perf_counter()
+        core._doctor_index()
+        print(f"{args.doctors} doctors; index built in {(time.perf_counter() - started) * 1000:.0f} ms")
+        print(f"{'query':>12} {'resolved':>9} {'wrong':>6} {'in_candidates':>13} {'missed':>7} {'p50_ms':>7} {'p99_ms':>7} "
+              f"{'write_resolved':>14} {'write_wrong':>11}")
+
+        for kind, make_query in QUERY_KINDS.items():
+            resolved = wrong = candidates = write_resolved = write_wrong = 0
+            latencies = []
+            for name in rng.sample(names, args.queries):
+                query = make_query(name, rng)
+                started = time.perf_counter()
+                result = core.get_doctor_schedule(query)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if result.get("doctor") == name:
+                    resolved += 1
+                elif "doctor" in result:
+                    wrong += 1
+                elif any(c["name"] == name for c in result.get("candidates", [])):
+                    candidates += 1
+                written = core._doctor_index().resolve(query, exact_only=True)[0]
+                write_resolved += written == name
+                write_wrong += written is not None and written != name
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            missed = args.queries - resolved - wrong - candidates
+            print(f"{kind:>12} {resolved / args.queries:>9.1%} {wrong / args.queries:>6.1%} {candidates / args.queries:>13.1%} "
+                  f"{missed / args.queries:>7.1%} {statistics.median(latencies):>7.2f} {p99:>7.2f} "
+                  f"{write_resolved / args.queries:>14.1%} {write_wrong / args.queries:>11.1%}")
+            failed |= p99 > args.target_ms or write_wrong > 0
+
+        lowered = [n.lower() for n in names]
+        started = time.perf_counter()
+        for name in rng.sample(names, args.baseline_queries):
+            difflib.get_close_matches(QUERY_KINDS["typo"](name, rng).lower(), lowered, n=5)
+        scan_ms = (time.perf_counter() - started) * 1000 / args.baseline_queries
+        print(f"\nBaseline difflib scan of every name: {scan_ms:.0f} ms per query")
+
+    print(f"Lookup target: p99 <= {args.target_ms:.0f} ms for every kind of query and no write to the wrong doctor "
+          f"-> {'FAIL' if failed else 'PASS'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Load test: emergency time-to-dispatch while routine traffic saturates the model rate limit.
+
+Background workers run routine conversations from `conversations.json`
+(appointments, doctors, report review) back to back, so model calls queue on
+the client-side rate limit. Once that queue has built up, emergency
+conversations ("chest pain, send an ambulance") start at a fixed interval.
+Time-to-dispatch is the time from an emergency message to its
+`book_ambulance` call, as recorded by `priority_router`.
+
+The load runs twice, each in a fresh process: with priority lanes off and on.
+The process exits with status 1 if, with lanes on, the p95 time-to-dispatch
+is over the target.
+
+    python benchmarks/bench_emergency_priority.py [--workers 40] [--emergencies 5] [--target-ms 1000]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_agent_e2e import CORPUS, fake_model_config, percentile, reset_datasets, run_conversation  # noqa: E402
+
+ROUTINE = ("booking", "rescheduling", "report_review")
+EMERGENCY_CONVERSATION = "emergency"
+
+
+async def run_load(runner, corpus: list, args) -> dict:
+    """Routine workers until the emergencies are done; returns the latencies of both."""
+    routine = [c for c in corpus if c["name"] in ROUTINE]
+    emergency = next(c for c in corpus if c["name"] == EMERGENCY_CONVERSATION)
+    done = asyncio.Event()
+    routine_turns, emergency_turns = [], []
+
+    async def routine_worker(w: int):
+        r = 0
+        while not done.is_set():
+            routine_turns.extend(await run_conversation(runner, routine[(w + r) % len(routine)], user_id=f"routine_{w}_{r}"))
+            r += 1
+
+    started = time.perf_counter()
+    workers = [asyncio.create_task(routine_worker(w)) for w in range(args.workers)]
+    await asyncio.sleep(args.warmup_s)
+    for i in range(args.emergencies):
+        emergency_turns.extend(await run_conversation(runner, emergency, user_id=f"emergency_{i}"))
+        await asyncio.sleep(args.interval_s)
+    done.set()
+    await asyncio.gather(*workers)
+    wall = time.perf_counter() - started
+    return {
+        "routine_ms": [t["latency_ms"] for t in routine_turns],
+        "emergency_ms": [t["latency_ms"] for t in emergency_turns],
+        "routine_turns_per_s": len(routine_turns) / wall,
+    }
+
+
+def child(args):
+    """One run of the load, in this process; prints its results as JSON."""
+    with open(CORPUS, 'r') as f:
+        corpus = json.load(f)
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "fake_model.json"), 'w') as f:
+            json.dump(fake_model_config(corpus, args.latency_ms, 0.2, 0), f)
+        os.environ["FAKE_MODEL_CONFIG"] = os.path.join(tmp, "fake_model.json")
+        os.environ["RESEARCH_CACHE_DB"] = os.path.join(tmp, "research_cache.sqlite3")
+        os.environ["MEMORY_DB_PATH"] = os.path.join(tmp, "memory.sqlite3")
+        os.environ["ORDERS_DB_PATH"] = os.path.join(tmp, "orders.sqlite3")
+
+        from google.adk.runners import InMemoryRunner
+        from my_agent import agent, core
+        from my_agent.resilience import get_metrics
+
+        logging.getLogger("google_adk").setLevel(logging.ERROR)
+        reset_datasets(core, core.DATASETS_DIR, os.path.join(tmp, "datasets"))
+        runner = InMemoryRunner(agent=agent.root_agent, app_name="bench")
+        result = asyncio.run(run_load(runner, corpus, args))
+        stats = agent.priority_router.stats()
+        # With lanes off nothing is classified, so every dispatch counts as "missed"
+        dispatch = stats["time_to_dispatch"]["classified" if stats["enabled"] else "missed"]
+        result.update(dispatch=dispatch, guard=get_metrics())
+    print(json.dumps(result))
+
+
+def run(args, lanes: bool) -> dict:
+    env = {
+        **os.environ,
+        "PYTHONWARNINGS": "ignore",
+        "MEDICAL_AGENT_FAKE_MODEL": "1",
+        "PRIORITY_LANES_ENABLED": "1" if lanes else "0",
+        "GEMINI_REQUESTS_PER_MINUTE": str(args.rpm),
+        "GEMINI_BURST": str(args.burst),
+        "FAST_PATH_ENABLED": "0",
+        "TRACING_ENABLED": "0",
+    }
+    command = [sys.executable, os.path.abspath(__file__), "--child"] + [
+        f"--{name.replace('_', '-')}={value}" for name, value in vars(args).items() if name != "child"
+    ]
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    if result.returncode:
+        sys.exit(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workers", type=int, default=40, help="Concurrent routine conversations")
+    parser.add_argument("--emergencies", type=int, default=5)
+    parser.add_argument("--interval-s", type=float, default=1.0, help="Pause between emergencies")
+    parser.add_argument("--warmup-s", type=float, default=5.0, help="Routine load before the first emergency")
+    parser.add_argument("--rpm", type=float, default=600, help="Client-side model rate limit, requests per minute")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=100, help="Median fake model latency per call")
+    parser.add_argument("--target-ms", type=float, default=1000, help="p95 time-to-dispatch target with lanes on")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    print(f"{args.workers} routine workers, {args.rpm:.0f} model requests/min (burst {args.burst}), "
+          f"fake model {args.latency_ms:.0f} ms; {args.emergencies} emergencies {args.interval_s:.1f} s apart")
+    print(f"{'lanes':>5} {'dispatch_p50':>12} {'dispatch_p95':>12} {'emerg_p50':>10} {'routine_p50':>11} "
+          f"{'routine_p95':>11} {'routine/s':>9} {'rl_wait_s':>9}")
+    results = {}
+    for lanes in (False, True):
+        r = results[lanes] = run(args, lanes)
+        guard = r["guard"]
+        print(f"{'on' if lanes else 'off':>5} {r['dispatch']['p50_ms'] or 0:>12.0f} {r['dispatch']['p95_ms'] or 0:>12.0f} "
+              f"{percentile(r['emergency_ms'], 50):>10.0f} {percentile(r['routine_ms'], 50):>11.0f} "
+              f"{percentile(r['routine_ms'], 95):>11.0f} {r['routine_turns_per_s']:>9.1f} "
+              f"{guard['rate_limit_wait_seconds'] + guard['emergency_rate_limit_wait_seconds']:>9.0f}")
+
+    p95 = results[True]["dispatch"]["p95_ms"]
+    passed = p95 is not None and p95 <= args.target_ms
+    print(f"\nEmergency time-to-dispatch p95 <= {args.target_ms:.0f} ms with lanes on -> {'PASS' if passed else 'FAIL'} ({p95} ms)")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
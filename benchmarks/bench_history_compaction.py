@@ -0,0 +1,138 @@
+"""Prompt tokens and latency per turn over a 50-turn session, with and without history compaction.
+
+The scripted session mixes the turns that make a conversation heavy (reading
+long reports, listing many doctors, searching reports) with plain chat. It
+runs against the offline fake model, configured with a fixed latency per call
+plus a cost per 1000 prompt tokens, so latency follows prompt size as it does
+with Gemini. The reports and doctors are generated in a temporary folder.
+
+    python benchmarks/bench_history_compaction.py [--turns 50] [--ms-per-1k-tokens 20]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REPORTS = 10
+DOCTORS = 60
+SPECIALTIES = ["Cardiology", "Dermatology", "General Practice", "Neurology", "Orthopedics", "Endocrinology"]
+FINDINGS = [
+    "Blood pressure 128/84.", "Fasting glucose 96 mg/dL.", "LDL cholesterol 131 mg/dL.", "Mild iron deficiency.",
+    "Chest X-ray clear.", "ECG shows normal sinus rhythm.", "TSH within range.", "Vitamin D 18 ng/mL, low.",
+]
+
+
+def write_datasets(directory: str, rng: random.Random):
+    for i in range(REPORTS):
+        body = " ".join(rng.choice(FINDINGS) for _ in range(120))
+        with open(os.path.join(directory, f"report_{i}.txt"), 'w') as f:
+            f.write(f"Patient: Bench Patient\nDate: 2024-{i % 12 + 1:02d}-10\nDiagnosis: Checkup {i}\nFindings: {body}\n")
+    doctors = {
+        f"Dr. Bench {i}": {"specialty": SPECIALTIES[i % len(SPECIALTIES)], "free_time": ["Monday 09:00-12:00", "Thursday 14:00-17:00"]}
+        for i in range(DOCTORS)
+    }
+    with open(os.path.join(directory, "doctors.json"), 'w') as f:
+        json.dump(doctors, f)
+    for name, empty in (("appointments.json", []), ("reports_summary.json", [])):
+        with open(os.path.join(directory, name), 'w') as f:
+            json.dump(empty, f)
+
+
+def session_script(turns: int):
+    """(message, steps) for each turn; turn i's message starts with "[i]" so the fake model picks its script."""
+    plan = []
+    for i in range(turns):
+        kind = i % 5
+        if kind in (0, 4):
+            report = f"report_{(i * 3) % REPORTS}.txt"
+            plan.append((f"[{i}] What does {report} say?", [{"tool": "read_report", "args": {"report_name": report}}, {"text": f"{report} shows a routine checkup."}]))
+        elif kind == 1:
+            plan.append((f"[{i}] Which doctors are available?", [{"tool": "list_doctors", "args": {"offset": (i * 7) % DOCTORS}}, {"text": "Here are the doctors."}]))
+        elif kind == 2:
+            plan.append((f"[{i}] Any mention of vitamin D?", [{"tool": "search_reports", "args": {"query": "vitamin D"}}, {"text": "Vitamin D was low."}]))
+        else:
+            plan.append((f"[{i}] Thanks, what should I ask at my next visit?", [{"text": "Ask about your vitamin D and cholesterol results."}]))
+    return plan
+
+
+async def run_session(agent, plan) -> list:
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.genai import types
+
+    runner = Runner(agent=agent, app_name="bench", session_service=InMemorySessionService())
+    session = await runner.session_service.create_session(app_name="bench", user_id="bench_user")
+    results = []
+    for message, _ in plan:
+        prompt_tokens, calls = 0, 0
+        started = time.perf_counter()
+        content = types.Content(role="user", parts=[types.Part(text=message)])
+        async for event in runner.run_async(user_id="bench_user", session_id=session.id, new_message=content):
+            if event.usage_metadata and event.usage_metadata.prompt_token_count:
+                prompt_tokens += event.usage_metadata.prompt_token_count
+                calls += 1
+        results.append({"prompt_tokens": prompt_tokens, "model_calls": calls, "latency_ms": (time.perf_counter() - started) * 1000})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plan = session_script(args.turns)
+        config = {
+            "latency_ms": {"distribution": "fixed", "value": args.latency_ms},
+            "prompt_latency_ms_per_1k_tokens": args.ms_per_1k_tokens,
+            "scripts": [{"match": rf"^\[{i}\]", "steps": steps} for i, (_, steps) in enumerate(plan)],
+        }
+        with open(os.path.join(tmp, "fake_model.json"), 'w') as f:
+            json.dump(config, f)
+        os.environ["MEDICAL_AGENT_FAKE_MODEL"] = "1"
+        os.environ["FAKE_MODEL_CONFIG"] = os.path.join(tmp, "fake_model.json")
+        os.environ.setdefault("GEMINI_REQUESTS_PER_MINUTE", "1000000")
+        os.environ.setdefault("GEMINI_BURST", "1000000")
+        os.environ.setdefault("FAST_PATH_ENABLED", "0")
+        os.environ.setdefault("TRACING_ENABLED", "0")
+
+        from my_agent import agent, core
+
+        # No memory service is configured here, so PreloadMemoryTool warns on every turn
+        logging.getLogger("google_adk").setLevel(logging.ERROR)
+        write_datasets(tmp, random.Random(0))
+        core.DATASETS_DIR = tmp
+        core.APPOINTMENTS_FILE = os.path.join(tmp, "appointments.json")
+        core.DOCTORS_FILE = os.path.join(tmp, "doctors.json")
+        core.REPORTS_SUMMARY_FILE = os.path.join(tmp, "reports_summary.json")
+
+        runs = {}
+        threshold = agent.history_compactor.threshold_tokens
+        for name, value in (("full", float("inf")), ("compacted", threshold)):
+            agent.history_compactor.threshold_tokens = value
+            runs[name] = asyncio.run(run_session(agent.root_agent, plan))
+
+        print(f"Compaction threshold: {threshold} tokens, keeping the last {agent.history_compactor.keep_turns} turns")
+        print(f"{'turn':>5} {'full_tokens':>12} {'compact_tokens':>15} {'full_ms':>8} {'compact_ms':>11}")
+        for turn in sorted({1, 10, 20, 30, 40, args.turns} & set(range(1, args.turns + 1))):
+            full, compact = runs["full"][turn - 1], runs["compacted"][turn - 1]
+            print(f"{turn:>5} {full['prompt_tokens']:>12} {compact['prompt_tokens']:>15} "
+                  f"{full['latency_ms']:>8.0f} {compact['latency_ms']:>11.0f}")
+        for name, results in runs.items():
+            print(f"{name:>9}: total prompt tokens {sum(r['prompt_tokens'] for r in results)}, "
+                  f"mean turn latency {statistics.mean(r['latency_ms'] for r in results):.0f} ms, "
+                  f"last 10 turns {statistics.mean(r['latency_ms'] for r in results[-10:]):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Cold-start time of the agent and its tools, and what the imports spend it on.
+
+Each run starts a fresh interpreter with `-X importtime`, so nothing is cached
+in-process. It times importing the tools (`my_agent.core`) alone, which is
+what the API server and workers need, and building the agents via
+`agent.root_agent`, which is what serving the agent needs. The packages that
+took longest to import in the last run are listed from the `-X importtime`
+report. The process exits with status 1 when the median tools-only import is
+over the target.
+
+    python benchmarks/bench_import_time.py [--runs 5] [--target-ms 300] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import of the tools module alone, in a fresh process
+COLD_START_TARGET_MS = 300
+
+SCENARIOS = {
+    "tools": "import my_agent.core",
+    "agents": "import my_agent.agent; my_agent.agent.root_agent",
+}
+
+
+def run(code: str) -> tuple:
+    """Wall time in ms of running `code` in a fresh interpreter, and its `-X importtime` report."""
+    timer = "import time; _t = time.perf_counter(); {code}; print((time.perf_counter() - _t) * 1000)"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", timer.format(code=code)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONWARNINGS": "ignore"},
+    )
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def import_time_by_package(report: str, top: int) -> list:
+    """(ms, package) for the packages whose modules took longest to import, from an `-X importtime` report.
+
+    Each module's own time is added to its top-level package, or to the module
+    itself for this repo's modules, so the list shows what a change would save.
+    """
+    totals = {}
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, module = line[len("import time:"):].split("|")
+        if not own.strip().isdigit():
+            continue
+        name = module.strip()
+        package = name if name.startswith("my_agent.") else name.split(".")[0]
+        totals[package] = totals.get(package, 0) + int(own) / 1000
+    return sorted(((ms, package) for package, ms in totals.items()), reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=COLD_START_TARGET_MS)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    medians, reports = {}, {}
+    print(f"{'scenario':>9} {'p50_ms':>8} {'min_ms':>8} {'max_ms':>8}")
+    for name, code in SCENARIOS.items():
+        times = []
+        for _ in range(args.runs):
+            elapsed, reports[name] = run(code)
+            times.append(elapsed)
+        medians[name] = statistics.median(times)
+        print(f"{name:>9} {medians[name]:>8.0f} {min(times):>8.0f} {max(times):>8.0f}")
+
+    for name in SCENARIOS:
+        print(f"\nSlowest imports by package ({name}):")
+        for ms, package in import_time_by_package(reports[name], args.top):
+            print(f"  {ms:>8.1f} ms  {package}")
+
+    passed = medians["tools"] <= args.target_ms
+    print(f"\nCold start target: tools import <= {args.target_ms:.0f} ms -> {'PASS' if passed else 'FAIL'} ({medians['tools']:.0f} ms)")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Search latency of the local vector memory as one user's memories grow.
+
+Fills a temporary memory database with synthetic turn summaries for one user
+(plus a few other users, whose shards a search must not touch) and one report
+summary, then times `search` over the user's shard. Also times the first
+search, which loads and embeds the shard, and adding one memory to a loaded
+shard, which only embeds the new row.
+
+    python benchmarks/bench_memory_search.py [--entries 1000 10000 50000] [--queries 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = (
+    "fever cough fatigue headache migraine nausea rash asthma diabetes insulin glucose blood pressure "
+    "hypertension cholesterol statin thyroid anemia iron vitamin allergy penicillin ibuprofen paracetamol "
+    "antibiotic infection viral bacterial chest pain shortness breath dizziness back knee surgery fracture "
+    "xray mri scan cardiology neurology dermatology appointment doctor dose tablet morning evening daily weekly"
+).split()
+
+
+def synthetic_turn(rng: random.Random) -> str:
+    question = " ".join(rng.choices(WORDS, k=rng.randint(5, 12)))
+    answer = " ".join(rng.choices(WORDS, k=rng.randint(15, 40)))
+    return f"User: {question}\nAssistant: {answer}"
+
+
+def percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def fill(service, user_id: str, count: int, rng: random.Random):
+    from google.adk.memory.memory_entry import MemoryEntry
+    from google.genai import types
+
+    entries = [
+        MemoryEntry(id=f"bench:{user_id}:{i}", content=types.Content(parts=[types.Part(text=synthetic_turn(rng))]))
+        for i in range(count)
+    ]
+    asyncio.run(service.add_memory(app_name="bench", user_id=user_id, memories=entries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    from google.adk.memory.memory_entry import MemoryEntry
+    from google.genai import types
+
+    from my_agent.vector_memory import VectorMemoryService
+
+    print(f"{'entries':>8} {'load_ms':>8} {'p50_ms':>7} {'p99_ms':>7} {'add_ms':>7}")
+    for count in args.entries:
+        rng = random.Random(count)
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "memory.sqlite3")
+            writer = VectorMemoryService(db_path)
+            fill(writer, "bench_user", count, rng)
+            for other in range(3):
+                fill(writer, f"other_{other}", count // 10, rng)
+            writer.add_report_summary("bench", "bench_user", "report.txt", {"date": "2024-01-01", "diagnosis": "Migraine", "medicines": "ibuprofen"})
+
+            # A fresh service, as in a newly started server process
+            service = VectorMemoryService(db_path)
+            started = time.perf_counter()
+            service.search("bench", "bench_user", "headache")
+            load_ms = (time.perf_counter() - started) * 1000
+
+            queries = [" ".join(rng.choices(WORDS, k=rng.randint(2, 8))) for _ in range(args.queries)]
+            timings = []
+            for query in queries:
+                started = time.perf_counter()
+                service.search("bench", "bench_user", query)
+                timings.append((time.perf_counter() - started) * 1000)
+
+            entry = MemoryEntry(id="bench:new", content=types.Content(parts=[types.Part(text=synthetic_turn(rng))]))
+            started = time.perf_counter()
+            asyncio.run(service.add_memory(app_name="bench", user_id="bench_user", memories=[entry]))
+            service.search("bench", "bench_user", "fever")
+            add_ms = (time.perf_counter() - started) * 1000
+
+            print(f"{count:>8} {load_ms:>8.1f} {statistics.median(timings):>7.2f} "
+                  f"{percentile(timings, 99):>7.2f} {add_ms:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Order pipeline throughput by batch size, with every order submitted twice.
+
+Client threads submit orders to a fresh outbox, each one a second time under
+the same idempotency key like a retried tool call, while the dispatcher sends
+them to the local stand-in pharmacy. Each batch size reports orders placed
+per second, round trips to the pharmacy, and submit-to-placed latency.
+The process exits with status 1 if any order was placed twice or not at all.
+
+    python benchmarks/bench_orders.py [--orders 500] [--batch-sizes 1 10 50] [--pharmacy-latency-ms 50]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from my_agent.orders import PLACED, LocalPharmacy, OrderDispatcher, OrderOutbox  # noqa: E402
+
+
+def percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(db_path: str, orders: int, clients: int, batch_size: int, args) -> dict:
+    pharmacy = LocalPharmacy(latency_ms=args.pharmacy_latency_ms)
+    dispatcher = OrderDispatcher(
+        OrderOutbox(db_path), {"local": pharmacy}, max_batch=batch_size,
+        linger_seconds=args.linger_ms / 1000, num_workers=args.dispatchers, poll_interval=0.05,
+    )
+    dispatcher.start()
+
+    def client(c: int):
+        for i in range(c, orders, clients):
+            for _ in range(2):
+                dispatcher.submit(f"bench-{i}", "Amoxicillin 500 mg", 1 + i % 3)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    deadline = time.monotonic() + args.timeout_s
+    while dispatcher.outbox.counts().get(PLACED, 0) < orders and time.monotonic() < deadline:
+        time.sleep(0.01)
+    wall = time.perf_counter() - started
+    dispatcher.stop()
+
+    with dispatcher.outbox._connect() as conn:
+        latencies = [
+            (row["updated_at"] - row["created_at"]) * 1000
+            for row in conn.execute("SELECT created_at, updated_at FROM orders WHERE status = ?", (PLACED,))
+        ]
+    stats = dispatcher.stats()
+    return {
+        "placed": stats["orders"].get(PLACED, 0),
+        "pharmacy_placed": pharmacy.placed,
+        "round_trips": pharmacy.requests,
+        "mean_batch": stats["mean_batch_size"],
+        "orders_per_s": stats["orders"].get(PLACED, 0) / wall,
+        "p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "p95_ms": percentile(latencies, 95) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--clients", type=int, default=8, help="Threads submitting orders")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--dispatchers", type=int, default=2, help="Dispatcher threads")
+    parser.add_argument("--linger-ms", type=float, default=20)
+    parser.add_argument("--pharmacy-latency-ms", type=float, default=50, help="Round trip to the stand-in pharmacy")
+    parser.add_argument("--timeout-s", type=float, default=120)
+    args = parser.parse_args()
+
+    print(f"{args.orders} orders (each submitted twice) from {args.clients} clients; "
+          f"{args.dispatchers} dispatchers; pharmacy round trip {args.pharmacy_latency_ms:.0f} ms")
+    print(f"{'batch':>5} {'placed':>7} {'round_trips':>11} {'mean_batch':>10} {'orders/s':>9} {'p50_ms':>8} {'p95_ms':>8}")
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for batch_size in args.batch_sizes:
+            r = run(os.path.join(tmp, f"orders_{batch_size}.sqlite3"), args.orders, args.clients, batch_size, args)
+            print(f"{batch_size:>5} {r['placed']:>7} {r['round_trips']:>11} {r['mean_batch']:>10.1f} "
+                  f"{r['orders_per_s']:>9.0f} {r['p50_ms']:>8.0f} {r['p95_ms']:>8.0f}")
+            if r["placed"] != args.orders or r["pharmacy_placed"] != args.orders:
+                print(f"  expected {args.orders} orders, the outbox placed {r['placed']} and the pharmacy received {r['pharmacy_placed']}")
+                failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Research cache: how often follow-up questions are served a prefetched answer, and never another disease's.
+
+For each disease in `rare_diseases.json` the cache holds the answer that a
+saved report's prefetch stores ("latest treatments and clinical trials for
+<disease>"), tagged with the disease. Follow-up questions worded the way a
+user would ask them are then looked up. Each one should hit its own disease's
+answer. Questions about a different but similarly named disease ("Becker
+muscular dystrophy" after "Duchenne muscular dystrophy") must miss.
+The process exits with status 1 if the follow-up hit rate is under the target
+or any question was served another disease's answer.
+
+    python benchmarks/bench_research_cache.py [--target-hit-rate 0.9]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from my_agent.research_cache import ResearchCache  # noqa: E402
+
+FOLLOW_UPS = (
+    "{disease} latest treatments",
+    "What are the latest treatments for {disease}?",
+    "Are there any new clinical trials for {disease}?",
+    "new {disease} therapies",
+    "Tell me about the latest research on {disease}",
+    "{disease} treatment options",
+)
+# Diseases named like one in the list, whose questions must not be served its answer
+LOOKALIKES = {
+    "Duchenne Muscular Dystrophy": "Becker Muscular Dystrophy",
+    "Spinal Muscular Atrophy": "Spinal and Bulbar Muscular Atrophy",
+    "Idiopathic Pulmonary Fibrosis": "Cystic Pulmonary Fibrosis",
+    "Multiple System Atrophy": "Multiple Sclerosis",
+    "Sickle Cell Disease": "Sickle Cell Trait",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--target-hit-rate", type=float, default=0.9, help="Share of follow-ups served from cache")
+    args = parser.parse_args()
+
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'datasets', 'rare_diseases.json')) as f:
+        diseases = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResearchCache(os.path.join(tmp, "research_cache.sqlite3"))
+        for disease in diseases:
+            query = f"latest treatments and clinical trials for {disease}"
+            cache.tag_topic(disease, query)
+            cache.put(query, f"answer about {disease}")
+
+        hits = wrong = total = 0
+        latencies = []
+        for disease in diseases:
+            for template in FOLLOW_UPS:
+                started = time.perf_counter()
+                cached = cache.lookup(template.format(disease=disease))
+                latencies.append((time.perf_counter() - started) * 1000)
+                total += 1
+                if cached is None:
+                    continue
+                if cached[0] == f"answer about {disease}":
+                    hits += 1
+                else:
+                    wrong += 1
+                    print(f"  {template.format(disease=disease)!r} was served {cached[0]!r}")
+
+        lookalike_hits = 0
+        for lookalike in LOOKALIKES.values():
+            for template in FOLLOW_UPS:
+                cached = cache.lookup(template.format(disease=lookalike))
+                if cached is not None:
+                    lookalike_hits += 1
+                    print(f"  {template.format(disease=lookalike)!r} was served {cached[0]!r}")
+
+    latencies.sort()
+    hit_rate = hits / total
+    print(f"{len(diseases)} prefetched diseases, {total} follow-ups: {hit_rate:.1%} served their disease's answer, "
+          f"{wrong} another disease's; lookup p50 {latencies[len(latencies) // 2]:.2f} ms")
+    print(f"{len(LOOKALIKES) * len(FOLLOW_UPS)} questions about lookalike diseases: {lookalike_hits} served a cached answer")
+    passed = hit_rate >= args.target_hit_rate and wrong == 0 and lookalike_hits == 0
+    print(f"Follow-up hit rate >= {args.target_hit_rate:.0%} with no answer for the wrong disease -> {'PASS' if passed else 'FAIL'}")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
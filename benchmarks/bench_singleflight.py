@@ -0,0 +1,101 @@
+"""Single-flight coalescing of identical document analyses, including when the caller running it goes away.
+
+Starts `--callers` concurrent analyses of the same document through
+`SingleFlight.do_async` and reports how many actually ran. Then repeats it with
+the first caller (the one running the analysis) cancelled halfway, as when its
+session disconnects: every other caller must still get the result, from one
+new run. The same is checked for the threaded `do`, with the first caller
+interrupted. The process exits with status 1 if any caller that was not itself
+cancelled failed, or if a shared run executed more than once per leader.
+
+    python benchmarks/bench_singleflight.py [--callers 20] [--latency-ms 100]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from my_agent.singleflight import SingleFlight  # noqa: E402
+
+
+async def coalesced(callers: int, latency: float, cancel_leader: bool) -> dict:
+    flight = SingleFlight()
+    runs = 0
+
+    async def analyze():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(latency)
+        return {"text": "report"}
+
+    leader = asyncio.create_task(flight.do_async("report.pdf", analyze))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(flight.do_async("report.pdf", analyze)) for _ in range(callers - 1)]
+    if cancel_leader:
+        await asyncio.sleep(latency / 2)
+        leader.cancel()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    failed = [r for r in results if not isinstance(r, dict)]
+    return {"runs": runs, "served": len(results) - len(failed), "failed": failed}
+
+
+def threaded_interrupted_leader(callers: int, latency: float) -> dict:
+    flight = SingleFlight()
+    runs = 0
+    results = []
+
+    def analyze():
+        nonlocal runs
+        runs += 1
+        time.sleep(latency)
+        if runs == 1:
+            raise KeyboardInterrupt
+        return {"text": "report"}
+
+    def call():
+        try:
+            results.append(flight.do("report.pdf", analyze))
+        except KeyboardInterrupt:
+            results.append("interrupted")
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    threads[0].start()
+    time.sleep(latency / 4)
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    served = sum(isinstance(r, dict) for r in results)
+    return {"runs": runs, "served": served, "failed": [r for r in results if not isinstance(r, dict)][1:]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--callers", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=100, help="Duration of one analysis")
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    passed = True
+    for label, expected_runs, result in (
+        ("async, leader finishes", 1, asyncio.run(coalesced(args.callers, latency, cancel_leader=False))),
+        ("async, leader cancelled", 2, asyncio.run(coalesced(args.callers, latency, cancel_leader=True))),
+        ("threads, leader interrupted", 2, threaded_interrupted_leader(args.callers, latency)),
+    ):
+        ok = not result["failed"] and result["runs"] == expected_runs
+        passed &= ok
+        print(f"{label:>28}: {result['runs']} runs for {args.callers} callers, "
+              f"{result['served']} served, {len(result['failed'])} failed -> {'ok' if ok else 'FAIL'}")
+        for failure in result["failed"][:3]:
+            print(f"    {failure!r}")
+
+    print(f"Every caller that was not cancelled gets the result -> {'PASS' if passed else 'FAIL'}")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
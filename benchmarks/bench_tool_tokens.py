@@ -0,0 +1,80 @@
+"""Prompt tokens added by the bulk tools at different data sizes, before and after paging.
+
+"Before" is the old behaviour of returning every record; "after" is a default
+call to the paged tool under TOOL_TOKEN_BUDGET.
+
+    python benchmarks/bench_tool_tokens.py [--sizes 10 1000 10000]
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from my_agent import core  # noqa: E402
+from my_agent.paging import TOOL_TOKEN_BUDGET, estimate_tokens  # noqa: E402
+
+DIAGNOSES = ["Viral Infection", "Migraine", "Hypertension", "Type 2 Diabetes", "Asthma", "ALS", "Anemia"]
+SPECIALTIES = ["Cardiology", "Dermatology", "General Practice", "Neurology", "Oncology"]
+SLOTS = ["Monday 10:00-12:00", "Tuesday 09:00-11:00", "Wednesday 14:00-16:00", "Friday 13:00-15:00"]
+
+
+def write_dataset(directory: str, size: int, rng: random.Random):
+    start = datetime.date(2015, 1, 1)
+    summaries = [{
+        "filename": f"report_{i}.txt",
+        "summary": {
+            "date": (start + datetime.timedelta(days=i % 3650)).isoformat(),
+            "diagnosis": rng.choice(DIAGNOSES),
+            "medicines": "Rest, fluids, paracetamol 500mg twice daily",
+            "other": "Symptoms: Fever, cough, fatigue, mild headache."
+        }
+    } for i in range(size)]
+    appointments = [{
+        "doctor": f"Dr. {i % 500}",
+        "time_slot": rng.choice(SLOTS),
+        "booked_at": (datetime.datetime(2024, 1, 1) + datetime.timedelta(hours=i)).isoformat()
+    } for i in range(size)]
+    doctors = {f"Dr. {i}": {"specialty": rng.choice(SPECIALTIES), "free_time": rng.sample(SLOTS, 2)} for i in range(size)}
+
+    for name, data in (("reports_summary.json", summaries), ("appointments.json", appointments), ("doctors.json", doctors)):
+        with open(os.path.join(directory, name), 'w') as f:
+            json.dump(data, f)
+    return summaries, appointments, doctors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    print(f"Token budget per tool result: {TOOL_TOKEN_BUDGET}")
+    print(f"{'records':>8} {'tool':<22} {'before':>10} {'after':>8} {'returned':>9}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            summaries, appointments, doctors = write_dataset(tmp, size, rng)
+            core.REPORTS_SUMMARY_FILE = os.path.join(tmp, "reports_summary.json")
+            core.APPOINTMENTS_FILE = os.path.join(tmp, "appointments.json")
+            core.DOCTORS_FILE = os.path.join(tmp, "doctors.json")
+
+            before = {
+                "get_reports_summary": {"status": "success", "summaries": summaries},
+                "list_appointments": {"status": "success", "appointments": appointments},
+                "list_doctors": {"status": "success", "doctors": [
+                    {"name": n, "specialty": d["specialty"], "available_slots": d["free_time"]} for n, d in doctors.items()
+                ]},
+            }
+            for name, tool in (("get_reports_summary", core.get_reports_summary),
+                               ("list_appointments", core.list_appointments),
+                               ("list_doctors", core.list_doctors)):
+                result = tool()
+                print(f"{size:>8} {name:<22} {estimate_tokens(before[name]):>10} {estimate_tokens(result):>8} {result['returned']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""The agents, built on first use.
+
+Constructing them imports ADK and the Gemini client and sets up the research
+cache, tool memo and vector memory, which together take most of the agent's
+startup time. `agent.py` imports this module only when one of the names below
+is first read (`agent.root_agent`), so importing the tools, for the API server
+or a script, stays cheap. The tools are read from `core` at call time, so
+rebinding e.g. `core.DOCTORS_FILE` still takes effect.
+"""
+
+from google.adk.agents import Agent, LoopAgent
+from google.adk.tools import AgentTool
+from google.adk.tools.preload_memory_tool import PreloadMemoryTool
+
+from . import core
+from .compaction import HistoryCompactor
+from .fast_path import (
+    APPOINTMENTS_PATTERN,
+    DOCTORS_PATTERN,
+    FastPathRouter,
+    Intent,
+    render_appointments,
+    render_doctors,
+)
+from .model_tiers import AUTO, LITE, STANDARD, TurnClassifier, make_tiered_model
+from .priority import PriorityRouter
+from .research_cache import get_research_service
+from .tool_dispatch import ToolDispatcher
+from .tool_memo import SessionToolMemo
+from .tracing import tracer
+from .vector_memory import get_memory_service, remember_turn
+
+# --- Memory ---
+# Searched by PreloadMemoryTool when the server runs with `--memory_service_uri vectormemory://`
+memory_service = get_memory_service()
+
+# --- Report Verification Loop ---
+clarity_checker_agent = Agent(
+    name="ClarityChecker",
+    model=make_tiered_model("ClarityChecker", LITE),
+    instruction="""You are checking a medical report for clarity.
+    Review the 'current_report_content'.
+    Check if the following fields are clearly present: Date, Diagnosis, Recommendation/Medicines, Symptoms.
+    
+    IF any key information is missing or unclear:
+        Generate a specific question to ask the user to provide that information.
+        Set 'clarification_needed' to true.
+        Output ONLY the question.
+    
+    ELSE (if all information seems clear):
+        Set 'clarification_needed' to false.
+        Output "CLEAR".
+    """,
+    description="Checks if the report content is clear and complete.",
+    tools=[core.ask_user_for_clarification_async],
+    before_agent_callback=core.skip_clarity_check_if_complete
+)
+
+summary_generator_agent = Agent(
+    name="SummaryGenerator",
+    model=make_tiered_model("SummaryGenerator", STANDARD),
+    instruction="""You are generating a final summary confirmation for a medical report.
+    Use the 'current_report_content' (and any 'user_response' provided) to create a structured summary.
+    
+    Format:
+    "I am about to save this report with the following summary:
+    Date: ...
+    Diagnosis: ...
+    Medicines: ...
+    Symptoms: ...
+    
+    Is this correct? (Say 'Go ahead' to save)"
+    """,
+    description="Generates a summary confirmation for the user.",
+    tools=[core.save_medical_report_async]
+)
+
+report_verification_loop = LoopAgent(
+    name="ReportVerificationLoop",
+    sub_agents=[clarity_checker_agent, summary_generator_agent],
+    max_iterations=3,
+    description="Loop to verify report details with the user before saving.",
+    before_agent_callback=core.capture_report_content
+)
+
+# --- Research Agent ---
+# The cache, background refresher and agent are shared with the report-saved prefetch; see research_cache.py
+research_service = get_research_service()
+research_cache = research_service.cache
+research_refresher = research_service.refresher
+research_cache_hooks = research_service.hooks
+research_agent = research_service.agent
+
+# --- Priority Lanes ---
+# Emergency turns get reserved model and tool capacity and go ahead of queued routine work
+priority_router = PriorityRouter(emergency_tools=frozenset({"book_ambulance", "call_family"}))
+
+# --- Fast Path ---
+# Plain "show my appointments" / "list doctors" requests are answered without a model turn
+fast_path_router = FastPathRouter([
+    Intent("list_appointments", APPOINTMENTS_PATTERN, ("appointment",), core.list_appointments, render_appointments),
+    Intent("list_doctors", DOCTORS_PATTERN, ("doctor",), core.list_doctors, render_doctors),
+])
+
+# --- Tool Memoization ---
+# Read-only tools called again in the same session, with their data unchanged, return a short marker instead of the payload
+tool_memo = SessionToolMemo({
+    "list_doctors": lambda: core._file_version(core.DOCTORS_FILE),
+    "get_doctor_schedule": lambda: core._file_version(core.DOCTORS_FILE),
+    "list_appointments": lambda: core._file_version(core.APPOINTMENTS_FILE),
+    "get_reports_summary": lambda: core._file_version(core.REPORTS_SUMMARY_FILE),
+})
+
+# Read-only tools called together in one response run concurrently; any other tool runs in order
+tool_dispatcher = ToolDispatcher(read_only=frozenset({
+    "list_doctors",
+    "get_doctor_schedule",
+    "list_appointments",
+    "list_medical_reports",
+    "get_reports_summary",
+    "read_report",
+    "search_reports",
+    "analyze_past_checkups",
+    "get_order_status",
+    "MedicalResearchAgent",
+}))
+
+# --- Model Tiers ---
+# Confirmations of what a tool just did go to the lite model; turns combining several reports go to pro
+turn_classifier = TurnClassifier(
+    confirmation_tools=frozenset({
+        "book_appointment", "modify_appointment", "cancel_appointment", "save_medical_report",
+        "order_medicine", "call_family", "book_ambulance",
+    }),
+    synthesis_tools=frozenset({"read_report", "search_reports", "analyze_past_checkups", "get_reports_summary"}),
+)
+
+# --- History Compaction ---
+# Past a token threshold, older turns are sent to the model as a summary instead of verbatim
+history_compactor = HistoryCompactor(memo=tool_memo)
+
+root_agent = Agent(
+    name="medical_companion_agent",
+    model=make_tiered_model("medical_companion_agent", AUTO, turn_classifier),
+    description=(
+        "A medical companion agent that helps coordinate appointments with doctors, "
+        "manage medical reports, and order medicines."
+    ),
+    instruction=(
+        "You are a helpful Medical Companion Agent. You have five main responsibilities:\n"
+        "1. Appointment Coordination: Help users find doctors and book appointments based on their schedule. "
+        "You can also list, modify, and cancel existing appointments.\n"
+        "2. Reports Management: Read, save, and summarize medical reports. "
+        "Use 'get_reports_summary' to see an overview of all reports. "
+        "When a user provides a new report text to save, first verify it is clear. "
+        "Use 'save_medical_report' ONLY after confirmation. "
+        "Use 'read_report' to read the full content of any report. It automatically extracts text from Images and PDFs using Gemini Vision. "
+        "Use 'search_reports' to find specific details across reports; it returns only the relevant passages. "
+        "IMPORTANT: When providing specific medical advice, diagnoses, or treatment recommendations from reports, "
+        "ALWAYS include the disclaimer: 'This advice should always be checked with a valid medical practitioner.' "
+        "Do NOT include this disclaimer for general queries (e.g., dates, file existence, or listing reports) that do not contain medical advice.\n"
+        "3. Medicine Ordering: Help users order medicines. Orders are sent to the pharmacy in the background; "
+        "use 'get_order_status' with the order_id when the user asks whether an order went through.\n"
+        "4. Research: Search for new cures and treatments for rare diseases using the research agent.\n"
+        "5. Health Analysis: Use 'analyze_past_checkups' to review the user's recent medical history. "
+        "6. Emergency Services: Call family members or book an ambulance in case of emergency.\n"
+        "The agent has MEMORY enabled for every interaction. You should ALWAYS be aware of the user's past medical history from previous turns and context. "
+        "Use the information from memory to provide personalized and context-aware responses.\n\n"
+        "If the user asks to see their reports, try 'get_reports_summary' first for a quick overview."
+    ),
+    tools=[
+        core.list_doctors_async,
+        core.get_doctor_schedule_async,
+        core.book_appointment_async,
+        core.modify_appointment_async,
+        core.cancel_appointment_async,
+        core.list_appointments_async,
+        core.list_medical_reports_async,
+        core.get_reports_summary_async,
+        core.save_medical_report_async,
+        core.read_report_async,
+        core.search_reports_async,
+        core.order_medicine_async,
+        core.get_order_status_async,
+        core.ask_user_for_clarification_async,
+        core.analyze_past_checkups_async,
+        core.call_family_async,
+        core.book_ambulance_async,
+        AgentTool(research_agent),
+        PreloadMemoryTool()
+    ],
+    before_agent_callback=[priority_router.before_agent_callback, fast_path_router.before_agent_callback],
+    after_agent_callback=[remember_turn, fast_path_router.after_agent_callback, priority_router.after_agent_callback],
+    before_model_callback=history_compactor.before_model_callback,
+    before_tool_callback=[
+        priority_router.before_tool_callback, tool_dispatcher.before_tool_callback, tool_memo.before_tool_callback,
+    ],
+    after_tool_callback=[tool_dispatcher.after_tool_callback, tool_memo.after_tool_callback],
+    on_tool_error_callback=[tool_dispatcher.on_tool_error_callback, tool_memo.on_tool_error_callback],
+)
+
+# Spans for every agent, model call and tool call; see tracing.py
+for _agent in (root_agent, research_agent, report_verification_loop):
+    tracer.instrument(_agent)
@@ -0,0 +1,49 @@
+"""Async wrappers for the agent's tools.
+
+ADK awaits coroutine tools but calls plain functions directly on the event
+loop, so a tool doing disk I/O or a blocking model call stalls every other
+session in the process while it runs. `to_async` moves a tool onto a worker
+thread. The wrapper keeps the tool's name, docstring and signature, which ADK
+builds the function declaration from.
+
+Offloaded calls run on a pool of `TOOL_WORKERS` threads, admitted by
+`priority.tool_scheduler`, so an emergency turn's calls go ahead of queued
+routine ones.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional
+
+from .priority import tool_scheduler
+
+# Sized to the scheduler, so an admitted call never queues inside the pool
+_executor = ThreadPoolExecutor(max_workers=tool_scheduler.capacity, thread_name_prefix="tool")
+
+
+def to_async(fn: Callable[..., Any], lock: Optional[threading.Lock] = None, offload: bool = True) -> Callable[..., Awaitable[Any]]:
+    """Returns a coroutine version of `fn`.
+
+    Args:
+        lock: Held around each call, for tools whose read-modify-write of a file must not interleave once they run on threads.
+        offload: False for tools that do no I/O, which are cheaper to run inline than to hand to a thread.
+    """
+    def call(*args, **kwargs):
+        if lock is None:
+            return fn(*args, **kwargs)
+        with lock:
+            return fn(*args, **kwargs)
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        if not offload:
+            return call(*args, **kwargs)
+        async with tool_scheduler.slot():
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(
+                _executor, functools.partial(context.run, call, *args, **kwargs)
+            )
+
+    return wrapper
@@ -0,0 +1,187 @@
+"""Compaction of long conversations before each model call.
+
+ADK rebuilds the prompt from every event in the session, so full reports and
+doctor lists returned by tools many turns ago are resent on every call. Once
+the estimated prompt size passes `threshold_tokens`, `before_model_callback`
+replaces all but the last `keep_turns` turns with one structured summary: what
+the user asked, which tools ran with which arguments and the shape of what
+they returned, and the start of each answer. The recent turns, including the
+one in progress, are sent verbatim.
+
+Only the request is changed; the session keeps its full history, so every
+model call compacts from the same source.
+"""
+import os
+import threading
+from typing import Any, List, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest
+from google.genai import types
+
+from .contents import is_other_agent_reply, is_preloaded_context, is_user_message
+from .paging import estimate_tokens
+from .tool_memo import SessionToolMemo, is_unchanged_marker
+
+COMPACTION_THRESHOLD_TOKENS = int(os.environ.get("COMPACTION_THRESHOLD_TOKENS", "6000"))
+COMPACTION_KEEP_TURNS = int(os.environ.get("COMPACTION_KEEP_TURNS", "3"))
+# Longest user message, answer or tool string kept in a summary line.
+_SNIPPET_CHARS = 160
+
+
+def content_tokens(content: types.Content) -> int:
+    """Estimated prompt tokens for one content, counting text, tool arguments and tool results."""
+    tokens = 0
+    for part in content.parts or []:
+        if part.text:
+            tokens += len(part.text) // 4 + 1
+        if part.function_call:
+            tokens += estimate_tokens(part.function_call.args or {})
+        if part.function_response:
+            tokens += estimate_tokens(part.function_response.response or {})
+    return tokens
+
+
+def _snippet(text: str, limit: int = _SNIPPET_CHARS) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else f"{text[:limit]}... ({len(text)} chars)"
+
+
+def _shape(value: Any) -> str:
+    """Short description of a tool result: scalars kept, long text cut, collections counted."""
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{k}: {_shape(v)}" for k, v in list(value.items())[:8]) + (", ..." if len(value) > 8 else "") + "}"
+    if isinstance(value, list):
+        return f"[{len(value)} items]"
+    if isinstance(value, str):
+        return repr(_snippet(value, 80))
+    return repr(value)
+
+
+def split_turns(contents: List[types.Content]) -> List[List[types.Content]]:
+    """Groups contents into turns, each starting at a user message.
+
+    Context inserted for this request (e.g. preloaded memories) goes with the
+    message it precedes, or with the current turn when it follows a tool result.
+    """
+    turns: List[List[types.Content]] = []
+    for i, content in enumerate(contents):
+        if is_preloaded_context(content):
+            starts = i + 1 < len(contents) and is_user_message(contents[i + 1])
+        else:
+            starts = is_user_message(content) and not (i and is_preloaded_context(contents[i - 1]))
+        if not turns or starts:
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+def summarize_turn(turn: List[types.Content]) -> Tuple[str, List[Tuple[str, dict]]]:
+    """One summary line per turn, plus the (tool name, args) of the calls it made."""
+    asked, answered, calls, results = [], [], [], {}
+    # Call ids are stripped before the request is built, so results are matched to calls by name and order
+    for content in turn:
+        for part in content.parts or []:
+            if part.thought:
+                continue
+            if part.function_call:
+                calls.append((part.function_call.name, dict(part.function_call.args or {})))
+            elif part.function_response:
+                results.setdefault(part.function_response.name, []).append(part.function_response.response)
+            elif part.text and not is_preloaded_context(content) and not is_other_agent_reply(content):
+                (asked if content.role == "user" else answered).append(part.text)
+    line = f"- User: {_snippet(' '.join(asked))}"
+    for name, args in calls:
+        arguments = ", ".join(f"{k}={v!r}" for k, v in args.items())
+        pending = results.get(name)
+        result = _shape(pending.pop(0)) if pending else "no result"
+        line += f"\n  Tool {name}({arguments}) -> {result}"
+    if answered:
+        line += f"\n  Assistant: {_snippet(' '.join(answered))}"
+    return line, calls
+
+
+def answered_calls(turn: List[types.Content]) -> List[Tuple[str, dict, Any]]:
+    """(tool name, args, response) for each call in the turn; the response is None if there is none yet."""
+    calls, by_id, by_name = [], {}, {}
+    for content in turn:
+        for part in content.parts or []:
+            if part.function_call:
+                calls.append(part.function_call)
+            elif part.function_response:
+                response = part.function_response
+                if response.id:
+                    by_id[response.id] = response.response
+                else:
+                    by_name.setdefault(response.name, []).append(response.response)
+    answered = []
+    for call in calls:
+        if call.id and call.id in by_id:
+            response = by_id[call.id]
+        else:
+            pending = by_name.get(call.name)
+            response = pending.pop(0) if pending else None
+        answered.append((call.name, dict(call.args or {}), response))
+    return answered
+
+
+class HistoryCompactor:
+    """`memo`, if given, forgets the results that compaction takes out of context, so repeat calls run again."""
+
+    def __init__(
+        self,
+        threshold_tokens: int = COMPACTION_THRESHOLD_TOKENS,
+        keep_turns: int = COMPACTION_KEEP_TURNS,
+        memo: Optional[SessionToolMemo] = None,
+    ):
+        self.threshold_tokens = threshold_tokens
+        self.keep_turns = max(1, keep_turns)
+        self.memo = memo
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "compacted": 0, "tokens_before": 0, "tokens_after": 0}
+
+    def compact(self, contents: List[types.Content]) -> Tuple[List[types.Content], List[Tuple[str, dict]]]:
+        """Returns the compacted contents and the tool calls whose results were summarized away."""
+        turns = split_turns(contents)
+        if len(turns) <= self.keep_turns:
+            return contents, []
+        old, recent = turns[:-self.keep_turns], turns[-self.keep_turns:]
+        lines, dropped = [], []
+        for turn in old:
+            line, calls = summarize_turn(turn)
+            lines.append(line)
+            dropped.extend(calls)
+        summary = types.Part(text=(
+            f"[Summary of the {len(old)} earlier turns of this conversation. Full tool results are no longer "
+            "in context; call the tool again if you need details.]\n" + "\n".join(lines)
+        ))
+        # Merge into the first kept user message so roles still alternate
+        first = recent[0][0]
+        recent[0][0] = types.Content(role=first.role, parts=[summary] + list(first.parts or []))
+        # A kept call only covers a dropped one if its full result is still in context, not the memo's marker
+        kept_calls = {
+            (name, repr(sorted(args.items())))
+            for turn in recent for name, args, response in answered_calls(turn)
+            if response is not None and not is_unchanged_marker(response)
+        }
+        dropped = [(n, a) for n, a in dropped if (n, repr(sorted(a.items()))) not in kept_calls]
+        return [c for turn in recent for c in turn], dropped
+
+    def before_model_callback(self, callback_context: CallbackContext, llm_request: LlmRequest) -> None:
+        before = sum(content_tokens(c) for c in llm_request.contents)
+        after = before
+        if before > self.threshold_tokens:
+            llm_request.contents, dropped = self.compact(llm_request.contents)
+            after = sum(content_tokens(c) for c in llm_request.contents)
+            if self.memo is not None and dropped:
+                self.memo.forget(callback_context.state, dropped)
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["compacted"] += after < before
+            self._stats["tokens_before"] += before
+            self._stats["tokens_after"] += after
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
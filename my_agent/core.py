@@ -0,0 +1,857 @@
+"""Data access, caches, indexes and tools shared by the agents and the API.
+
+Everything that reads or writes `datasets/` goes through here, so a process
+hosting the API and both agents keeps one parsed copy of each file, one
+report index and one vector memory. The agents are defined on top of these
+tools in `agent_graph.py` and `medical_companion_agent/agent.py`.
+"""
+import asyncio
+import copy
+import datetime
+import functools
+import os
+import glob
+import json
+import logging
+import re
+import mimetypes
+import threading
+import uuid
+from typing import List, Optional
+from zoneinfo import ZoneInfo
+
+from . import paging, pdf_pages
+from .async_tools import to_async
+from .doctor_index import RESOLVE_MIN_SCORE, DoctorIndex, normalize_name
+from .resilience import model_guard
+from .report_index import ReportIndex
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DATASETS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'datasets')
+APPOINTMENTS_FILE = os.path.join(DATASETS_DIR, 'appointments.json')
+DOCTORS_FILE = os.path.join(DATASETS_DIR, 'doctors.json')
+REPORTS_SUMMARY_FILE = os.path.join(DATASETS_DIR, 'reports_summary.json')
+# Text extracted from PDF and image reports, kept so they can be searched like text reports
+EXTRACTED_DIR = os.path.join(DATASETS_DIR, '.extracted')
+REPORT_SEARCH_METHOD = os.environ.get("REPORT_SEARCH_METHOD", "bm25")
+
+# --- Shared State Keys ---
+STATE_CURRENT_REPORT_CONTENT = "current_report_content"
+STATE_CLARIFICATION_NEEDED = "clarification_needed"
+STATE_SUMMARY_CONFIRMATION = "summary_confirmation"
+STATE_USER_RESPONSE = "user_response"
+
+# Parsed dataset files, keyed by path and validated against the file's mtime and size.
+_json_cache = {}
+# Concurrent cache misses on the same file share one read, and identical document analyses share one model call.
+_loads = SingleFlight()
+_analyses = SingleFlight()
+# Fuzzy name index over doctors.json, keyed by path and rebuilt when the file changes
+_doctor_indexes = {}
+# Passage index over report text, kept in sync with the datasets folder
+report_index = ReportIndex(dense=REPORT_SEARCH_METHOD == "dense")
+# Serializes read-modify-write updates of reports_summary.json within this process
+_summary_lock = threading.Lock()
+# Same for appointments.json, once the async tools run booking changes on worker threads
+_appointments_lock = threading.Lock()
+
+def _file_version(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _read_json(path, default):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return default
+
+def _load_json(path, default):
+    version = _file_version(path)
+    if version is None:
+        return default
+    cached = _json_cache.get(path)
+    if cached is None or cached[0] != version:
+        data = _loads.do((path, version), _read_json, path, default)
+        cached = _json_cache[path] = (version, data)
+    # Callers mutate what they load, so never hand out the cached object itself
+    return copy.deepcopy(cached[1])
+
+def _save_json(path, data):
+    if not os.path.exists(DATASETS_DIR):
+        os.makedirs(DATASETS_DIR)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+    _json_cache.pop(path, None)
+
+def _load_appointments():
+    return _load_json(APPOINTMENTS_FILE, [])
+
+def _save_appointments(appointments):
+    _save_json(APPOINTMENTS_FILE, appointments)
+
+def _load_doctors():
+    return _load_json(DOCTORS_FILE, {})
+
+def _doctor_index() -> DoctorIndex:
+    version = _file_version(DOCTORS_FILE)
+    cached = _doctor_indexes.get(DOCTORS_FILE)
+    if cached is None or cached[0] != version:
+        index = _loads.do(("doctor_index", DOCTORS_FILE, version), lambda: DoctorIndex(_load_doctors()))
+        cached = _doctor_indexes[DOCTORS_FILE] = (version, index)
+    return cached[1]
+
+def _resolve_doctor(doctor_name: str, exact_only: bool = False):
+    """(name, details) of the doctor `doctor_name` refers to, or (None, error result) with the closest matches.
+
+    Tools that change appointments pass `exact_only`, so a misspelled name is confirmed before anything is booked
+    with a doctor it only resembles.
+    """
+    index = _doctor_index()
+    name, candidates = index.resolve(doctor_name, exact_only=exact_only)
+    if name is not None:
+        return name, copy.deepcopy(index.doctors[name])
+    if not candidates:
+        return None, {"status": "error", "error_message": f"Doctor '{doctor_name}' not found. Use list_doctors to see who is available."}
+    if exact_only and candidates[0][1] >= RESOLVE_MIN_SCORE:
+        message = (f"Doctor '{doctor_name}' is not an exact name. Confirm the doctor with the user, "
+                   "then call again with their name exactly as listed in the candidates.")
+    else:
+        message = f"Doctor '{doctor_name}' did not match one doctor. Call again with the name of one of the candidates."
+    error = {
+        "status": "error",
+        "error_message": message,
+        "candidates": [{"name": n, "specialty": index.doctors[n].get("specialty", "Unknown"), "score": score} for n, score in candidates],
+    }
+    surname_matches = len(index.with_surname(doctor_name))
+    if surname_matches > len(candidates):
+        error["error_message"] += f" {surname_matches} doctors have this surname; ask the user for the first name."
+    return None, error
+
+def _load_reports_summary():
+    return _load_json(REPORTS_SUMMARY_FILE, [])
+
+def _save_reports_summary(summaries):
+    _save_json(REPORTS_SUMMARY_FILE, summaries)
+
+def _parse_report_content(content: str) -> dict:
+    """Parses report content to extract summary fields."""
+    summary = {
+        "date": "Unknown",
+        "diagnosis": "Unknown",
+        "medicines": "None mentioned",
+        "other": ""
+    }
+    
+    lines = content.split('\n')
+    for line in lines:
+        line = line.strip()
+        if line.lower().startswith("date:"):
+            summary["date"] = line.split(":", 1)[1].strip()
+        elif line.lower().startswith("diagnosis:"):
+            summary["diagnosis"] = line.split(":", 1)[1].strip()
+        elif line.lower().startswith("recommendation:"):
+            summary["medicines"] = line.split(":", 1)[1].strip()
+        elif line.lower().startswith("symptoms:"):
+            summary["other"] = line # Keep the whole line for context
+            
+    return summary
+
+def _select_fields(record: dict, fields: Optional[List[str]], always: tuple) -> dict:
+    if not fields:
+        return record
+    return {k: v for k, v in record.items() if k in always or k in fields}
+
+def list_doctors(specialty: Optional[str] = None, limit: int = 50, offset: int = 0, fields: Optional[List[str]] = None) -> dict:
+    """Lists all available doctors and their specialties with their appointmnet. use this if someone ask for list of doctors.
+    
+    Args:
+        specialty (str): Only list doctors whose specialty contains this text (optional).
+        limit (int): Maximum number of doctors to return (default 50).
+        offset (int): Number of doctors to skip, for paging (default 0).
+        fields (list): Fields to include besides the name: "specialty", "available_slots" (default all).
+        
+    Returns:
+        dict: The doctors, paging info, and a summary of any doctors left out of the result.
+    """
+    doctors = _load_doctors()
+    if not doctors:
+        return {"status": "success", "message": "No doctors found.", "doctors": []}
+    
+    # "cardiologist" finds Cardiology as well as "cardio" does
+    specialties = set(_doctor_index().matching_specialties(specialty)) if specialty else None
+    # Format for better readability by the agent
+    doctor_list = []
+    for name, details in doctors.items():
+        if specialties is not None and details.get("specialty", "") not in specialties:
+            continue
+        doctor_list.append(_select_fields({
+            "name": name,
+            "specialty": details.get("specialty", "Unknown"),
+            "available_slots": details.get("free_time", [])
+        }, fields, ("name",)))
+    
+    page = paging.paginate(
+        doctor_list, limit, offset,
+        lambda omitted: {"specialties": paging.top_counts([d.get("specialty") for d in omitted])}
+    )
+    return {"status": "success", "doctors": doctor_list[page["offset"]:page["offset"] + page["returned"]], **page}
+
+def get_doctor_schedule(doctor_name: str) -> dict:
+    """Retrieves the schedule and specialty for a specified doctor. The name may be partial or misspelled."""
+    name, doctor = _resolve_doctor(doctor_name)
+    if name is None:
+        return doctor
+    result = {
+        "status": "success",
+        "doctor": name,
+        "specialty": doctor["specialty"],
+        "available_slots": doctor["free_time"]
+    }
+    if normalize_name(name) != normalize_name(doctor_name):
+        # Resolved from a partial or misspelled name; lets the model check it is the doctor the user meant
+        result["matched_from"] = doctor_name
+    return result
+
+def book_appointment(doctor_name: str, time_slot: str) -> dict:
+    """Books an appointment with a doctor at a specific time. The name must match a listed doctor; otherwise the closest candidates are returned."""
+    doctor_name, doctor = _resolve_doctor(doctor_name, exact_only=True)
+    if doctor_name is None:
+        return doctor
+    
+    if time_slot not in doctor["free_time"]:
+        return {
+            "status": "error", 
+            "error_message": f"Slot '{time_slot}' is not available for {doctor_name}. Available: {doctor['free_time']}"
+        }
+    
+    appointments = _load_appointments()
+    
+    # Check for duplicates
+    for appt in appointments:
+        if appt['doctor'] == doctor_name and appt['time_slot'] == time_slot:
+            return {"status": "error", "error_message": f"Slot '{time_slot}' with {doctor_name} is already booked."}
+
+    new_appointment = {
+        "doctor": doctor_name,
+        "time_slot": time_slot,
+        "booked_at": datetime.datetime.now().isoformat()
+    }
+    
+    appointments.append(new_appointment)
+    _save_appointments(appointments)
+
+    return {
+        "status": "success",
+        "message": f"Appointment confirmed with {doctor_name} for {time_slot}."
+    }
+
+def modify_appointment(current_doctor_name: str, current_time_slot: str, new_doctor_name: Optional[str] = None, new_time_slot: Optional[str] = None) -> dict:
+    """Modifies an existing appointment."""
+    appointments = _load_appointments()
+    # Appointments store the directory name, so "dr smith" still finds one booked with "Dr. Smith"
+    current_doctor_name = _resolve_doctor(current_doctor_name, exact_only=True)[0] or current_doctor_name
+    found = False
+    target_appt = None
+    
+    for appt in appointments:
+        if appt['doctor'] == current_doctor_name and appt['time_slot'] == current_time_slot:
+            target_appt = appt
+            found = True
+            break
+            
+    if not found:
+        return {"status": "error", "error_message": "Appointment not found."}
+    
+    # Set new values or keep old ones
+    target_doctor = new_doctor_name if new_doctor_name else current_doctor_name
+    target_slot = new_time_slot if new_time_slot else current_time_slot
+    
+    # Validate new details
+    target_doctor, doctor = _resolve_doctor(target_doctor, exact_only=True)
+    if target_doctor is None:
+        return doctor
+        
+    if target_slot not in doctor["free_time"]:
+         return {
+            "status": "error", 
+            "error_message": f"Slot '{target_slot}' is not available for {target_doctor}. Available: {doctor['free_time']}"
+        }
+        
+    # Remove old appointment temporarily to check for conflicts
+    appointments.remove(target_appt)
+    
+    for appt in appointments:
+         if appt['doctor'] == target_doctor and appt['time_slot'] == target_slot:
+            # Revert
+            appointments.append(target_appt)
+            return {"status": "error", "error_message": f"Slot '{target_slot}' with {target_doctor} is already booked."}
+
+    # Add new appointment
+    new_appt = {
+        "doctor": target_doctor,
+        "time_slot": target_slot,
+        "booked_at": datetime.datetime.now().isoformat(),
+        "modified_at": datetime.datetime.now().isoformat()
+    }
+    appointments.append(new_appt)
+    _save_appointments(appointments)
+    
+    return {
+        "status": "success",
+        "message": f"Appointment updated to {target_doctor} at {target_slot}."
+    }
+
+def cancel_appointment(doctor_name: str, time_slot: str) -> dict:
+    """Cancels/Deletes an existing appointment."""
+    appointments = _load_appointments()
+    doctor_name = _resolve_doctor(doctor_name, exact_only=True)[0] or doctor_name
+    initial_count = len(appointments)
+    
+    appointments = [appt for appt in appointments if not (appt['doctor'] == doctor_name and appt['time_slot'] == time_slot)]
+    
+    if len(appointments) == initial_count:
+        return {"status": "error", "error_message": "Appointment not found."}
+        
+    _save_appointments(appointments)
+    return {"status": "success", "message": "Appointment cancelled successfully."}
+
+_WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+def _appointment_date(appt: dict) -> Optional[str]:
+    """The date the appointment takes place, YYYY-MM-DD.
+
+    Slots name a weekday ("Monday 10:00-12:00"), so this is the first such day on
+    or after the day it was booked. A slot that starts with a date is used as is.
+    """
+    slot = appt.get("time_slot") or ""
+    day = slot.split(" ", 1)[0].lower()
+    if day not in _WEEKDAYS:
+        parsed = paging.parse_date(day)
+        return parsed.isoformat() if parsed else None
+    booked = paging.parse_date(appt.get("booked_at"))
+    if booked is None:
+        return None
+    return (booked + datetime.timedelta(days=(_WEEKDAYS.index(day) - booked.weekday()) % 7)).isoformat()
+
+def list_appointments(date_from: Optional[str] = None, date_to: Optional[str] = None, limit: int = 50, offset: int = 0) -> dict:
+    """Lists all currently booked appointments.
+    
+    Args:
+        date_from (str): Only include appointments taking place on or after this date, YYYY-MM-DD (optional).
+        date_to (str): Only include appointments taking place on or before this date, YYYY-MM-DD (optional).
+        limit (int): Maximum number of appointments to return (default 50).
+        offset (int): Number of appointments to skip, for paging (default 0).
+        
+    Returns:
+        dict: The appointments, paging info, and a summary of any appointments left out of the result.
+    """
+    appointments = _load_appointments()
+    if not appointments:
+        return {"status": "success", "message": "No appointments found.", "appointments": []}
+    
+    appointments = [a for a in appointments if paging.in_date_range(_appointment_date(a), date_from, date_to)]
+    page = paging.paginate(
+        appointments, limit, offset,
+        lambda omitted: {"doctors": paging.top_counts([a.get("doctor") for a in omitted])}
+    )
+    return {"status": "success", "appointments": appointments[page["offset"]:page["offset"] + page["returned"]], **page}
+
+def list_medical_reports() -> dict:
+    """Lists all available medical reports for the user."""
+    try:
+        if not os.path.exists(DATASETS_DIR):
+             return {"status": "error", "error_message": "Datasets directory not found."}
+        
+        files = glob.glob(os.path.join(DATASETS_DIR, "*.txt"))
+        report_names = [os.path.basename(f) for f in files]
+        return {"status": "success", "reports": report_names}
+    except Exception as e:
+        return {"status": "error", "error_message": str(e)}
+
+def _summarize_omitted_reports(omitted: list) -> dict:
+    dates = sorted(d for d in (paging.parse_date(s['summary'].get('date')) for s in omitted) if d)
+    summary = {"diagnoses": paging.top_counts([s['summary'].get('diagnosis') for s in omitted])}
+    if dates:
+        summary["date_range"] = [dates[0].isoformat(), dates[-1].isoformat()]
+    return summary
+
+def get_reports_summary(date_from: Optional[str] = None, date_to: Optional[str] = None, limit: int = 20, offset: int = 0, fields: Optional[List[str]] = None) -> dict:
+    """Retrieves a summary of all medical reports, newest first.
+    
+    Args:
+        date_from (str): Only include reports dated on or after this date, YYYY-MM-DD (optional).
+        date_to (str): Only include reports dated on or before this date, YYYY-MM-DD (optional).
+        limit (int): Maximum number of reports to return (default 20).
+        offset (int): Number of reports to skip, for paging (default 0).
+        fields (list): Summary fields to include: "date", "diagnosis", "medicines", "other" (default all).
+        
+    Returns:
+        dict: The report summaries, paging info, and a summary of any reports left out of the result.
+    """
+    try:
+        summaries = _load_reports_summary()
+        summaries = [s for s in summaries if paging.in_date_range(s['summary'].get('date'), date_from, date_to)]
+        # Page from the newest report; reports without a readable date go last
+        summaries.sort(key=lambda s: paging.parse_date(s['summary'].get('date')) or datetime.date.min, reverse=True)
+        if fields:
+            summaries = [{"filename": s['filename'], "summary": _select_fields(s['summary'], fields, ())} for s in summaries]
+        page = paging.paginate(summaries, limit, offset, _summarize_omitted_reports)
+        return {"status": "success", "summaries": summaries[page["offset"]:page["offset"] + page["returned"]], **page}
+    except Exception as e:
+        return {"status": "error", "error_message": str(e)}
+
+# --- Report events ---
+_report_saved_listeners = []
+
+def on_report_saved(listener):
+    """Registers `listener(filename, summary_data)` to run after a report is saved or ingested."""
+    _report_saved_listeners.append(listener)
+    return listener
+
+def _emit_report_saved(filename: str, summary_data: dict):
+    for listener in _report_saved_listeners:
+        try:
+            listener(filename, summary_data)
+        except Exception:
+            # A failing listener must not fail the save itself
+            logger.exception("report_saved listener %r failed for %s", listener, filename)
+
+def _update_report_summary(filename: str, summary_data: dict):
+    with _summary_lock:
+        summaries = _load_reports_summary()
+        # Remove existing entry if updating
+        summaries = [s for s in summaries if s['filename'] != filename]
+        
+        summaries.append({
+            "filename": filename,
+            "summary": summary_data
+        })
+        
+        _save_reports_summary(summaries)
+
+def save_medical_report(filename: str, content: str, tool_context=None) -> dict:
+    """Saves a new medical report and updates the summary index."""
+    try:
+        if not os.path.exists(DATASETS_DIR):
+            os.makedirs(DATASETS_DIR)
+            
+        file_path = os.path.join(DATASETS_DIR, filename)
+        with open(file_path, 'w') as f:
+            f.write(content)
+            
+        # Parse and update summary
+        summary_data = _parse_report_content(content)
+        _update_report_summary(filename, summary_data)
+        report_index.upsert(filename, content, _file_version(file_path))
+        _emit_report_saved(filename, summary_data)
+        if tool_context is not None:
+            _remember_report(tool_context, filename, summary_data)
+        
+        return {
+            "status": "success",
+            "message": f"Report '{filename}' saved and summarized.",
+            "summary": summary_data
+        }
+    except Exception as e:
+        return {"status": "error", "error_message": str(e)}
+
+@functools.lru_cache(maxsize=None)
+def _genai():
+    """The Gemini client used to read documents, imported on first use since it is slow to load."""
+    from .fake_gemini import FAKE_MODEL_ENABLED, FakeGenAI
+    if FAKE_MODEL_ENABLED:
+        # Offline stand-in for benchmarks; see fake_gemini.py
+        return FakeGenAI()
+    import google.generativeai as genai
+    return genai
+
+DOCUMENT_MODEL = "gemini-1.5-flash"
+DOCUMENT_EXTRACTION_PROMPT = "Extract all text and key medical details (Date, Diagnosis, Medicines, Symptoms) from this document. Provide the raw text content as well."
+PAGE_CACHE_DIR = os.path.join(DATASETS_DIR, '.page_cache')
+
+def _extract_document_text(file_path: str, mime_type: str) -> str:
+    """Uploads a document to Gemini and returns the extracted text. Raises on failure."""
+    # Both calls go through the shared guard so 429/503s are retried with backoff instead of surfacing
+    sample_file = model_guard.call(_genai().upload_file, path=file_path, mime_type=mime_type)
+    
+    # Using gemini-1.5-flash for multimodal capabilities
+    model = _genai().GenerativeModel(model_name=DOCUMENT_MODEL)
+    
+    response = model_guard.call(model.generate_content, [sample_file, DOCUMENT_EXTRACTION_PROMPT])
+    return response.text
+
+def _analyze_document(file_path: str, mime_type: str) -> dict:
+    """Analyzes a medical document (PDF or Image) to extract content using Gemini."""
+    try:
+        # Configure GenAI
+        api_key = os.environ.get("GOOGLE_API_KEY")
+        from .fake_gemini import FAKE_MODEL_ENABLED
+        if not api_key and not FAKE_MODEL_ENABLED:
+             return {"status": "error", "error_message": "GOOGLE_API_KEY not found in environment."}
+        
+        _genai().configure(api_key=api_key)
+
+        # Long PDFs are split into page ranges that are extracted concurrently
+        if mime_type == 'application/pdf' and pdf_pages.count_pages(file_path) > pdf_pages.PAGES_PER_RANGE:
+            return pdf_pages.analyze_in_ranges(
+                file_path,
+                lambda range_path: _extract_document_text(range_path, mime_type),
+                cache=pdf_pages.PageRangeCache(PAGE_CACHE_DIR),
+                cache_namespace=f"{DOCUMENT_MODEL}:{DOCUMENT_EXTRACTION_PROMPT}",
+            )
+        
+        return {
+            "status": "success",
+            "content": _extract_document_text(file_path, mime_type)
+        }
+    except Exception as e:
+        return {"status": "error", "error_message": str(e)}
+
+async def _extract_document_text_async(file_path: str, mime_type: str) -> str:
+    """Async counterpart of _extract_document_text. The upload has no async API, so only it runs on a thread."""
+    sample_file = await model_guard.call_async(asyncio.to_thread, _genai().upload_file, path=file_path, mime_type=mime_type)
+    model = _genai().GenerativeModel(model_name=DOCUMENT_MODEL)
+    response = await model_guard.call_async(model.generate_content_async, [sample_file, DOCUMENT_EXTRACTION_PROMPT])
+    return response.text
+
+async def _analyze_document_async(file_path: str, mime_type: str) -> dict:
+    """Async counterpart of _analyze_document."""
+    # Long PDFs are extracted on the page-range thread pool either way
+    if mime_type == 'application/pdf' and await asyncio.to_thread(pdf_pages.count_pages, file_path) > pdf_pages.PAGES_PER_RANGE:
+        return await asyncio.to_thread(_analyze_document, file_path, mime_type)
+    try:
+        api_key = os.environ.get("GOOGLE_API_KEY")
+        from .fake_gemini import FAKE_MODEL_ENABLED
+        if not api_key and not FAKE_MODEL_ENABLED:
+             return {"status": "error", "error_message": "GOOGLE_API_KEY not found in environment."}
+        
+        _genai().configure(api_key=api_key)
+        return {
+            "status": "success",
+            "content": await _extract_document_text_async(file_path, mime_type)
+        }
+    except Exception as e:
+        return {"status": "error", "error_message": str(e)}
+
+def _analyze_document_once(file_path: str, mime_type: str) -> dict:
+    """Runs _analyze_document, sharing one upload and analysis among concurrent callers for the same file version."""
+    key = (os.path.realpath(file_path), _file_version(file_path), mime_type)
+    return dict(_analyses.do(key, _analyze_document, file_path, mime_type))
+
+def _document_mime_type(file_path: str) -> Optional[str]:
+    """Mime type for PDF and image reports, which need Gemini to read; None for reports read as text."""
+    mime_type, _ = mimetypes.guess_type(file_path)
+    if mime_type and mime_type.startswith('text'):
+        return None
+    if mime_type and (mime_type.startswith('image') or mime_type == 'application/pdf'):
+        return mime_type
+    # Fallback: Check extension if mime_type is None
+    lower = file_path.lower()
+    if lower.endswith('.pdf'):
+        return 'application/pdf'
+    if lower.endswith('.png'):
+        return 'image/png'
+    if lower.endswith(('.jpg', '.jpeg', '.webp')):
+        return 'image/jpeg'
+    return None
+
+def read_report(report_name: str) -> dict:
+    """Reads the content of a specific medical report. Supports Text, PDF, and Images (JPEG, PNG)."""
+    try:
+        file_path = os.path.join(DATASETS_DIR, report_name)
+        if not os.path.exists(file_path):
+             return {"status": "error", "error_message": f"Report '{report_name}' not found in {DATASETS_DIR}."}
+        
+        # If image or pdf, use Gemini Vision/Multimodal
+        mime_type = _document_mime_type(file_path)
+        if mime_type:
+             return _analyze_document_once(file_path, mime_type)
+        
+        try:
+            with open(file_path, 'r') as f:
+                content = f.read()
+            return {"status": "success", "content": content}
+        except Exception as e:
+            return {"status": "error", "error_message": f"Could not read file {report_name}. Error: {str(e)}"}
+
+    except Exception as e:
+        return {"status": "error", "error_message": str(e)}
+
+@functools.wraps(read_report)
+async def read_report_async(report_name: str) -> dict:
+    file_path = os.path.join(DATASETS_DIR, report_name)
+    mime_type = _document_mime_type(file_path)
+    if not mime_type or not os.path.exists(file_path):
+        return await asyncio.to_thread(read_report, report_name)
+    key = (os.path.realpath(file_path), _file_version(file_path), mime_type)
+    return dict(await _analyses.do_async(key, _analyze_document_async, file_path, mime_type))
+
+def ingest_report(filename: str) -> dict:
+    """Ingests a report file already stored in the datasets folder: extracts its text, parses it and updates the summary index.
+
+    Safe to run more than once for the same file, since the summary entry is replaced rather than duplicated.
+    """
+    extracted = read_report(filename)
+    if extracted["status"] != "success":
+        return extracted
+    
+    summary_data = _parse_report_content(extracted["content"])
+    _update_report_summary(filename, summary_data)
+    
+    # Keep extracted text on disk so every process can index it, not just this one
+    if not _is_text_report(filename):
+        os.makedirs(EXTRACTED_DIR, exist_ok=True)
+        with open(os.path.join(EXTRACTED_DIR, filename + '.txt'), 'w') as f:
+            f.write(extracted["content"])
+    _sync_report_index()
+    _emit_report_saved(filename, summary_data)
+    
+    return {
+        "status": "success",
+        "filename": filename,
+        "summary": summary_data
+    }
+
+def _is_text_report(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() in ('.txt', '')
+
+def _report_text_files() -> dict:
+    """Maps each searchable report name to the file holding its text."""
+    paths = {}
+    if os.path.isdir(EXTRACTED_DIR):
+        for entry in os.scandir(EXTRACTED_DIR):
+            if entry.is_file() and entry.name.endswith('.txt'):
+                paths[entry.name[:-len('.txt')]] = entry.path
+    for entry in os.scandir(DATASETS_DIR):
+        if entry.is_file() and not entry.name.startswith('.') and _is_text_report(entry.name):
+            paths[entry.name] = entry.path
+    return paths
+
+def _sync_report_index():
+    paths = _report_text_files()
+    
+    def read_text(name):
+        with open(paths[name], 'r') as f:
+            return f.read()
+    
+    report_index.sync({name: _file_version(path) for name, path in paths.items()}, read_text)
+
+def search_reports(query: str, k: int = 5) -> dict:
+    """Searches the text of all medical reports and returns only the most relevant passages.
+    
+    Prefer this over 'read_report' when looking for specific details across reports.
+    
+    Args:
+        query (str): What to look for, e.g. "blood pressure" or "migraine medication".
+        k (int): Number of passages to return (default 5).
+        
+    Returns:
+        dict: Matching passages with their report filename and character offsets.
+    """
+    try:
+        if not os.path.exists(DATASETS_DIR):
+            return {"status": "error", "error_message": "Datasets directory not found."}
+        _sync_report_index()
+        return {"status": "success", "results": report_index.search(query, k, method=REPORT_SEARCH_METHOD)}
+    except Exception as e:
+        return {"status": "error", "error_message": str(e)}
+
+def order_medicine(medicine_name: str, quantity: int, tool_context=None) -> dict:
+    """Orders a specified quantity of medicine.
+
+    The order is saved and sent to the pharmacy in the background; use get_order_status with the
+    returned order_id to check on it. Ordering the same medicine and quantity again in the same
+    turn returns the first order instead of placing another.
+    """
+    from .orders import IdempotencyConflict, get_order_dispatcher
+    medicine_name = medicine_name.strip()
+    if quantity <= 0:
+        return {"status": "error", "error_message": "Quantity must be at least 1."}
+    # A retried tool call in the same invocation gets the same key, so it cannot order twice
+    if tool_context is not None:
+        key = f"{tool_context.invocation_id}:{medicine_name}:{quantity}"
+    else:
+        key = uuid.uuid4().hex
+    try:
+        order, created = get_order_dispatcher().submit(key, medicine_name, quantity)
+    except IdempotencyConflict as e:
+        return {"status": "error", "error_message": str(e)}
+    return {
+        "status": "success",
+        "order_id": order["id"],
+        "order_status": order["status"],
+        "message": (
+            f"Order {'placed' if created else 'already placed'} for {quantity} units of {medicine_name}. "
+            "Delivery expected in 2 days once the pharmacy confirms it."
+        ),
+    }
+
+def get_order_status(order_id: str) -> dict:
+    """Returns the status of a medicine order: pending, sending, placed or failed."""
+    from .orders import get_order_dispatcher
+    order = get_order_dispatcher().outbox.get(order_id)
+    if order is None:
+        return {"status": "error", "error_message": f"No order with id {order_id}."}
+    return {"status": "success", "order": order}
+
+def analyze_past_checkups(limit: int = 3) -> dict:
+    """Analyzes the past N medical reports to identify potential disease patterns or history.
+    
+    Args:
+        limit (int): The number of past reports to analyze (default 3).
+        
+    Returns:
+        dict: Analysis of past reports including potential patterns.
+    """
+    try:
+        summaries = _load_reports_summary()
+        # Sort summaries by date if possible, for now we just take the last N added
+        recent_summaries = summaries[-limit:]
+        
+        analysis = {
+            "reports_analyzed": len(recent_summaries),
+            "diagnoses_history": [s['summary']['diagnosis'] for s in recent_summaries],
+            "symptoms_history": [s['summary']['other'] for s in recent_summaries],
+            "medicines_history": [s['summary']['medicines'] for s in recent_summaries],
+            "message": "Analysis based on available report summaries."
+        }
+        
+        return {
+            "status": "success",
+            "analysis": analysis
+        }
+    except Exception as e:
+        return {"status": "error", "error_message": str(e)}
+
+def call_family(contact_name: str, message: str = "Emergency") -> dict:
+    """Simulates calling a family member."""
+    return {
+        "status": "success",
+        "message": f"Calling {contact_name} with message: {message}"
+    }
+
+def book_ambulance(location: str, urgency: str = "High") -> dict:
+    """Simulates booking an ambulance."""
+    return {
+        "status": "success",
+        "message": f"Ambulance dispatched to {location}. Urgency: {urgency}"
+    }
+
+# --- Loop Agent Components ---
+
+def ask_user_for_clarification(question: str) -> dict:
+    """Asks the user a clarifying question about the report."""
+    # In a real scenario, this would trigger a UI prompt. 
+    # For now, we simulate asking by returning the question.
+    return {
+        "status": "waiting_for_input",
+        "question": question
+    }
+
+# Parsed values that mean the field is effectively missing
+_PLACEHOLDER_VALUES = {"", "unknown", "none mentioned", "n/a", "na", "tbd", "?", "-", "pending", "not available"}
+REQUIRED_REPORT_FIELDS = {
+    "date": "Date",
+    "diagnosis": "Diagnosis",
+    "medicines": "Recommendation/Medicines",
+    "other": "Symptoms",
+}
+
+def _missing_report_fields(content: str) -> list:
+    """Returns the required fields that the parser could not find with a real value."""
+    summary = _parse_report_content(content)
+    missing = []
+    for key, label in REQUIRED_REPORT_FIELDS.items():
+        value = summary[key]
+        if key == "other":
+            # The parser keeps the whole "Symptoms: ..." line
+            value = value.split(":", 1)[1] if ":" in value else value
+        if value.strip().strip('.').lower() in _PLACEHOLDER_VALUES:
+            missing.append(label)
+    return missing
+
+# --- Report Verification ---
+# Callbacks shared by the report verification loops of both agents.
+def capture_report_content(callback_context) -> None:
+    """before_agent_callback that keeps the report the user sent in state for the loop's agents.
+
+    A message with any report field replaces the stored report. Any other message answers a
+    clarification question, so it is kept as the user's response and added to the report.
+    """
+    content = callback_context.user_content
+    text = "\n".join(p.text for p in content.parts if p.text) if content and content.parts else ""
+    if not text:
+        return None
+    state = callback_context.state
+    if len(_missing_report_fields(text)) < len(REQUIRED_REPORT_FIELDS):
+        state[STATE_CURRENT_REPORT_CONTENT] = text
+    elif state.get(STATE_CURRENT_REPORT_CONTENT):
+        state[STATE_USER_RESPONSE] = text
+        state[STATE_CURRENT_REPORT_CONTENT] = f"{state[STATE_CURRENT_REPORT_CONTENT]}\n{text}"
+    return None
+
+def skip_clarity_check_if_complete(callback_context):
+    """Answers "CLEAR" without an LLM call when every required field already parses from the report."""
+    content = callback_context.state.get(STATE_CURRENT_REPORT_CONTENT)
+    if not content or _missing_report_fields(content):
+        return None
+    from google.genai import types
+    callback_context.state[STATE_CLARIFICATION_NEEDED] = False
+    return types.Content(role="model", parts=[types.Part(text="CLEAR")])
+
+# --- Async Tools ---
+# The agents get coroutine versions of the tools so file and model I/O runs off the event loop,
+# letting concurrent sessions in one process overlap. Tool names and schemas are unchanged.
+list_doctors_async = to_async(list_doctors)
+get_doctor_schedule_async = to_async(get_doctor_schedule)
+book_appointment_async = to_async(book_appointment, lock=_appointments_lock)
+modify_appointment_async = to_async(modify_appointment, lock=_appointments_lock)
+cancel_appointment_async = to_async(cancel_appointment, lock=_appointments_lock)
+list_appointments_async = to_async(list_appointments)
+list_medical_reports_async = to_async(list_medical_reports)
+get_reports_summary_async = to_async(get_reports_summary)
+save_medical_report_async = to_async(save_medical_report)
+search_reports_async = to_async(search_reports)
+analyze_past_checkups_async = to_async(analyze_past_checkups)
+order_medicine_async = to_async(order_medicine)
+get_order_status_async = to_async(get_order_status)
+call_family_async = to_async(call_family, offload=False)
+book_ambulance_async = to_async(book_ambulance, offload=False)
+ask_user_for_clarification_async = to_async(ask_user_for_clarification, offload=False)
+
+# Diagnoses worth researching ahead of time, since the next question is almost always about treatments.
+RARE_DISEASES_FILE = os.environ.get("RARE_DISEASES_FILE", os.path.join(DATASETS_DIR, 'rare_diseases.json'))
+
+def _match_rare_disease(diagnosis: str) -> Optional[str]:
+    for disease in _load_json(RARE_DISEASES_FILE, []):
+        if re.search(rf"\b{re.escape(disease)}\b", diagnosis, re.IGNORECASE):
+            return disease
+    return None
+
+@on_report_saved
+def _prefetch_rare_disease_research(filename: str, summary_data: dict):
+    """Queues low-priority research for a rare-disease diagnosis so the follow-up question is served from cache."""
+    disease = _match_rare_disease(summary_data.get("diagnosis") or "")
+    if disease is None:
+        return
+    # Only the research agent is needed, not the agent graph, so the API's ingest worker stays light
+    from .research_cache import get_research_service
+    get_research_service().prefetch(disease, f"latest treatments and clinical trials for {disease}")
+
+# --- Memory ---
+# Local vector memory searched by PreloadMemoryTool when the server runs with
+# `--memory_service_uri vectormemory://` (see services.py). A report summary goes
+# in the memory of the user whose agent saved it; turns are added by remember_turn.
+def _remember_report(tool_context, filename: str, summary_data: dict):
+    from .vector_memory import get_memory_service
+    try:
+        get_memory_service().add_report_summary(tool_context.session.app_name, tool_context.user_id, filename, summary_data)
+    except Exception:
+        # The report is saved either way; memory is only a convenience
+        logger.exception("Could not add report %s to memory", filename)
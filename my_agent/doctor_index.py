@@ -0,0 +1,162 @@
+"""Fuzzy lookup of doctors by name and specialty.
+
+Names are normalized (lowercase, punctuation and titles such as "Dr." or
+"Doctor" removed), so "dr a", "Doctor A" and "Dr. A" are the same key. A name
+that does not match exactly is looked up in a trigram index. Each word is
+padded and split into three-letter pieces. The doctors sharing the most pieces
+with the query are then scored by how much of the query they cover, or by
+edit similarity when that is higher, which ranks swapped letters better. That
+handles typos, missing first names and extra words. A query of one word
+ranks the doctors with that surname first. The index is in memory and built
+once per version of doctors.json.
+"""
+import heapq
+import re
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+
+# Words dropped from names before matching
+TITLES = frozenset({"dr", "doctor", "doc", "prof", "professor", "md", "mr", "mrs", "ms", "miss"})
+# A fuzzy match resolves on its own only if it scores at least this and leads the next one by the margin
+RESOLVE_MIN_SCORE = 0.85
+RESOLVE_MARGIN = 0.05
+# Matches scoring below this are not offered as candidates
+CANDIDATE_MIN_SCORE = 0.35
+# Doctors sharing the most trigrams with the query that are scored in full
+_SHORTLIST = 64
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalize_name(name: str) -> str:
+    words = _WORD.findall(name.lower())
+    kept = [w for w in words if w not in TITLES]
+    return " ".join(kept or words)
+
+
+def trigrams(text: str) -> frozenset:
+    """Trigrams of each word padded with a space on both sides, so word starts and ends count."""
+    grams = set()
+    for word in text.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similarity(query: frozenset, candidate: frozenset) -> float:
+    """Mean of how much of the query the candidate covers and their Dice coefficient."""
+    if not query or not candidate:
+        return 0.0
+    shared = len(query & candidate)
+    return (shared / len(query) + 2 * shared / (len(query) + len(candidate))) / 2
+
+
+def name_score(query: str, query_grams: frozenset, name: str, name_grams: frozenset) -> float:
+    """Trigram similarity, or edit similarity of the normalized names if higher."""
+    return max(similarity(query_grams, name_grams), SequenceMatcher(None, query, name, autojunk=False).ratio())
+
+
+class DoctorIndex:
+    """Index over a doctors.json mapping of name -> {"specialty": ..., "free_time": [...]}."""
+
+    def __init__(self, doctors: Dict[str, dict]):
+        self.doctors = doctors
+        self._names: List[str] = list(doctors)
+        self._normalized: List[str] = []
+        self._grams: List[frozenset] = []
+        self._exact: Dict[str, List[int]] = defaultdict(list)
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._by_specialty: Dict[str, List[int]] = defaultdict(list)
+        self._by_surname: Dict[str, List[int]] = defaultdict(list)
+        for i, name in enumerate(self._names):
+            normalized = normalize_name(name)
+            grams = trigrams(normalized)
+            self._normalized.append(normalized)
+            self._grams.append(grams)
+            self._exact[normalized].append(i)
+            if normalized:
+                self._by_surname[normalized.split()[-1]].append(i)
+            for gram in grams:
+                self._postings[gram].append(i)
+            self._by_specialty[doctors[name].get("specialty", "")].append(i)
+        self._specialty_grams = {s: trigrams(normalize_name(s)) for s in self._by_specialty}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def matching_specialties(self, query: str, min_score: float = 0.5) -> List[str]:
+        """Specialties containing `query`, or similar to it ("cardiologist" -> "Cardiology")."""
+        needle = query.strip().lower()
+        grams = trigrams(normalize_name(query))
+        return [
+            s for s, s_grams in self._specialty_grams.items()
+            if needle in s.lower() or similarity(grams, s_grams) >= min_score
+        ]
+
+    def _allowed(self, specialty: Optional[str]) -> Optional[set]:
+        if not specialty:
+            return None
+        return {i for s in self.matching_specialties(specialty) for i in self._by_specialty[s]}
+
+    def with_surname(self, query: str, specialty: Optional[str] = None) -> List[int]:
+        """Doctors whose surname is `query`, if it is a single word."""
+        words = normalize_name(query).split()
+        if len(words) != 1:
+            return []
+        allowed = self._allowed(specialty)
+        return [i for i in self._by_surname.get(words[0], ()) if allowed is None or i in allowed]
+
+    def search(self, query: str, specialty: Optional[str] = None, limit: int = 5) -> List[Tuple[str, float]]:
+        """Up to `limit` (name, score) pairs, best first; an exact match after normalization scores 1.
+
+        For a one-word query, doctors with that surname come before other matches.
+        """
+        allowed = self._allowed(specialty)
+        normalized = normalize_name(query)
+        exact = [i for i in self._exact.get(normalized, []) if allowed is None or i in allowed]
+        if exact:
+            return [(self._names[i], 1.0) for i in exact[:limit]]
+
+        grams = trigrams(normalized)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        counts = shared.items() if allowed is None else ((i, n) for i, n in shared.items() if i in allowed)
+        surname = set(self.with_surname(query, specialty))
+        shortlist = {i for i, _ in heapq.nlargest(_SHORTLIST, counts, key=itemgetter(1))} | surname
+        scored = []
+        for i in shortlist:
+            score = name_score(normalized, grams, self._normalized[i], self._grams[i])
+            if score >= CANDIDATE_MIN_SCORE or i in surname:
+                scored.append((score, i))
+        scored.sort(key=lambda s: (s[1] not in surname, -s[0], self._names[s[1]]))
+        return [(self._names[i], round(score, 3)) for score, i in scored[:limit]]
+
+    def resolve(self, query: str, specialty: Optional[str] = None, limit: int = 5,
+                exact_only: bool = False) -> Tuple[Optional[str], List[Tuple[str, float]]]:
+        """The doctor `query` names, if it is clear which one, and the ranked candidates.
+
+        With `exact_only`, only a name equal to the query after normalization resolves.
+        """
+        candidates = self.search(query, specialty, limit)
+        if not candidates:
+            return None, []
+        best, score = candidates[0]
+        runner_up = candidates[1][1] if len(candidates) > 1 else 0.0
+        if exact_only:
+            exact = score == 1.0 and normalize_name(best) == normalize_name(query) and runner_up < 1.0
+            return (best if exact else None), candidates
+        surname = self.with_surname(query, specialty)
+        if len(surname) == 1:
+            return self._names[surname[0]], candidates
+        if score < RESOLVE_MIN_SCORE or score - runner_up < RESOLVE_MARGIN:
+            return None, candidates
+        # "Dr. Ivanov" covers "Ivan Ivanov" and "Anna Ivanov" alike, however the scores rank them
+        # ("Ryan Ryan" has the same trigrams as "Ryan", so only a name equal to the query is exempt.)
+        grams = trigrams(normalize_name(query))
+        if (normalize_name(best) != normalize_name(query)
+                and sum(grams <= trigrams(normalize_name(name)) for name, _ in candidates) > 1):
+            return None, candidates
+        return best, candidates
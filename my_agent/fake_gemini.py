@@ -0,0 +1,297 @@
+"""Deterministic offline stand-in for the Gemini API, for benchmarks and load tests.
+
+Two fakes cover everything the agents call:
+
+- `FakeGenAI` mirrors the parts of `google.generativeai` used for document
+  analysis (`configure`, `upload_file`, `GenerativeModel.generate_content`).
+- `FakeLlm` is an ADK model that answers agent turns, including scripted
+  function-call sequences.
+
+Both draw latency and injected errors from a `FakeModelConfig`. Draws are seeded
+from the config seed and the request content, so a run is reproducible even
+when calls interleave differently under concurrency.
+
+Set MEDICAL_AGENT_FAKE_MODEL=1 to make the agents use these fakes, and
+FAKE_MODEL_CONFIG to a JSON file to configure them, e.g.::
+
+    {
+      "latency_ms": {"distribution": "lognormal", "median": 800, "sigma": 0.4},
+      "prompt_latency_ms_per_1k_tokens": 20,
+      "error_rate": 0.02,
+      "error_codes": [429, 503],
+      "seed": 7,
+      "scripts": [
+        {"match": "appointments",
+         "steps": [{"tool": "list_appointments", "args": {}},
+                   {"text": "Here are your appointments: {last_tool_result}"}]}
+      ]
+    }
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+from pydantic import Field
+
+from .contents import is_user_message
+from .resilience import guard_for_model
+
+FAKE_MODEL_ENABLED = os.environ.get("MEDICAL_AGENT_FAKE_MODEL", "").lower() in ("1", "true", "yes")
+FAKE_MODEL_CONFIG = os.environ.get("FAKE_MODEL_CONFIG")
+
+DEFAULT_DOCUMENT_TEXT = (
+    "Patient: Test Patient\n"
+    "Date: 2025-01-01\n"
+    "Symptoms: None reported.\n"
+    "Diagnosis: Routine checkup ({filename}).\n"
+    "Recommendation: None."
+)
+
+
+class FakeApiError(Exception):
+    """Injected error carrying an HTTP-style status code, like the real client errors."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+@dataclass
+class FakeModelConfig:
+    # {"distribution": "fixed" | "uniform" | "lognormal", ...}; see sample_latency()
+    latency_ms: dict = field(default_factory=lambda: {"distribution": "fixed", "value": 0})
+    # Extra latency per 1000 prompt tokens, like the prefill cost of a real model
+    prompt_latency_ms_per_1k_tokens: float = 0.0
+    error_rate: float = 0.0
+    error_codes: List[int] = field(default_factory=lambda: [429, 503])
+    seed: int = 0
+    # Each script is {"match": regex, "steps": [step, ...]}; a step is {"text": ...},
+    # {"tool": name, "args": {...}} or {"tools": [{"name": ..., "args": ...}, ...]}.
+    scripts: List[dict] = field(default_factory=list)
+    document_text: str = DEFAULT_DOCUMENT_TEXT
+    default_reply: str = "OK."
+
+    @classmethod
+    def from_file(cls, path: str) -> "FakeModelConfig":
+        with open(path, 'r') as f:
+            return cls(**json.load(f))
+
+    def sample_latency(self, rng: random.Random) -> float:
+        """Returns a latency in seconds drawn from the configured distribution."""
+        spec = self.latency_ms
+        kind = spec.get("distribution", "fixed")
+        if kind == "uniform":
+            value = rng.uniform(spec.get("low", 0), spec.get("high", 0))
+        elif kind == "lognormal":
+            value = spec.get("median", 0) * math.exp(rng.gauss(0, spec.get("sigma", 0.5)))
+        else:
+            value = spec.get("value", 0)
+        return max(0.0, value) / 1000.0
+
+
+def load_config() -> FakeModelConfig:
+    return FakeModelConfig.from_file(FAKE_MODEL_CONFIG) if FAKE_MODEL_CONFIG else FakeModelConfig()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), good enough for relative comparisons."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class _Dice:
+    """Per-request random draws: the same request content gets the same sequence of outcomes."""
+
+    def __init__(self, config: FakeModelConfig):
+        self.config = config
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def roll(self, request_key: str) -> Tuple[float, Optional[FakeApiError]]:
+        digest = hashlib.sha256(request_key.encode()).hexdigest()
+        with self._lock:
+            nth = self._seen.get(digest, 0)
+            self._seen[digest] = nth + 1
+        rng = random.Random(f"{self.config.seed}:{digest}:{nth}")
+        latency = self.config.sample_latency(rng)
+        if self.config.error_codes and rng.random() < self.config.error_rate:
+            code = rng.choice(self.config.error_codes)
+            return latency, FakeApiError(code, "Injected error from the fake Gemini API.")
+        return latency, None
+
+
+# --- google.generativeai stand-in ---
+
+@dataclass
+class FakeFile:
+    name: str
+    uri: str
+    mime_type: str
+    display_name: str
+    size_bytes: int
+
+
+@dataclass
+class FakeResponse:
+    text: str
+
+
+class FakeGenerativeModel:
+    def __init__(self, genai: "FakeGenAI", model_name: str):
+        self._genai = genai
+        self.model_name = model_name
+
+    def _respond(self, contents) -> Tuple[float, Optional[FakeApiError], FakeResponse]:
+        files = [c for c in contents if isinstance(c, FakeFile)]
+        prompts = [c for c in contents if isinstance(c, str)]
+        key = json.dumps([self.model_name, [(f.display_name, f.size_bytes) for f in files], prompts])
+        latency, error = self._genai.dice.roll(key)
+        filename = files[0].display_name if files else ""
+        return latency, error, FakeResponse(text=self._genai.config.document_text.replace("{filename}", filename))
+
+    def generate_content(self, contents) -> FakeResponse:
+        latency, error, response = self._respond(contents)
+        time.sleep(latency)
+        if error:
+            raise error
+        self._genai.calls["generate_content"] += 1
+        return response
+
+    async def generate_content_async(self, contents) -> FakeResponse:
+        latency, error, response = self._respond(contents)
+        await asyncio.sleep(latency)
+        if error:
+            raise error
+        self._genai.calls["generate_content"] += 1
+        return response
+
+
+class FakeGenAI:
+    """Drop-in for the `google.generativeai` module functions used by the document tools."""
+
+    def __init__(self, config: Optional[FakeModelConfig] = None):
+        self.config = config or load_config()
+        self.dice = _Dice(self.config)
+        self.calls = {"upload_file": 0, "generate_content": 0}
+        self._file_ids = itertools.count(1)
+
+    def configure(self, api_key: Optional[str] = None, **kwargs):
+        pass
+
+    def upload_file(self, path: str, mime_type: Optional[str] = None, **kwargs) -> FakeFile:
+        latency, error = self.dice.roll(f"upload:{os.path.basename(path)}:{os.path.getsize(path)}")
+        time.sleep(latency)
+        if error:
+            raise error
+        self.calls["upload_file"] += 1
+        file_id = next(self._file_ids)
+        return FakeFile(
+            name=f"files/fake-{file_id}",
+            uri=f"https://fake.local/files/fake-{file_id}",
+            mime_type=mime_type or "application/octet-stream",
+            display_name=os.path.basename(path),
+            size_bytes=os.path.getsize(path),
+        )
+
+    def GenerativeModel(self, model_name: str, **kwargs) -> FakeGenerativeModel:
+        return FakeGenerativeModel(self, model_name)
+
+
+# --- ADK model stand-in ---
+
+def _turn_position(contents: List[types.Content]) -> Tuple[str, int, Optional[types.FunctionResponse]]:
+    """Finds the user's latest text message, how many model steps have run since, and the last tool result."""
+    user_text, steps, last_result = "", 0, None
+    for content in contents:
+        parts = content.parts or []
+        if is_user_message(content):
+            user_text = " ".join(p.text for p in parts if p.text)
+            steps, last_result = 0, None
+        elif content.role == "model" and any(p.function_call for p in parts):
+            steps += 1
+        for part in parts:
+            if part.function_response:
+                last_result = part.function_response
+    return user_text, steps, last_result
+
+
+def _prompt_tokens(llm_request: LlmRequest) -> int:
+    return estimate_tokens(json.dumps([c.model_dump(exclude_none=True) for c in llm_request.contents], default=str))
+
+
+class FakeLlm(BaseLlm):
+    """ADK model that replies from scripts instead of calling Gemini.
+
+    Within a turn, the n-th model call answers with the n-th step of the first
+    script whose `match` regex matches the user's message. Once the steps run
+    out (or nothing matches) it replies with `default_reply`.
+    """
+
+    config: FakeModelConfig = Field(default_factory=FakeModelConfig)
+    use_guard: bool = True
+
+    _dice: Optional[_Dice] = None
+    _compiled: list = []
+
+    def model_post_init(self, __context):
+        self._dice = _Dice(self.config)
+        self._compiled = [(re.compile(s["match"], re.IGNORECASE), s["steps"]) for s in self.config.scripts]
+
+    @classmethod
+    def supported_models(cls) -> List[str]:
+        return [r"fake-.*"]
+
+    def _step(self, llm_request: LlmRequest) -> dict:
+        user_text, steps_done, _ = _turn_position(llm_request.contents)
+        for pattern, steps in self._compiled:
+            if pattern.search(user_text):
+                return steps[steps_done] if steps_done < len(steps) else {"text": self.config.default_reply}
+        return {"text": self.config.default_reply}
+
+    def _build_response(self, llm_request: LlmRequest) -> LlmResponse:
+        step = self._step(llm_request)
+        _, _, last_result = _turn_position(llm_request.contents)
+        if "text" in step:
+            result_text = json.dumps(last_result.response, default=str)[:2000] if last_result else ""
+            parts = [types.Part(text=step["text"].replace("{last_tool_result}", result_text))]
+        else:
+            calls = step["tools"] if "tools" in step else [{"name": step["tool"], "args": step.get("args", {})}]
+            parts = [types.Part(function_call=types.FunctionCall(name=c["name"], args=c.get("args", {}))) for c in calls]
+
+        output_text = json.dumps([p.model_dump(exclude_none=True) for p in parts], default=str)
+        prompt_tokens, output_tokens = _prompt_tokens(llm_request), estimate_tokens(output_text)
+        return LlmResponse(
+            content=types.Content(role="model", parts=parts),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens,
+            ),
+        )
+
+    async def _generate(self, llm_request: LlmRequest) -> AsyncGenerator[LlmResponse, None]:
+        user_text, steps_done, _ = _turn_position(llm_request.contents)
+        latency, error = self._dice.roll(f"{llm_request.model}:{user_text}:{steps_done}")
+        latency += self.config.prompt_latency_ms_per_1k_tokens * _prompt_tokens(llm_request) / 1e6
+        await asyncio.sleep(latency)
+        if error:
+            raise error
+        yield self._build_response(llm_request)
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        if self.use_guard:
+            async for response in guard_for_model(self.model).stream_async(lambda: self._generate(llm_request)):
+                yield response
+        else:
+            async for response in self._generate(llm_request):
+                yield response
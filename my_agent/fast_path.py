@@ -0,0 +1,177 @@
+"""Answers trivial, unambiguous requests without an LLM turn.
+
+Runs as the root agent's before_agent_callback: when the user's message
+matches a known intent with enough confidence, the matching tool is called
+directly and its result rendered from a template. Anything else falls through
+to the model unchanged. An answered turn skips the agent and its
+after_agent_callbacks, so the router adds it to memory itself.
+"""
+import asyncio
+import os
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+
+from .vector_memory import remember_turn
+
+FAST_PATH_ENABLED = os.environ.get("FAST_PATH_ENABLED", "1").lower() not in ("0", "false", "no")
+MIN_CONFIDENCE = float(os.environ.get("FAST_PATH_MIN_CONFIDENCE", "0.9"))
+
+# Words that signal the user wants more than a plain listing, e.g. "show my appointments and cancel the first one".
+_AMBIGUOUS = re.compile(
+    r"\b(and|but|then|also|book|cancel|reschedule|modify|change|move|delete|remove|when|why|which|should|"
+    r"recommend|best|tomorrow|today|next|dr|doctor \w+)\b"
+)
+_POLITE = r"(?:please |pls |can you |could you |would you |kindly )*"
+_ME = r"(?:(?:me|for me|to me) )?"
+
+APPOINTMENTS_PATTERN = re.compile(
+    rf"^{_POLITE}(?:show|list|view|see|get|display|give|tell)? ?{_ME}(?:all )?(?:of )?(?:my |the |our )?"
+    rf"(?:current |booked |upcoming |scheduled )?appointments?(?: please)?$"
+    rf"|^(?:what|which) (?:are|is) my appointments?$"
+    rf"|^do i have any appointments?$"
+)
+DOCTORS_PATTERN = re.compile(
+    rf"^{_POLITE}(?:show|list|view|see|get|display|give|tell)? ?{_ME}(?:all )?(?:of )?(?:the |your )?"
+    rf"(?:available )?doctors?(?: list)?(?: please)?$"
+    rf"|^(?:which|what) doctors (?:are there|do you have)$"
+    rf"|^who are the doctors$"
+)
+
+
+def normalize(text: str) -> str:
+    text = text.lower().replace("'", "")
+    text = re.sub(r"[^a-z0-9 ]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+@dataclass
+class Intent:
+    name: str
+    pattern: Pattern
+    # Keywords that make the intent plausible even when the full pattern does not match.
+    keywords: Tuple[str, ...]
+    tool: Callable[[], dict]
+    render: Callable[[dict], str]
+
+
+def _more_line(result: dict, noun: str) -> list:
+    shown = result.get("returned", 0)
+    total = result.get("total", shown)
+    return [f"...and {total - shown} more {noun}."] if total > shown else []
+
+
+def render_appointments(result: dict) -> str:
+    appointments = result.get("appointments", [])
+    if not appointments:
+        return "You have no appointments booked."
+    lines = [f"- {a['doctor']}: {a['time_slot']}" for a in appointments] + _more_line(result, "appointments")
+    total = result.get("total", len(appointments))
+    noun = "appointment" if total == 1 else "appointments"
+    return f"You have {total} {noun}:\n" + "\n".join(lines)
+
+
+def render_doctors(result: dict) -> str:
+    doctors = result.get("doctors", [])
+    if not doctors:
+        return "No doctors found."
+    lines = [
+        f"- {d['name']} ({d['specialty']}): {', '.join(d['available_slots']) or 'no free slots'}"
+        for d in doctors
+    ] + _more_line(result, "doctors")
+    return "Here are the available doctors and their free slots:\n" + "\n".join(lines)
+
+
+def _p50(samples) -> Optional[float]:
+    return statistics.median(samples) if samples else None
+
+
+class FastPathRouter:
+    """Pre-router in front of the root agent. Keeps hit-rate and latency stats for both paths."""
+
+    def __init__(self, intents: List[Intent], min_confidence: float = MIN_CONFIDENCE, enabled: bool = FAST_PATH_ENABLED):
+        self.intents = intents
+        self.min_confidence = min_confidence
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {intent.name: 0 for intent in intents}
+        self._misses = 0
+        self._fast_ms = deque(maxlen=1000)
+        self._llm_ms = deque(maxlen=1000)
+        self._llm_started: Dict[str, float] = {}
+
+    def classify(self, text: str) -> Tuple[Optional[Intent], float]:
+        """Returns the best intent for `text` and a confidence between 0 and 1."""
+        normalized = normalize(text)
+        if not normalized or len(normalized.split()) > 12 or _AMBIGUOUS.search(normalized):
+            return None, 0.0
+        best, best_score = None, 0.0
+        for intent in self.intents:
+            if intent.pattern.match(normalized):
+                score = 1.0
+            elif any(k in normalized for k in intent.keywords):
+                score = 0.5
+            else:
+                continue
+            if score > best_score:
+                best, best_score = intent, score
+            elif score == best_score:
+                # Two intents fit equally well, so the request is ambiguous
+                best_score = min(best_score, 0.5)
+        return best, best_score
+
+    async def before_agent_callback(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        started = time.perf_counter()
+        content = callback_context.user_content
+        parts = content.parts if content and content.parts else []
+        # Attachments always need the model.
+        text = " ".join(p.text for p in parts if p.text) if all(p.text for p in parts) else ""
+
+        intent, confidence = self.classify(text) if self.enabled and text else (None, 0.0)
+        if intent is not None and confidence >= self.min_confidence:
+            # The tools read files from disk, so they run off the event loop like the other tools
+            result = await asyncio.to_thread(intent.tool)
+            if result.get("status") == "success":
+                reply = intent.render(result)
+                with self._lock:
+                    self._hits[intent.name] += 1
+                    self._fast_ms.append((time.perf_counter() - started) * 1000)
+                reply = types.Content(role="model", parts=[types.Part(text=reply)])
+                await remember_turn(callback_context, reply)
+                return reply
+
+        with self._lock:
+            self._misses += 1
+            self._llm_started[callback_context.invocation_id] = started
+            # Turns that errored never reach after_agent_callback; drop the oldest so this stays bounded.
+            if len(self._llm_started) > 1000:
+                del self._llm_started[next(iter(self._llm_started))]
+        return None
+
+    def after_agent_callback(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        with self._lock:
+            started = self._llm_started.pop(callback_context.invocation_id, None)
+            if started is not None:
+                self._llm_ms.append((time.perf_counter() - started) * 1000)
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = sum(self._hits.values())
+            total = hits + self._misses
+            p50_fast, p50_llm = _p50(self._fast_ms), _p50(self._llm_ms)
+            return {
+                "turns": total,
+                "hits": dict(self._hits),
+                "hit_rate": hits / total if total else 0.0,
+                "p50_fast_path_ms": p50_fast,
+                "p50_llm_turn_ms": p50_llm,
+                "p50_saved_ms": p50_llm - p50_fast if p50_fast is not None and p50_llm is not None else None,
+            }
@@ -0,0 +1,217 @@
+"""Persistent SQLite-backed job queue with a thread worker pool."""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    run_after REAL NOT NULL,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority DESC, created_at);
+"""
+
+
+class JobQueue:
+    """Jobs survive restarts: a job whose worker died is picked up again once its lease expires.
+
+    Handlers may therefore run more than once for the same job and must be
+    idempotent.
+    """
+
+    def __init__(self, db_path: str, max_attempts: int = 3, lease_seconds: float = 300, retry_delay: float = 5):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit connection; multi-statement updates use explicit transactions.
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, kind: str, payload: dict, priority: int = 0) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, priority, max_attempts, created_at, updated_at, run_after) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), QUEUED, priority, self.max_attempts, now, now, now),
+            )
+        return job_id
+
+    def claim(self, kinds: List[str]) -> Optional[dict]:
+        """Atomically takes the next ready job of one of `kinds`, including expired leases."""
+        now = time.time()
+        placeholders = ",".join("?" for _ in kinds)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # A job whose lease keeps expiring is probably crashing its worker; stop handing it out.
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated_at = ? "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= max_attempts",
+                    (FAILED, "Worker stopped before the job finished.", now, RUNNING, now),
+                )
+                row = conn.execute(
+                    f"SELECT id FROM jobs WHERE kind IN ({placeholders}) AND "
+                    "((status = ? AND run_after <= ?) OR (status = ? AND lease_until < ?)) "
+                    "ORDER BY priority DESC, created_at LIMIT 1",
+                    (*kinds, QUEUED, now, RUNNING, now),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? WHERE id = ?",
+                        (RUNNING, now + self.lease_seconds, now, row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def renew(self, job_id: str, lease_until: float) -> Optional[float]:
+        """Extends the lease of a running job; returns the new lease, or None if the lease was lost."""
+        new_lease = time.time() + self.lease_seconds
+        with self._connect() as conn:
+            renewed = conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ? AND lease_until = ?",
+                (new_lease, job_id, RUNNING, lease_until),
+            ).rowcount
+        return new_lease if renewed else None
+
+    # complete() and fail() only apply while the caller still holds the lease it was given. A worker whose
+    # lease expired may have had its job claimed again, and must not overwrite the newer run's outcome.
+
+    def complete(self, job_id: str, result: dict, lease_until: float) -> bool:
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_until = ?",
+                (SUCCEEDED, json.dumps(result), time.time(), job_id, RUNNING, lease_until),
+            ).rowcount == 1
+
+    def fail(self, job_id: str, error: str, lease_until: float) -> bool:
+        """Requeues the job with a growing delay, or marks it failed once attempts run out."""
+        now = time.time()
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN ? ELSE ? END, error = ?, "
+                "lease_until = NULL, run_after = ? + ? * attempts, updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_until = ?",
+                (QUEUED, FAILED, error, now, self.retry_delay, now, job_id, RUNNING, lease_until),
+            ).rowcount == 1
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class WorkerPool:
+    """Threads that claim jobs from a JobQueue and run the handler registered for each job kind.
+
+    A handler receives the job payload and returns a result dict. Returning a
+    dict with status "error" or raising counts as a failed attempt.
+    """
+
+    def __init__(self, queue: JobQueue, handlers: Dict[str, Callable[[dict], dict]], num_workers: int = 2, poll_interval: float = 0.5):
+        self.queue = queue
+        self.handlers = handlers
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        self._stop.clear()
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        kinds = list(self.handlers)
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(kinds)
+            except sqlite3.OperationalError as e:
+                logger.warning("Could not claim a job: %s", e)
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._execute(job)
+
+    def _heartbeat(self, job: dict, lease: dict, done: threading.Event):
+        """Renews the job's lease while its handler runs, so a slow job is not claimed and run again."""
+        while not done.wait(self.queue.lease_seconds / 3):
+            renewed = self.queue.renew(job["id"], lease["until"])
+            if renewed is None:
+                logger.warning("Job %s (%s) lost its lease while running", job["id"], job["kind"])
+                return
+            lease["until"] = renewed
+
+    def _execute(self, job: dict):
+        lease = {"until": job["lease_until"]}
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, lease, done), daemon=True)
+        heartbeat.start()
+        try:
+            result = self.handlers[job["kind"]](job["payload"])
+            error = result.get("error_message", "Unknown error") if isinstance(result, dict) and result.get("status") == "error" else None
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job["id"], job["kind"])
+            result, error = None, str(e)
+        finally:
+            done.set()
+            heartbeat.join()
+        if error is None:
+            recorded = self.queue.complete(job["id"], result, lease["until"])
+        else:
+            recorded = self.queue.fail(job["id"], error, lease["until"])
+        if not recorded:
+            logger.warning("Job %s (%s) was claimed again by another worker; discarding this run's outcome", job["id"], job["kind"])
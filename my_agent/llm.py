@@ -0,0 +1,28 @@
+"""Model classes used by the agents in place of plain model-name strings."""
+from typing import AsyncGenerator
+
+from google.adk.models import BaseLlm, Gemini, LlmRequest, LlmResponse
+
+from .fake_gemini import FAKE_MODEL_ENABLED, FakeLlm, load_config
+from .resilience import guard_for_model
+
+_fake_config = None
+
+
+class ResilientGemini(Gemini):
+    """Gemini model whose calls go through retries, the shared rate limit and the model's own circuit breaker."""
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        parent = super().generate_content_async
+        async for response in guard_for_model(self.model).stream_async(lambda: parent(llm_request, stream)):
+            yield response
+
+
+def make_model(model_name: str) -> BaseLlm:
+    """Returns the model an agent should use: Gemini behind the resilience guard, or the offline fake when enabled."""
+    global _fake_config
+    if FAKE_MODEL_ENABLED:
+        if _fake_config is None:
+            _fake_config = load_config()
+        return FakeLlm(model=model_name, config=_fake_config)
+    return ResilientGemini(model=model_name)
@@ -0,0 +1,189 @@
+"""Per-agent model tiers, with per-turn routing and fallback.
+
+Each agent is given a policy: a fixed tier ("lite", "standard" or "pro"), or
+"auto" to let `TurnClassifier` pick one per model call. Confirming what a tool
+just did (a booking, a cancellation, an order), or a "yes"/"thanks" after a
+turn that already did it, goes to the lite tier. Turns that pull in several reports, or ask to compare
+or trend them, go to pro. Everything else goes to standard.
+
+If the chosen tier fails before returning anything, after the resilience
+guard's own retries, the call falls back to the next tier in `FALLBACKS`.
+Calls, fallbacks, latency, tokens and estimated cost are counted per tier.
+"""
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from typing import AsyncGenerator, Callable, Dict, FrozenSet, List, Optional
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+
+from .contents import is_user_message
+from .llm import make_model
+
+LITE, STANDARD, PRO = "lite", "standard", "pro"
+AUTO = "auto"
+
+TIER_MODELS = {
+    LITE: os.environ.get("MODEL_TIER_LITE", "gemini-2.5-flash-lite"),
+    STANDARD: os.environ.get("MODEL_TIER_STANDARD", "gemini-2.5-flash"),
+    PRO: os.environ.get("MODEL_TIER_PRO", "gemini-2.5-pro"),
+}
+# Per-agent policy overrides, e.g. {"ClarityChecker": "standard", "medical_companion_agent": "auto"}
+MODEL_ROUTING = json.loads(os.environ.get("MODEL_ROUTING") or "{}")
+
+# Tiers tried, in order, when a tier fails
+FALLBACKS = {LITE: [STANDARD], STANDARD: [LITE], PRO: [STANDARD]}
+
+# USD per million (input, output) tokens, at list price; models not listed are reported without a cost.
+PRICES_PER_1M_TOKENS = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+CONFIRMATION_PATTERN = re.compile(
+    r"(yes|yeah|yep|no|nope|ok(ay)?|sure|thanks?( you)?|thank you|go ahead|confirm(ed)?|correct|cancel it|that'?s (right|all))[.! ]*",
+    re.IGNORECASE,
+)
+SYNTHESIS_PATTERN = re.compile(
+    r"\b(compare|comparison|trend|over time|all (of )?my reports|across (my )?reports|history|progress(ion)?)\b",
+    re.IGNORECASE,
+)
+
+
+class TurnClassifier:
+    """Picks a tier from the request: the user's latest message and the tool results of the current turn."""
+
+    def __init__(self, confirmation_tools: FrozenSet[str], synthesis_tools: FrozenSet[str], min_synthesis_results: int = 2):
+        self.confirmation_tools = frozenset(confirmation_tools)
+        self.synthesis_tools = frozenset(synthesis_tools)
+        self.min_synthesis_results = min_synthesis_results
+
+    def __call__(self, llm_request: LlmRequest) -> str:
+        user_text, results, previous_results = "", [], []
+        for content in llm_request.contents:
+            parts = content.parts or []
+            if is_user_message(content):
+                user_text, results, previous_results = " ".join(p.text for p in parts if p.text), [], results
+            results.extend(p.function_response.name for p in parts if p.function_response)
+        if SYNTHESIS_PATTERN.search(user_text) or sum(r in self.synthesis_tools for r in results) >= self.min_synthesis_results:
+            return PRO
+        if results and all(r in self.confirmation_tools for r in results):
+            return LITE
+        # "Yes" to "Shall I book it?" is about to make the booking; only an acknowledgement of one already made is lite
+        if (not results and CONFIRMATION_PATTERN.fullmatch(user_text.strip())
+                and any(r in self.confirmation_tools for r in previous_results)):
+            return LITE
+        return STANDARD
+
+
+class TierMetrics:
+    def __init__(self, window: int = 1000):
+        self._window = window
+        self._tiers: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _tier(self, tier: str) -> dict:
+        return self._tiers.setdefault(tier, {
+            "calls": 0, "errors": 0, "fallbacks_from": 0, "fallbacks_to": 0,
+            "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+            "_latencies": deque(maxlen=self._window),
+        })
+
+    def record(self, tier: str, model: str, latency_ms: float, response: Optional[LlmResponse], fallback: bool):
+        usage = response.usage_metadata if response else None
+        input_tokens = (usage.prompt_token_count or 0) if usage else 0
+        output_tokens = (usage.candidates_token_count or 0) if usage else 0
+        prices = PRICES_PER_1M_TOKENS.get(model)
+        with self._lock:
+            entry = self._tier(tier)
+            entry["calls"] += 1
+            entry["fallbacks_to"] += fallback
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            if prices:
+                entry["cost_usd"] += (input_tokens * prices[0] + output_tokens * prices[1]) / 1e6
+            entry["_latencies"].append(latency_ms)
+
+    def record_error(self, tier: str, will_fall_back: bool):
+        with self._lock:
+            entry = self._tier(tier)
+            entry["errors"] += 1
+            entry["fallbacks_from"] += will_fall_back
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {}
+            for tier, entry in self._tiers.items():
+                latencies = sorted(entry["_latencies"])
+                result[tier] = {k: v for k, v in entry.items() if not k.startswith("_")}
+                result[tier]["cost_usd"] = round(entry["cost_usd"], 6)
+                result[tier]["p50_ms"] = round(statistics.median(latencies), 1) if latencies else None
+                result[tier]["p95_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1) if latencies else None
+            return result
+
+
+tier_metrics = TierMetrics()
+
+
+class TieredLlm(BaseLlm):
+    """Routes each call to one of `tiers` according to `policy`, falling back to other tiers on error."""
+
+    tiers: Dict[str, BaseLlm]
+    policy: str = STANDARD
+    classifier: Optional[Callable[[LlmRequest], str]] = None
+
+    @classmethod
+    def supported_models(cls) -> List[str]:
+        return []
+
+    def choose_tier(self, llm_request: LlmRequest) -> str:
+        if self.policy == AUTO:
+            return self.classifier(llm_request) if self.classifier else STANDARD
+        return self.policy
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        chosen = self.choose_tier(llm_request)
+        order = [chosen] + [t for t in FALLBACKS.get(chosen, []) if t in self.tiers and t != chosen]
+        for i, tier in enumerate(order):
+            llm = self.tiers[tier]
+            request = llm_request.model_copy(update={"model": llm.model})
+            started = time.perf_counter()
+            last, yielded = None, False
+            try:
+                async for response in llm.generate_content_async(request, stream):
+                    response.custom_metadata = {**(response.custom_metadata or {}), "model_tier": tier, "model": llm.model}
+                    last, yielded = response, True
+                    yield response
+            except Exception:
+                # Once part of a response has gone out, another model cannot take over
+                will_fall_back = not yielded and i + 1 < len(order)
+                tier_metrics.record_error(tier, will_fall_back)
+                if not will_fall_back:
+                    raise
+                continue
+            tier_metrics.record(tier, llm.model, (time.perf_counter() - started) * 1000, last, fallback=i > 0)
+            return
+
+
+def make_tiered_model(agent_name: str, default_policy: str, classifier: Optional[TurnClassifier] = None) -> TieredLlm:
+    """The model for `agent_name`: its `MODEL_ROUTING` policy if set, else `default_policy`."""
+    policy = MODEL_ROUTING.get(agent_name, default_policy)
+    if policy != AUTO and policy not in TIER_MODELS:
+        raise ValueError(f"Unknown model tier {policy!r} for {agent_name}; expected one of {sorted(TIER_MODELS)} or 'auto'.")
+    return TieredLlm(
+        # ADK checks this name for Gemini-only features such as Google Search, so it names a real tier's model
+        model=TIER_MODELS[STANDARD if policy == AUTO else policy],
+        tiers={tier: make_model(name) for tier, name in TIER_MODELS.items()},
+        policy=policy,
+        classifier=classifier,
+    )
+
+
+def get_tier_metrics() -> dict:
+    """Calls, errors, fallbacks, latency percentiles, tokens and estimated cost per tier in this process."""
+    return tier_metrics.snapshot()
@@ -0,0 +1,365 @@
+"""Medicine orders: an idempotent outbox in SQLite, sent to pharmacies in batches.
+
+`OrderOutbox.submit` records an order under an idempotency key. Submitting
+the same key again returns the order already recorded, so a retried tool
+call or HTTP request does not place a second order. `OrderDispatcher`
+threads claim ready orders for one pharmacy at a time, up to `max_batch` of
+them, and send them in a single request. The cost of a round trip is shared
+by the whole batch.
+
+An order goes pending -> sending -> placed, or failed once its attempts run
+out or the pharmacy rejects it. Orders whose dispatcher died mid-send are
+claimed again when their lease expires. The idempotency key goes to the
+pharmacy with every order, so it can recognize a resend.
+"""
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ORDERS_DB_PATH = os.environ.get(
+    "ORDERS_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), 'datasets', 'orders.sqlite3')
+)
+ORDER_BATCH_SIZE = int(os.environ.get("ORDER_BATCH_SIZE", "50"))
+# How long the dispatcher waits after the first new order, for others to join its batch
+ORDER_BATCH_LINGER_MS = float(os.environ.get("ORDER_BATCH_LINGER_MS", "20"))
+ORDER_MAX_ATTEMPTS = int(os.environ.get("ORDER_MAX_ATTEMPTS", "5"))
+# Round-trip time of the local stand-in pharmacy
+PHARMACY_LATENCY_MS = float(os.environ.get("PHARMACY_LATENCY_MS", "50"))
+DEFAULT_PHARMACY = "local"
+
+PENDING = "pending"
+SENDING = "sending"
+PLACED = "placed"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    pharmacy TEXT NOT NULL,
+    medicine_name TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    pharmacy_order_id TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    run_after REAL NOT NULL,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS orders_ready ON orders (status, run_after);
+"""
+
+_READY = "((status = ? AND run_after <= ?) OR (status = ? AND lease_until < ?))"
+
+
+class IdempotencyConflict(ValueError):
+    """Raised when an idempotency key is reused for a different order."""
+
+
+class OrderOutbox:
+    def __init__(self, db_path: str = ORDERS_DB_PATH, max_attempts: int = ORDER_MAX_ATTEMPTS,
+                 lease_seconds: float = 60, retry_delay: float = 2):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit connection; multi-statement updates use explicit transactions.
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, idempotency_key: str, medicine_name: str, quantity: int,
+               pharmacy: str = DEFAULT_PHARMACY) -> Tuple[dict, bool]:
+        """Records an order, or finds the one already recorded under `idempotency_key`.
+
+        Returns the order and whether it was created by this call.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            created = conn.execute(
+                "INSERT OR IGNORE INTO orders (id, idempotency_key, pharmacy, medicine_name, quantity, status, "
+                "max_attempts, created_at, updated_at, run_after) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (uuid.uuid4().hex, idempotency_key, pharmacy, medicine_name, quantity, PENDING,
+                 self.max_attempts, now, now, now),
+            ).rowcount == 1
+            row = conn.execute("SELECT * FROM orders WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+        order = _order(row)
+        if (order["medicine_name"], order["quantity"], order["pharmacy"]) != (medicine_name, quantity, pharmacy):
+            raise IdempotencyConflict(f"Idempotency key {idempotency_key!r} was already used for a different order.")
+        return order, created
+
+    def claim_batch(self, max_batch: int) -> Optional[Tuple[str, List[dict], float]]:
+        """Atomically takes up to `max_batch` ready orders for the pharmacy with the oldest ready order.
+
+        Returns the pharmacy, the orders and the lease they are held under until.
+        """
+        now = time.time()
+        lease_until = now + self.lease_seconds
+        ready = (PENDING, now, SENDING, now)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # An order whose lease keeps expiring is probably crashing its dispatcher; stop sending it.
+                conn.execute(
+                    "UPDATE orders SET status = ?, error = ?, lease_until = NULL, updated_at = ? "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= max_attempts",
+                    (FAILED, "Dispatcher stopped before the order was sent.", now, SENDING, now),
+                )
+                first = conn.execute(
+                    f"SELECT pharmacy FROM orders WHERE {_READY} ORDER BY created_at LIMIT 1", ready
+                ).fetchone()
+                rows = []
+                if first is not None:
+                    rows = conn.execute(
+                        f"SELECT * FROM orders WHERE pharmacy = ? AND {_READY} ORDER BY created_at LIMIT ?",
+                        (first["pharmacy"], *ready, max_batch),
+                    ).fetchall()
+                    conn.executemany(
+                        "UPDATE orders SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? WHERE id = ?",
+                        [(SENDING, lease_until, now, row["id"]) for row in rows],
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if not rows:
+            return None
+        return first["pharmacy"], [_order(row) for row in rows], lease_until
+
+    # mark_placed(), retry() and fail() only change orders still held under `lease_until`. A dispatcher whose
+    # lease expired may have had its orders claimed and placed by another, and must not send them back to pending.
+    # Each returns the number of orders it changed.
+
+    def _update_leased(self, sql: str, params: List[tuple], lease_until: float) -> int:
+        with self._connect() as conn:
+            # One transaction for the whole batch, not one per order
+            conn.execute("BEGIN")
+            cursor = conn.executemany(
+                f"{sql} WHERE id = ? AND status = ? AND lease_until = ?",
+                [(*p, SENDING, lease_until) for p in params],
+            )
+            conn.execute("COMMIT")
+        return cursor.rowcount
+
+    def mark_placed(self, confirmations: Dict[str, str], lease_until: float) -> int:
+        """`confirmations` maps order id to the pharmacy's order id."""
+        now = time.time()
+        return self._update_leased(
+            "UPDATE orders SET status = ?, pharmacy_order_id = ?, error = NULL, lease_until = NULL, updated_at = ?",
+            [(PLACED, pharmacy_order_id, now, order_id) for order_id, pharmacy_order_id in confirmations.items()],
+            lease_until,
+        )
+
+    def retry(self, order_ids: List[str], error: str, lease_until: float) -> int:
+        """Requeues the orders with a growing delay, or marks them failed once attempts run out."""
+        now = time.time()
+        return self._update_leased(
+            "UPDATE orders SET status = CASE WHEN attempts < max_attempts THEN ? ELSE ? END, error = ?, "
+            "lease_until = NULL, run_after = ? + ? * attempts, updated_at = ?",
+            [(PENDING, FAILED, error, now, self.retry_delay, now, order_id) for order_id in order_ids],
+            lease_until,
+        )
+
+    def fail(self, order_ids: List[str], error: str, lease_until: float) -> int:
+        """Marks the orders failed without another attempt, e.g. when the pharmacy rejected them."""
+        now = time.time()
+        return self._update_leased(
+            "UPDATE orders SET status = ?, error = ?, lease_until = NULL, updated_at = ?",
+            [(FAILED, error, now, order_id) for order_id in order_ids],
+            lease_until,
+        )
+
+    def get(self, order_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM orders WHERE id = ?", (order_id,)).fetchone()
+        return _order(row) if row is not None else None
+
+    def counts(self) -> Dict[str, int]:
+        """Number of orders in each status."""
+        with self._connect() as conn:
+            return {row["status"]: row["n"] for row in conn.execute("SELECT status, COUNT(*) AS n FROM orders GROUP BY status")}
+
+
+def _order(row: sqlite3.Row) -> dict:
+    order = dict(row)
+    order.pop("lease_until", None)
+    order.pop("run_after", None)
+    return order
+
+
+class LocalPharmacy:
+    """Stand-in for a pharmacy's batch order endpoint: one simulated round trip per request.
+
+    Orders it has already accepted, recognized by idempotency key, are
+    confirmed again with the same pharmacy order id instead of being placed
+    twice.
+    """
+
+    def __init__(self, latency_ms: float = PHARMACY_LATENCY_MS, per_order_ms: float = 0.1):
+        self.latency_ms = latency_ms
+        self.per_order_ms = per_order_ms
+        self._placed: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def place_batch(self, orders: List[dict]) -> Dict[str, dict]:
+        """Maps each order's idempotency key to {"accepted": bool, "pharmacy_order_id" or "reason"}."""
+        time.sleep((self.latency_ms + self.per_order_ms * len(orders)) / 1000)
+        results = {}
+        with self._lock:
+            self.requests += 1
+            for order in orders:
+                key = order["idempotency_key"]
+                if order["quantity"] <= 0:
+                    results[key] = {"accepted": False, "reason": "Quantity must be positive."}
+                    continue
+                if key not in self._placed:
+                    self._placed[key] = f"PH-{len(self._placed) + 1:06d}"
+                results[key] = {"accepted": True, "pharmacy_order_id": self._placed[key]}
+        return results
+
+    @property
+    def placed(self) -> int:
+        with self._lock:
+            return len(self._placed)
+
+
+class OrderDispatcher:
+    """Threads that send batches of ready orders from an OrderOutbox to their pharmacy.
+
+    `pharmacies` maps each pharmacy name to an object with a `place_batch`
+    method like LocalPharmacy's.
+    """
+
+    def __init__(self, outbox: OrderOutbox, pharmacies: Dict[str, object], max_batch: int = ORDER_BATCH_SIZE,
+                 linger_seconds: float = ORDER_BATCH_LINGER_MS / 1000, num_workers: int = 2, poll_interval: float = 1.0):
+        self.outbox = outbox
+        self.pharmacies = pharmacies
+        self.max_batch = max(1, max_batch)
+        self.linger_seconds = linger_seconds
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "orders_sent": 0, "send_errors": 0, "lost_leases": 0}
+
+    def submit(self, idempotency_key: str, medicine_name: str, quantity: int,
+               pharmacy: str = DEFAULT_PHARMACY) -> Tuple[dict, bool]:
+        """OrderOutbox.submit, then wakes a dispatcher thread."""
+        order, created = self.outbox.submit(idempotency_key, medicine_name, quantity, pharmacy)
+        if created:
+            self._wake.set()
+        return order, created
+
+    def start(self):
+        self._stop.clear()
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._run, name=f"order-dispatcher-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Orders left from a previous run, or due for a retry, are picked up on the poll
+            if self._wake.wait(self.poll_interval) and self.linger_seconds:
+                self._stop.wait(self.linger_seconds)
+            self._wake.clear()
+            try:
+                while not self._stop.is_set() and self.dispatch_once():
+                    pass
+            except sqlite3.OperationalError as e:
+                logger.warning("Could not claim orders: %s", e)
+            except Exception:
+                # Keep the thread alive; orders it was sending are claimed again when their lease expires
+                logger.exception("Dispatching orders failed")
+
+    def dispatch_once(self) -> bool:
+        """Sends one batch. Returns False if no order was ready."""
+        claimed = self.outbox.claim_batch(self.max_batch)
+        if claimed is None:
+            return False
+        name, orders, lease_until = claimed
+        ids = [order["id"] for order in orders]
+        pharmacy = self.pharmacies.get(name)
+        if pharmacy is None:
+            self.outbox.fail(ids, f"Unknown pharmacy {name!r}.", lease_until)
+            return True
+        try:
+            results = pharmacy.place_batch([
+                {k: order[k] for k in ("idempotency_key", "medicine_name", "quantity")} for order in orders
+            ])
+        except Exception as e:
+            logger.exception("Sending %d orders to %s failed", len(orders), name)
+            self.outbox.retry(ids, str(e), lease_until)
+            self._count("send_errors")
+            return True
+
+        placed, missing, rejected = {}, [], {}
+        for order in orders:
+            result = results.get(order["idempotency_key"])
+            if result is None or (result.get("accepted") and not result.get("pharmacy_order_id")):
+                missing.append(order["id"])
+            elif result.get("accepted"):
+                placed[order["id"]] = result["pharmacy_order_id"]
+            else:
+                rejected[order["id"]] = result.get("reason") or "Rejected by the pharmacy."
+        changed = self.outbox.mark_placed(placed, lease_until)
+        for order_id, reason in rejected.items():
+            changed += self.outbox.fail([order_id], reason, lease_until)
+        if missing:
+            changed += self.outbox.retry(missing, "No confirmation from the pharmacy.", lease_until)
+        if changed < len(orders):
+            self._count("lost_leases", len(orders) - changed)
+            logger.warning("%d of %d orders were claimed again before this batch finished", len(orders) - changed, len(orders))
+        self._count("batches")
+        self._count("orders_sent", len(orders))
+        return True
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["mean_batch_size"] = stats["orders_sent"] / stats["batches"] if stats["batches"] else 0.0
+        stats["orders"] = self.outbox.counts()
+        return stats
+
+
+@functools.lru_cache(maxsize=None)
+def get_order_dispatcher() -> OrderDispatcher:
+    """The process's outbox and dispatcher, started on first use; orders a previous run left unsent go out then."""
+    dispatcher = OrderDispatcher(OrderOutbox(ORDERS_DB_PATH), {DEFAULT_PHARMACY: LocalPharmacy()})
+    dispatcher.start()
+    return dispatcher
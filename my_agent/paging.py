@@ -0,0 +1,90 @@
+"""Pagination, filtering and token budgets for tools that return many records."""
+import datetime
+import json
+import os
+from collections import Counter
+from typing import Callable, List, Optional
+
+# Upper bound on the estimated tokens a single bulk tool result may add to the prompt.
+TOOL_TOKEN_BUDGET = int(os.environ.get("TOOL_TOKEN_BUDGET", "2000"))
+
+_DATE_FORMATS = (
+    "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%m/%d/%Y", "%Y/%m/%d",
+    "%b %d %Y", "%B %d %Y", "%d %b %Y", "%d %B %Y", "%b %d, %Y", "%B %d, %Y",
+)
+
+
+def estimate_tokens(value) -> int:
+    """Rough prompt-token cost of a JSON-serializable value (about four characters per token)."""
+    return len(json.dumps(value, default=str)) // 4 + 1
+
+
+def parse_date(text: Optional[str]) -> Optional[datetime.date]:
+    """Parses the date formats found in reports and timestamps, or returns None."""
+    if not text:
+        return None
+    text = text.strip().rstrip('.')
+    try:
+        return datetime.datetime.fromisoformat(text).date()
+    except ValueError:
+        pass
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def in_date_range(value: Optional[str], date_from: Optional[str], date_to: Optional[str]) -> bool:
+    """Whether `value` falls in [date_from, date_to]. Records with unparseable dates only pass an open range."""
+    if not date_from and not date_to:
+        return True
+    parsed = parse_date(value)
+    if parsed is None:
+        return False
+    start, end = parse_date(date_from), parse_date(date_to)
+    return (start is None or parsed >= start) and (end is None or parsed <= end)
+
+
+def top_counts(values: List[str], n: int = 5) -> dict:
+    return dict(Counter(v for v in values if v).most_common(n))
+
+
+def paginate(
+    records: list,
+    limit: int,
+    offset: int,
+    summarize_omitted: Callable[[list], dict],
+    token_budget: int = TOOL_TOKEN_BUDGET,
+) -> dict:
+    """Returns the requested page of `records`, cut short if it would exceed `token_budget`.
+
+    The result includes paging info, and a summary of every record that was left
+    out so the model knows what exists without seeing all of it.
+    """
+    total = len(records)
+    offset = max(0, offset)
+    page = records[offset:offset + max(0, limit)]
+
+    items, used = [], 0
+    for record in page:
+        cost = estimate_tokens(record)
+        if items and used + cost > token_budget:
+            break
+        items.append(record)
+        used += cost
+
+    end = offset + len(items)
+    result = {
+        "total": total,
+        "offset": offset,
+        "returned": len(items),
+        "next_offset": end if end < total else None,
+    }
+    omitted = records[:offset] + records[end:]
+    if omitted:
+        result["omitted"] = {"count": len(omitted), **summarize_omitted(omitted)}
+        if len(items) < len(page):
+            result["omitted"]["note"] = f"Result truncated to fit the {token_budget}-token budget. Use offset/limit or filters to see more."
+    return result
@@ -0,0 +1,196 @@
+"""Splits long PDFs into page ranges so they can be analyzed concurrently."""
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+# Imported when the first PDF is looked at
+PdfReader = None
+PdfWriter = None
+
+PAGES_PER_RANGE = int(os.environ.get("PDF_PAGES_PER_RANGE", "5"))
+MAX_PARALLEL_RANGES = int(os.environ.get("PDF_MAX_PARALLEL_RANGES", "4"))
+# Least recently used page ranges are deleted once the cache directory grows past this
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("PAGE_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+
+@functools.lru_cache(maxsize=None)
+def _import_pypdf() -> bool:
+    global PdfReader, PdfWriter
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:  # Splitting is optional; without pypdf PDFs go through in one request.
+        return False
+    return True
+
+
+def count_pages(file_path: str) -> int:
+    """Returns the number of pages in a PDF, or 0 if it cannot be determined."""
+    if not _import_pypdf():
+        return 0
+    try:
+        return len(PdfReader(file_path).pages)
+    except Exception:
+        return 0
+
+
+def page_ranges(num_pages: int, pages_per_range: int = PAGES_PER_RANGE) -> List[Tuple[int, int]]:
+    """Splits `num_pages` into consecutive (start, end) ranges, 1-based and inclusive."""
+    size = max(1, pages_per_range)
+    return [(start, min(start + size - 1, num_pages)) for start in range(1, num_pages + 1, size)]
+
+
+def _file_digest(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PageRangeCache:
+    """Stores the extracted text of each page range on disk, keyed by document content.
+
+    An entry's mtime is its last use: reads touch it, and once the directory
+    holds more than `max_bytes` the least recently used entries are deleted.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._evict_lock = threading.Lock()
+
+    def _path(self, doc_key: str, page_range: Tuple[int, int]) -> str:
+        return os.path.join(self.cache_dir, doc_key, f"{page_range[0]}-{page_range[1]}.json")
+
+    def get(self, doc_key: str, page_range: Tuple[int, int]) -> Optional[str]:
+        path = self._path(doc_key, page_range)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                text = json.load(f)["text"]
+            os.utime(path)
+            return text
+        except (json.JSONDecodeError, KeyError, OSError):
+            return None
+
+    def put(self, doc_key: str, page_range: Tuple[int, int], text: str):
+        path = self._path(doc_key, page_range)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file of its own first, so a crash or a concurrent writer of the same
+        # range never leaves a half-written entry behind.
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+            tmp_path = f.name
+            try:
+                json.dump({"text": text}, f)
+            except BaseException:
+                f.close()
+                os.remove(tmp_path)
+                raise
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        # One eviction pass at a time; a put that finds one running leaves the work to it.
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            entries, total = [], 0
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith('.json'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+        finally:
+            self._evict_lock.release()
+
+
+def _write_range(reader, page_range: Tuple[int, int], out_path: str):
+    writer = PdfWriter()
+    for index in range(page_range[0] - 1, page_range[1]):
+        writer.add_page(reader.pages[index])
+    with open(out_path, 'wb') as f:
+        writer.write(f)
+
+
+def analyze_in_ranges(
+    file_path: str,
+    extract_fn: Callable[[str], str],
+    cache: PageRangeCache,
+    cache_namespace: str = "",
+    pages_per_range: int = PAGES_PER_RANGE,
+    max_workers: int = MAX_PARALLEL_RANGES,
+) -> dict:
+    """Runs `extract_fn` over each page range of a PDF concurrently and merges the text in page order.
+
+    Successful ranges are cached, so retrying a partially failed document only
+    re-sends the ranges that failed. `cache_namespace` should identify the model
+    and prompt so a change to either does not reuse stale extractions.
+    """
+    _import_pypdf()
+    reader = PdfReader(file_path)
+    ranges = page_ranges(len(reader.pages), pages_per_range)
+    doc_key = hashlib.sha256(f"{_file_digest(file_path)}:{cache_namespace}".encode()).hexdigest()[:32]
+
+    texts = {r: cache.get(doc_key, r) for r in ranges}
+    pending = [r for r in ranges if texts[r] is None]
+    errors = {}
+
+    if pending:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # pypdf readers are not thread-safe, so the range files are written here and only the
+            # extraction calls run in parallel
+            range_paths = {}
+            for page_range in pending:
+                range_path = os.path.join(tmp_dir, f"pages_{page_range[0]}-{page_range[1]}.pdf")
+                try:
+                    _write_range(reader, page_range, range_path)
+                except Exception as e:
+                    errors[page_range] = str(e)
+                    continue
+                range_paths[page_range] = range_path
+
+            def run(page_range):
+                text = extract_fn(range_paths[page_range])
+                cache.put(doc_key, page_range, text)
+                return text
+
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+                futures = {r: pool.submit(run, r) for r in range_paths}
+                for page_range, future in futures.items():
+                    try:
+                        texts[page_range] = future.result()
+                    except Exception as e:
+                        errors[page_range] = str(e)
+
+    if errors:
+        failed = ", ".join(f"{start}-{end}" for start, end in sorted(errors))
+        return {
+            "status": "error",
+            "error_message": f"Failed to analyze pages {failed}: {next(iter(errors.values()))}. "
+                             f"{len(ranges) - len(errors)} of {len(ranges)} page ranges were cached; retrying will only reprocess the failed pages.",
+        }
+
+    merged = "\n\n".join(f"--- Pages {start}-{end} ---\n{texts[(start, end)]}" for start, end in ranges)
+    return {"status": "success", "content": merged, "pages": ranges[-1][1] if ranges else 0}
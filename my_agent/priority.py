@@ -0,0 +1,258 @@
+"""Priority lanes that keep emergencies from queueing behind routine work.
+
+`PriorityRouter.before_agent_callback` reads each user message before the
+model does. If a keyword or phrase marks it as an emergency ("chest pain",
+"send an ambulance", ...), the rest of the turn runs at emergency priority:
+
+- its model calls draw from a share of the rate limit that normal calls cannot
+  use, so they do not wait behind the normal backlog (see resilience.py);
+- its tool calls that run on worker threads go ahead of queued normal calls,
+  and may use worker slots held back from normal calls (`PriorityScheduler`).
+
+Background work, such as research prefetched for a saved report, runs in a
+third, lowest lane: its model calls only take rate-limit tokens nobody else is
+waiting for, and never the circuit breaker's half-open probe.
+
+Work that has already started is not interrupted. The priority is held in a
+context variable, so it follows the turn into tool threads and sub-agents.
+For every turn that calls an emergency tool, the time from the user's message
+to that call (time-to-dispatch) is recorded.
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, FrozenSet, Optional
+
+PRIORITY_LANES_ENABLED = os.environ.get("PRIORITY_LANES_ENABLED", "1").lower() not in ("0", "false", "no")
+# Worker threads for tools, and how many of them only emergency turns may use
+TOOL_WORKERS = int(os.environ.get("TOOL_WORKERS", "16"))
+EMERGENCY_RESERVED_WORKERS = int(os.environ.get("EMERGENCY_RESERVED_WORKERS", "2"))
+EMERGENCY_DISPATCH_TARGET_MS = float(os.environ.get("EMERGENCY_DISPATCH_TARGET_MS", "2000"))
+
+NORMAL, EMERGENCY, BACKGROUND = "normal", "emergency", "background"
+# Order in which queued callers are served
+_RANKS = {EMERGENCY: 0, NORMAL: 1, BACKGROUND: 2}
+
+current_priority: contextvars.ContextVar = contextvars.ContextVar("current_priority", default=NORMAL)
+
+# Matched against lowercased text with punctuation removed
+EMERGENCY_PATTERN = re.compile(
+    r"\b("
+    r"ambulance|emergency|911|112|999|paramedics?|"
+    r"heart attack|stroke|chest (pain|pressure|tightness)|"
+    r"(cant|cannot|can not|unable to|struggling to|hard to) breathe|not breathing|(trouble|difficulty) breathing|"
+    r"unconscious|unresponsive|passed out|fainted|collapsed|seizures?|choking|overdosed?|"
+    r"(severe|heavy|wont stop) bleeding|bleeding (heavily|badly|a lot)|"
+    r"suicid\w*|kill (myself|himself|herself)|anaphyla\w*|allergic reaction"
+    r")\b"
+)
+NOT_AN_EMERGENCY_PATTERN = re.compile(r"\b(not|no|isnt|wasnt|never) (an? )?(emergency|urgent)\b")
+
+
+def _normalize(text: str) -> str:
+    text = text.lower().replace("'", "").replace("’", "")
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+class EmergencyClassifier:
+    """Keyword and phrase matcher run before the model. A false positive only costs reserved capacity."""
+
+    def __init__(self, pattern: re.Pattern = EMERGENCY_PATTERN, negation: re.Pattern = NOT_AN_EMERGENCY_PATTERN):
+        self.pattern = pattern
+        self.negation = negation
+
+    def __call__(self, text: str) -> Optional[str]:
+        """The phrase that marks `text` as an emergency, or None."""
+        normalized = _normalize(text)
+        if not normalized or self.negation.search(normalized):
+            return None
+        match = self.pattern.search(normalized)
+        return match.group(0) if match else None
+
+
+def _percentiles(values) -> dict:
+    values = sorted(values)
+    if not values:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "max_ms": None}
+    return {
+        "count": len(values),
+        "p50_ms": round(statistics.median(values), 1),
+        "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))], 1),
+        "max_ms": round(values[-1], 1),
+    }
+
+
+class PriorityScheduler:
+    """Admits at most `capacity` calls at once, `reserved` of which only emergency calls may take.
+
+    Callers that cannot start wait in one queue, emergencies first and then in
+    arrival order. Safe to share between threads and event loops.
+    """
+
+    def __init__(self, capacity: int, reserved: int = 0):
+        self.capacity = max(1, capacity)
+        self.reserved = min(max(0, reserved), self.capacity - 1)
+        self._in_use = 0
+        # (rank, seq, priority, loop, future); rank 0 is served first
+        self._waiters = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._waits: Dict[str, deque] = {priority: deque(maxlen=1000) for priority in _RANKS}
+        self._queued = {priority: 0 for priority in _RANKS}
+
+    def _limit(self, priority: str) -> int:
+        return self.capacity if priority == EMERGENCY else self.capacity - self.reserved
+
+    def _grant(self, future: asyncio.Future):
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def _wake_locked(self):
+        while self._waiters:
+            _, _, priority, loop, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            # The head is the highest priority waiting; if it cannot start, nothing behind it may.
+            if self._in_use >= self._limit(priority):
+                return
+            heapq.heappop(self._waiters)
+            self._in_use += 1
+            loop.call_soon_threadsafe(self._grant, future)
+
+    async def acquire(self, priority: str = NORMAL) -> float:
+        """Waits for a slot and returns the seconds spent waiting."""
+        started = time.perf_counter()
+        rank = _RANKS[priority]
+        with self._lock:
+            ahead = any(entry[0] <= rank and not entry[4].done() for entry in self._waiters)
+            if not ahead and self._in_use < self._limit(priority):
+                self._in_use += 1
+                return 0.0
+            future = asyncio.get_running_loop().create_future()
+            entry = (rank, next(self._seq), priority, asyncio.get_running_loop(), future)
+            heapq.heappush(self._waiters, entry)
+            self._queued[priority] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                elif not future.cancelled():
+                    # Granted just before the cancellation arrived; `_grant` will not give it back.
+                    self._in_use -= 1
+                    self._wake_locked()
+            raise
+        return time.perf_counter() - started
+
+    def release(self):
+        with self._lock:
+            self._in_use -= 1
+            self._wake_locked()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: Optional[str] = None) -> AsyncIterator[None]:
+        """Holds a slot for the body; `priority` defaults to that of the current turn."""
+        priority = priority or current_priority.get()
+        waited = await self.acquire(priority)
+        with self._lock:
+            self._waits[priority].append(waited * 1000)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "reserved": self.reserved,
+                "in_use": self._in_use,
+                "waiting": sum(not entry[4].done() for entry in self._waiters),
+                "queued": dict(self._queued),
+                "wait": {priority: _percentiles(waits) for priority, waits in self._waits.items()},
+            }
+
+
+class PriorityRouter:
+    """Root-agent callbacks that set each turn's priority and time emergency dispatch.
+
+    Time-to-dispatch is recorded for every turn that calls one of
+    `emergency_tools`, split by whether the classifier caught the emergency
+    ("classified") or only the model did ("missed").
+    """
+
+    def __init__(
+        self,
+        emergency_tools: FrozenSet[str],
+        classifier: Optional[EmergencyClassifier] = None,
+        enabled: bool = PRIORITY_LANES_ENABLED,
+        target_ms: float = EMERGENCY_DISPATCH_TARGET_MS,
+    ):
+        self.emergency_tools = frozenset(emergency_tools)
+        self.classifier = classifier or EmergencyClassifier()
+        self.enabled = enabled
+        self.target_ms = target_ms
+        self._lock = threading.Lock()
+        # invocation_id -> (started, priority); dropped at the first emergency tool call or at the end of the turn
+        self._turns: Dict[str, tuple] = {}
+        self._counts = {NORMAL: 0, EMERGENCY: 0}
+        self._dispatch_ms = {"classified": deque(maxlen=1000), "missed": deque(maxlen=1000)}
+
+    def before_agent_callback(self, callback_context) -> None:
+        started = time.perf_counter()
+        content = callback_context.user_content
+        text = " ".join(p.text for p in content.parts or [] if p.text) if content else ""
+        priority = EMERGENCY if self.enabled and text and self.classifier(text) else NORMAL
+        current_priority.set(priority)
+        with self._lock:
+            self._counts[priority] += 1
+            self._turns[callback_context.invocation_id] = (started, priority)
+            # Turns that errored never reach after_agent_callback; drop the oldest so this stays bounded.
+            if len(self._turns) > 1000:
+                del self._turns[next(iter(self._turns))]
+        return None
+
+    def before_tool_callback(self, tool, args: dict, tool_context) -> None:
+        if tool.name not in self.emergency_tools:
+            return None
+        with self._lock:
+            turn = self._turns.pop(tool_context.invocation_id, None)
+            if turn is not None:
+                started, priority = turn
+                key = "classified" if priority == EMERGENCY else "missed"
+                self._dispatch_ms[key].append((time.perf_counter() - started) * 1000)
+        return None
+
+    def after_agent_callback(self, callback_context) -> None:
+        with self._lock:
+            self._turns.pop(callback_context.invocation_id, None)
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            dispatch = {key: _percentiles(values) for key, values in self._dispatch_ms.items()}
+            over = sum(v > self.target_ms for values in self._dispatch_ms.values() for v in values)
+            return {
+                "enabled": self.enabled,
+                "turns": dict(self._counts),
+                "time_to_dispatch": dispatch,
+                "target_ms": self.target_ms,
+                "over_target": over,
+            }
+
+
+# Offloaded tool calls share these worker slots; see async_tools.py
+tool_scheduler = PriorityScheduler(TOOL_WORKERS, EMERGENCY_RESERVED_WORKERS if PRIORITY_LANES_ENABLED else 0)
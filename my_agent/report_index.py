@@ -0,0 +1,225 @@
+"""Local passage-level search over report text.
+
+Reports are split into overlapping passages indexed in a BM25 inverted index.
+When NumPy is installed, a dense matrix of hashed term frequencies is kept
+alongside it for cosine-similarity search; IDF weights come from the passages
+indexed at query time, so they stay right as reports are added. Everything is
+in memory and updated per file, so saving a report only re-indexes that
+report.
+"""
+import functools
+import hashlib
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+# Imported by the first dense index, so a BM25-only process never loads NumPy
+np = None
+
+CHUNK_CHARS = 500
+CHUNK_OVERLAP = 100
+HASH_DIM = 1024
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or that the this to was were with "
+    "what which who when how my me i do does did".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def chunk_text(text: str, size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+    """Splits text into overlapping (start, end) character spans, ending spans on whitespace where possible."""
+    spans = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            boundary = text.rfind(" ", start + size // 2, end)
+            if boundary != -1:
+                end = boundary
+        spans.append((start, end))
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+
+def _hash_bucket(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=4).digest(), "little") % HASH_DIM
+
+
+class _Passage:
+    __slots__ = ("filename", "start", "end", "text", "tf", "length")
+
+    def __init__(self, filename: str, start: int, end: int, text: str):
+        self.filename = filename
+        self.start = start
+        self.end = end
+        self.text = text
+        self.tf = Counter(tokenize(text))
+        self.length = sum(self.tf.values())
+
+
+@functools.lru_cache(maxsize=None)
+def _import_numpy() -> bool:
+    global np
+    try:
+        import numpy
+    except ImportError:  # The dense index is optional; BM25 needs nothing beyond the standard library.
+        return False
+    np = numpy
+    return True
+
+
+class ReportIndex:
+    def __init__(self, dense: bool = True):
+        self._lock = threading.RLock()
+        self._passages: Dict[int, _Passage] = {}
+        self._by_file: Dict[str, List[int]] = {}
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._total_length = 0
+        self._next_id = 0
+        # Version each file was indexed at; None for text supplied directly (e.g. extracted from a PDF).
+        self._versions: Dict[str, Optional[Hashable]] = {}
+        self.dense = dense and _import_numpy()
+        self._matrix = np.zeros((0, HASH_DIM), dtype=np.float32) if self.dense else None
+        # Live passages with a nonzero weight in each hash bucket, for IDF
+        self._bucket_df = np.zeros(HASH_DIM, dtype=np.float32) if self.dense else None
+        self._row_ids: List[Optional[int]] = []
+        self._row_of: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._passages)
+
+    def upsert(self, filename: str, text: str, version: Optional[Hashable] = None):
+        """(Re)indexes one file's text."""
+        with self._lock:
+            self._remove(filename)
+            ids = []
+            for start, end in chunk_text(text):
+                passage = _Passage(filename, start, end, text[start:end])
+                if not passage.length:
+                    continue
+                passage_id = self._next_id
+                self._next_id += 1
+                self._passages[passage_id] = passage
+                for term, count in passage.tf.items():
+                    self._postings[term][passage_id] = count
+                self._total_length += passage.length
+                ids.append(passage_id)
+            self._by_file[filename] = ids
+            self._versions[filename] = version
+            if self.dense:
+                self._add_rows(ids)
+
+    def remove(self, filename: str):
+        with self._lock:
+            self._remove(filename)
+
+    def _remove(self, filename: str):
+        for passage_id in self._by_file.pop(filename, []):
+            passage = self._passages.pop(passage_id)
+            for term in passage.tf:
+                postings = self._postings[term]
+                postings.pop(passage_id, None)
+                if not postings:
+                    del self._postings[term]
+            self._total_length -= passage.length
+            if self.dense:
+                row = self._row_of.pop(passage_id)
+                self._bucket_df -= self._matrix[row] > 0
+                self._matrix[row] = 0
+                self._row_ids[row] = None
+        self._versions.pop(filename, None)
+
+    def sync(self, versions: Dict[str, Hashable], read_text: Callable[[str], str]):
+        """Brings files on disk up to date: indexes new or changed files and drops deleted ones.
+
+        Files indexed without a version are left alone, since they did not come from `versions`.
+        """
+        with self._lock:
+            for filename in [f for f, v in self._versions.items() if v is not None and f not in versions]:
+                self._remove(filename)
+            for filename, version in versions.items():
+                if self._versions.get(filename, object()) != version:
+                    try:
+                        self.upsert(filename, read_text(filename), version)
+                    except (OSError, UnicodeDecodeError):
+                        self._remove(filename)
+
+    # --- Dense vectors ---
+
+    def _vector(self, tf: Counter) -> "np.ndarray":
+        """Sublinear term frequencies by hash bucket, without IDF."""
+        vector = np.zeros(HASH_DIM, dtype=np.float32)
+        for term, count in tf.items():
+            vector[_hash_bucket(term)] += 1 + math.log(count)
+        return vector
+
+    def _add_rows(self, ids: List[int]):
+        # Compact away rows left by removed passages once they make up half the matrix.
+        if self._row_ids and self._row_ids.count(None) * 2 > len(self._row_ids):
+            live = [(i, r) for r, i in enumerate(self._row_ids) if i is not None]
+            self._matrix = self._matrix[[r for _, r in live]] if live else np.zeros((0, HASH_DIM), dtype=np.float32)
+            self._row_ids = [i for i, _ in live]
+            self._row_of = {i: r for r, i in enumerate(self._row_ids)}
+        if not ids:
+            return
+        rows = np.stack([self._vector(self._passages[i].tf) for i in ids])
+        self._bucket_df += (rows > 0).sum(axis=0)
+        self._row_of.update({i: len(self._row_ids) + offset for offset, i in enumerate(ids)})
+        self._row_ids.extend(ids)
+        self._matrix = np.vstack([self._matrix, rows])
+
+    # --- Search ---
+
+    def _bm25(self, terms: List[str]) -> Dict[int, float]:
+        n = len(self._passages)
+        avg_length = self._total_length / n if n else 0
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(terms):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for passage_id, tf in postings.items():
+                length = self._passages[passage_id].length
+                scores[passage_id] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+        return scores
+
+    def _cosine(self, terms: List[str]) -> Dict[int, float]:
+        if not self._row_ids:
+            return {}
+        idf = np.log1p(len(self._passages) / (1 + self._bucket_df)).astype(np.float32)
+        query = self._vector(Counter(terms)) * idf
+        query_norm = np.linalg.norm(query)
+        if not query_norm:
+            return {}
+        # Cosine of the IDF-weighted vectors, without materializing a weighted copy of the matrix
+        norms = np.sqrt(np.square(self._matrix) @ np.square(idf))
+        similarities = (self._matrix @ (query * idf)) / np.maximum(norms * query_norm, 1e-12)
+        return {self._row_ids[r]: float(similarities[r]) for r in np.nonzero(similarities > 0)[0] if self._row_ids[r] is not None}
+
+    def search(self, query: str, k: int = 5, method: str = "bm25") -> List[dict]:
+        """Returns the top-k passages for `query`, using "bm25" or (if available) "dense" scoring."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            scores = self._cosine(terms) if method == "dense" and self.dense else self._bm25(terms)
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:max(1, k)]
+            return [{
+                "filename": self._passages[i].filename,
+                "start": self._passages[i].start,
+                "end": self._passages[i].end,
+                "score": round(score, 4),
+                "passage": self._passages[i].text,
+            } for i, score in top]
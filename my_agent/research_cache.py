@@ -0,0 +1,425 @@
+"""Persistent cache of MedicalResearchAgent answers.
+
+Answers are keyed by a normalized form of the question and stored in SQLite.
+A lookup also matches paraphrases, by token-set similarity against cached
+questions that name exactly the same subject: the words left once common
+research-question wording ("latest", "treatments", "trials") is removed. So
+"Becker muscular dystrophy" never matches "Duchenne muscular dystrophy".
+An answer can also be tagged with its subject, such as a disease researched
+ahead of time, and is then served for any question that names that subject in
+common research wording ("ALS latest treatments"). Entries older than the TTL are still served, while a background
+refresh renews them, so users only wait on a true miss. Entries past
+`max_stale` are treated as misses. The least recently used entries are evicted
+beyond `max_entries`.
+
+`ResearchService` puts the cache in front of the research agent and runs
+refreshes and prefetches on a background thread, in the lowest priority lane.
+It builds the agent only when research first runs, and needs none of the other
+agents, so the API's ingest worker can prefetch without loading them.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import itertools
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmResponse
+from google.genai import types
+
+from .priority import BACKGROUND, PRIORITY_LANES_ENABLED, current_priority
+from .report_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+RESEARCH_CACHE_TTL_SECONDS = float(os.environ.get("RESEARCH_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESEARCH_CACHE_MAX_STALE_SECONDS = float(os.environ.get("RESEARCH_CACHE_MAX_STALE_SECONDS", str(60 * 24 * 3600)))
+RESEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("RESEARCH_CACHE_MAX_ENTRIES", "500"))
+RESEARCH_CACHE_SIMILARITY = float(os.environ.get("RESEARCH_CACHE_SIMILARITY", "0.75"))
+# How long a duplicate question waits for an identical in-flight search before running its own.
+RESEARCH_WAIT_SECONDS = float(os.environ.get("RESEARCH_WAIT_SECONDS", "120"))
+RESEARCH_CACHE_DB = os.environ.get(
+    "RESEARCH_CACHE_DB", os.path.join(os.path.dirname(os.path.dirname(__file__)), 'datasets', 'research_cache.sqlite3')
+)
+
+# Refresh priorities; lower numbers run first.
+PRIORITY_REFRESH = 10
+PRIORITY_PREFETCH = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS research_answers (
+    key TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS research_answers_lru ON research_answers (accessed_at);
+CREATE TABLE IF NOT EXISTS research_topics (
+    subject TEXT PRIMARY KEY,
+    key TEXT NOT NULL
+);
+"""
+
+# Set while a background refresh runs the agent, so its lookup does not just return the stale answer.
+_bypass_cache = contextvars.ContextVar("research_cache_bypass", default=False)
+
+
+# Wording common to research questions, after stemming. Every other word names the subject (a disease, drug, gene),
+# and must match exactly for a paraphrase to be served.
+_QUESTION_TERMS = frozenset(
+    "latest recent new newest current today update news advance breakthrough development progress "
+    "treatment therapy therapie option approach cure management manage care guideline "
+    "clinical trial study studie research evidence paper publication result finding "
+    "drug medication medicine approved fda experimental emerging promising available best top "
+    "any there about tell find look up show give list info information summary summarize overview "
+    "can should could would will we you your please more most disease disorder syndrome condition".split()
+)
+
+
+def _stem(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
+
+def normalize_query(query: str) -> str:
+    """Order-insensitive key: "Latest ALS treatments?" and "treatment ALS latest" map to the same key."""
+    return " ".join(sorted({_stem(t) for t in tokenize(query)}))
+
+
+def _subject_terms(key: str) -> set:
+    # Single letters are left over from possessives ("Huntington's")
+    return {t for t in key.split() if len(t) > 1 and t not in _QUESTION_TERMS}
+
+
+def _subject(key: str) -> str:
+    return " ".join(sorted(_subject_terms(key)))
+
+
+def _similarity(a: str, b: str) -> float:
+    """Jaccard similarity of two keys, or 0 unless both name the same, non-empty subject."""
+    a_terms, b_terms = set(a.split()), set(b.split())
+    subject = _subject_terms(a)
+    if not subject or subject != _subject_terms(b):
+        return 0.0
+    return len(a_terms & b_terms) / len(a_terms | b_terms)
+
+
+class ResearchCache:
+    def __init__(
+        self,
+        db_path: str,
+        ttl: float = RESEARCH_CACHE_TTL_SECONDS,
+        max_stale: float = RESEARCH_CACHE_MAX_STALE_SECONDS,
+        max_entries: int = RESEARCH_CACHE_MAX_ENTRIES,
+        similarity: float = RESEARCH_CACHE_SIMILARITY,
+    ):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._stats = {"hits": 0, "topic_hits": 0, "similar_hits": 0, "stale_hits": 0, "misses": 0, "puts": 0}
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def lookup(self, query: str, record: bool = True) -> Optional[Tuple[str, bool]]:
+        """Returns (answer, is_stale) for the best cached match, or None on a miss.
+
+        With `record=False` the lookup is a peek: it neither counts in the stats nor refreshes the entry's LRU position.
+        """
+        key = normalize_query(query)
+        if not key:
+            return None
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT key, answer, created_at FROM research_answers WHERE key = ?", (key,)).fetchone()
+            match = "hits"
+            if row is None and _subject(key):
+                row = conn.execute(
+                    "SELECT a.key, a.answer, a.created_at FROM research_topics t "
+                    "JOIN research_answers a ON a.key = t.key WHERE t.subject = ?",
+                    (_subject(key),),
+                ).fetchone()
+                match = "topic_hits"
+            if row is None and self.similarity < 1:
+                candidates = conn.execute("SELECT key, answer, created_at FROM research_answers").fetchall()
+                scored = [(_similarity(key, c[0]), c) for c in candidates]
+                scored = [s for s in scored if s[0] >= self.similarity]
+                if scored:
+                    row = max(scored, key=lambda s: s[0])[1]
+                    match = "similar_hits"
+            if row is None or now - row[2] > self.max_stale:
+                if record:
+                    self._count("misses")
+                return None
+            if record:
+                conn.execute("UPDATE research_answers SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, row[0]))
+        stale = now - row[2] > self.ttl
+        if record:
+            self._count("stale_hits" if stale else match)
+        return row[1], stale
+
+    def put(self, query: str, answer: str):
+        key = normalize_query(query)
+        if not key or not answer.strip():
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO research_answers (key, query, answer, created_at, accessed_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET query = excluded.query, answer = excluded.answer, "
+                "created_at = excluded.created_at, accessed_at = excluded.accessed_at",
+                (key, query, answer, now, now),
+            )
+            conn.execute(
+                "DELETE FROM research_answers WHERE key IN ("
+                "SELECT key FROM research_answers ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        self._count("puts")
+
+    def tag_topic(self, topic: str, query: str):
+        """Serves the answer to `query`, once cached, for any question whose subject is `topic` (e.g. a disease)."""
+        subject = _subject(normalize_query(topic))
+        key = normalize_query(query)
+        if not subject or not key:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO research_topics (subject, key) VALUES (?, ?) "
+                "ON CONFLICT(subject) DO UPDATE SET key = excluded.key",
+                (subject, key),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+class BackgroundRefresher:
+    """Runs research for queries on one background thread, most urgent first, skipping queries already queued."""
+
+    def __init__(self, run_research: Callable[[str], str]):
+        self.run_research = run_research
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._pending = set()
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, query: str, priority: int = PRIORITY_REFRESH) -> bool:
+        key = normalize_query(query)
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="research-refresh", daemon=True)
+                self._thread.start()
+        self._queue.put((priority, next(self._order), key, query))
+        return True
+
+    def _run(self):
+        if PRIORITY_LANES_ENABLED:
+            # Research nobody is waiting for must not slow down user turns
+            current_priority.set(BACKGROUND)
+        while True:
+            _, _, key, query = self._queue.get()
+            token = _bypass_cache.set(True)
+            try:
+                self.run_research(query)
+            except Exception:
+                logger.exception("Background research for %r failed", query)
+            finally:
+                _bypass_cache.reset(token)
+                with self._lock:
+                    self._pending.discard(key)
+
+
+def _text(content: Optional[types.Content]) -> str:
+    if not content or not content.parts:
+        return ""
+    return "".join(p.text for p in content.parts if p.text)
+
+
+class ResearchCacheHooks:
+    """Callbacks that put a ResearchCache in front of the research agent.
+
+    Concurrent misses for the same question share the first caller's run: the
+    others wait for its answer instead of starting their own search. If that run
+    fails, or is cancelled and never reports, the first waiter to notice runs
+    the search itself and the rest wait for it instead.
+    """
+
+    def __init__(self, cache: ResearchCache, refresher: BackgroundRefresher):
+        self.cache = cache
+        self.refresher = refresher
+        self._in_flight: Dict[str, concurrent.futures.Future] = {}
+        self._leaders: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _answer(self, text: str) -> types.Content:
+        return types.Content(role="model", parts=[types.Part(text=text)])
+
+    async def before_agent_callback(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        query = _text(callback_context.user_content)
+        if not query or _bypass_cache.get():
+            return None
+        cached = self.cache.lookup(query)
+        if cached is not None:
+            answer, stale = cached
+            if stale:
+                self.refresher.submit(query)
+            return self._answer(answer)
+
+        key = normalize_query(query)
+        while True:
+            with self._lock:
+                future = self._in_flight.get(key)
+                if future is None:
+                    self._lead(key, callback_context.invocation_id)
+                    return None
+            try:
+                answer = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), RESEARCH_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    if self._in_flight.get(key) is not future:
+                        continue
+                    # The run stalled or was cancelled without reporting; take it over
+                    self._lead(key, callback_context.invocation_id)
+                future.set_result("")
+                return None
+            if answer:
+                return self._answer(answer)
+            # An empty answer means that run failed; join or start the next one
+
+    def _lead(self, key: str, invocation_id: str):
+        # Called with the lock held. A stale leader is forgotten, so its late finish cannot resolve the new run.
+        for stale in [i for i, k in self._leaders.items() if k == key]:
+            del self._leaders[stale]
+        self._in_flight[key] = concurrent.futures.Future()
+        self._leaders[invocation_id] = key
+
+    def after_model_callback(self, callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+        content = llm_response.content
+        is_final = content and not llm_response.partial and not any(p.function_call for p in content.parts or [])
+        answer = _text(content) if is_final else ""
+        if answer:
+            self.cache.put(_text(callback_context.user_content), answer)
+            self._finish(callback_context.invocation_id, answer)
+        return None
+
+    def on_model_error_callback(self, callback_context: CallbackContext, llm_request, error: Exception) -> Optional[LlmResponse]:
+        # A model error ends the run without after_agent_callback; let a waiter retry now instead of at its timeout
+        self._finish(callback_context.invocation_id, "")
+        return None
+
+    def after_agent_callback(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        self._finish(callback_context.invocation_id, "")
+        return None
+
+    def _finish(self, invocation_id: str, answer: str):
+        with self._lock:
+            key = self._leaders.pop(invocation_id, None)
+            future = self._in_flight.pop(key, None) if key else None
+        if future is not None:
+            future.set_result(answer)
+
+
+# --- Research agent ---
+
+RESEARCH_AGENT_NAME = "MedicalResearchAgent"
+RESEARCH_INSTRUCTION = """You are a Medical Research Agent.
+    Your task is to search for new cure methods, treatments, and ongoing research for specific diseases, especially rare ones.
+    Use the Google Search tool to find the most recent and relevant information.
+    Synthesize the search results into a concise summary of potential treatments, clinical trials, or new therapies.
+    Always prioritize information from reputable medical sources (journals, universities, major health organizations).
+    
+    Example: If asked about "gene therapy for [rare disease]", search for "gene therapy [rare disease] latest research", "clinical trials [rare disease] gene therapy", etc.
+    """
+
+
+class ResearchService:
+    """The research agent behind its cache, and a runner for research outside of chat turns."""
+
+    def __init__(self, db_path: str = RESEARCH_CACHE_DB):
+        self.cache = ResearchCache(db_path)
+        self.refresher = BackgroundRefresher(lambda query: asyncio.run(self.run(query)))
+        self.hooks = ResearchCacheHooks(self.cache, self.refresher)
+        self._agent = None
+        self._lock = threading.Lock()
+
+    @property
+    def agent(self):
+        """The research agent, built on first use since it imports ADK's agents and the Gemini client."""
+        with self._lock:
+            if self._agent is None:
+                from google.adk.agents import Agent
+                from google.adk.tools.google_search_tool import GoogleSearchTool
+
+                from .model_tiers import STANDARD, make_tiered_model
+                self._agent = Agent(
+                    name=RESEARCH_AGENT_NAME,
+                    model=make_tiered_model(RESEARCH_AGENT_NAME, STANDARD),
+                    instruction=RESEARCH_INSTRUCTION,
+                    description="Searches for new treatments and cures for diseases, especially rare ones.",
+                    tools=[GoogleSearchTool()],
+                    before_agent_callback=self.hooks.before_agent_callback,
+                    after_model_callback=self.hooks.after_model_callback,
+                    on_model_error_callback=self.hooks.on_model_error_callback,
+                    after_agent_callback=self.hooks.after_agent_callback,
+                )
+            return self._agent
+
+    async def run(self, query: str) -> str:
+        """Runs the research agent on `query` in a session of its own; the answer also lands in the cache."""
+        from google.adk.runners import InMemoryRunner
+        runner = InMemoryRunner(agent=self.agent, app_name="research_refresh")
+        session = await runner.session_service.create_session(app_name="research_refresh", user_id="research_refresh")
+        answer = ""
+        async for event in runner.run_async(
+            user_id=session.user_id,
+            session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text=query)])
+        ):
+            if event.is_final_response() and event.content and event.content.parts:
+                answer = "".join(p.text or "" for p in event.content.parts)
+        return answer
+
+    def prefetch(self, topic: str, query: str) -> bool:
+        """Queues `query` at the lowest priority unless a fresh answer is cached, and serves it for questions naming `topic`."""
+        # Follow-ups word it differently ("ALS latest treatments"), so the answer is served for the topic itself
+        self.cache.tag_topic(topic, query)
+        cached = self.cache.lookup(query, record=False)
+        if cached is not None and not cached[1]:
+            return False
+        return self.refresher.submit(query, PRIORITY_PREFETCH)
+
+
+@functools.lru_cache(maxsize=None)
+def get_research_service() -> ResearchService:
+    """One research service per process, shared by the agents and the report-saved prefetch."""
+    return ResearchService()
@@ -0,0 +1,440 @@
+"""Retry, rate limiting and circuit breaking for outbound model calls."""
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Optional
+
+from .priority import BACKGROUND, EMERGENCY, PRIORITY_LANES_ENABLED, current_priority
+
+# Status codes worth retrying: rate limited, or the upstream is temporarily unhealthy.
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+TRANSIENT_STATUS_NAMES = {"RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL"}
+TRANSIENT_MARKERS = ("RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "Rate limit", "timed out")
+# grpc status code -> the HTTP status Google APIs return for it
+GRPC_TO_HTTP_STATUS = {
+    0: 200, 1: 499, 2: 500, 3: 400, 4: 504, 5: 404, 6: 409, 7: 403, 8: 429,
+    9: 400, 10: 409, 11: 400, 12: 501, 13: 500, 14: 503, 15: 500, 16: 401,
+}
+
+REQUESTS_PER_MINUTE = float(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", "60"))
+BURST = int(os.environ.get("GEMINI_BURST", "10"))
+# Part of the rate limit, and of the burst, that only emergency turns may use; see priority.py
+EMERGENCY_RESERVED_SHARE = float(os.environ.get("EMERGENCY_RESERVED_SHARE", "0.1")) if PRIORITY_LANES_ENABLED else 0.0
+EMERGENCY_RESERVED_BURST = int(os.environ.get("EMERGENCY_RESERVED_BURST", "2"))
+MAX_ATTEMPTS = int(os.environ.get("GEMINI_MAX_ATTEMPTS", "4"))
+BACKOFF_BASE_SECONDS = float(os.environ.get("GEMINI_BACKOFF_BASE_SECONDS", "0.5"))
+BACKOFF_MAX_SECONDS = float(os.environ.get("GEMINI_BACKOFF_MAX_SECONDS", "20"))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("GEMINI_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("GEMINI_BREAKER_RESET_SECONDS", "30"))
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the model while the circuit breaker is open."""
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    """The HTTP status of a failed call, with grpc codes mapped to theirs."""
+    response = getattr(exc, "response", None)
+    for code in (getattr(exc, "code", None), getattr(exc, "status_code", None), getattr(response, "status_code", None)):
+        if callable(code):  # grpc errors expose code() as a method returning a StatusCode
+            try:
+                code = code()
+            except Exception:
+                continue
+            code = getattr(code, "value", code)
+            code = GRPC_TO_HTTP_STATUS.get(code[0] if isinstance(code, tuple) else code)
+        try:
+            return int(code)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def is_transient_error(exc: Exception) -> bool:
+    """Whether an exception from a model call is worth retrying."""
+    if isinstance(exc, (CircuitOpenError, asyncio.CancelledError)):
+        return False
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    code = _status_code(exc)
+    if code is not None:
+        return code in TRANSIENT_STATUS_CODES
+    # e.g. google.genai's APIError.status: "RESOURCE_EXHAUSTED", or a numeric status as text
+    status = str(getattr(exc, "status", "") or "").strip()
+    if status:
+        return status.upper() in TRANSIENT_STATUS_NAMES or status in {str(c) for c in TRANSIENT_STATUS_CODES}
+    message = str(exc)
+    return any(m in message for m in TRANSIENT_MARKERS)
+
+
+def _retry_after_seconds(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket. Callers reserve a token and wait until it is theirs."""
+
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes one token, going into debt if needed, and returns how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0 or self.rate <= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def try_take(self) -> bool:
+        """Takes one token only if one is free now."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def acquire(self) -> float:
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    """Opens after consecutive transient failures and lets a single probe through once the reset timeout passes."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        return self.acquire() is not None
+
+    def acquire(self) -> Optional[bool]:
+        """None if the call is rejected; otherwise whether it is the half-open probe.
+
+        Whoever gets the probe must end it with record_success, record_failure or
+        release_probe, or no further call is let through.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return None
+
+    def release_probe(self):
+        """Lets another call probe, when the probe ended without telling whether the upstream is healthy."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class ModelCallGuard:
+    """Wraps model calls with a shared rate limiter, circuit breaker and jittered exponential backoff.
+
+    Calls made during an emergency turn take a token from `emergency_limiter`,
+    or from `limiter` if one is free there, and never wait behind the backlog
+    of normal calls. Background calls only take a token from `limiter` when one
+    is free, so they never get ahead of a waiting user turn. They fail fast
+    while the breaker is not closed, leaving its probe to a user turn.
+    """
+
+    def __init__(
+        self,
+        limiter: TokenBucket,
+        breaker: CircuitBreaker,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff_base: float = BACKOFF_BASE_SECONDS,
+        backoff_max: float = BACKOFF_MAX_SECONDS,
+        emergency_limiter: Optional[TokenBucket] = None,
+    ):
+        self.limiter = limiter
+        self.emergency_limiter = emergency_limiter
+        self.breaker = breaker
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._metrics = {
+            "calls": 0,
+            "attempts": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "transient_errors": 0,
+            "circuit_open_rejections": 0,
+            "emergency_attempts": 0,
+            "background_attempts": 0,
+            "rate_limit_wait_seconds": 0.0,
+            "emergency_rate_limit_wait_seconds": 0.0,
+            "background_rate_limit_wait_seconds": 0.0,
+            "backoff_wait_seconds": 0.0,
+        }
+        self._metrics_lock = threading.Lock()
+
+    def _count(self, key: str, amount: float = 1):
+        with self._metrics_lock:
+            self._metrics[key] += amount
+
+    def metrics(self) -> dict:
+        """Returns a snapshot of call counters and the current breaker state."""
+        with self._metrics_lock:
+            snapshot = dict(self._metrics)
+        snapshot["circuit_state"] = self.breaker.state
+        return snapshot
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        # Full jitter keeps retries from synchronized clients from arriving together.
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        retry_after = _retry_after_seconds(exc)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def _before_attempt(self) -> bool:
+        """Returns whether this attempt is the breaker's half-open probe."""
+        if current_priority.get() == BACKGROUND and self.breaker.state != CircuitBreaker.CLOSED:
+            self._count("circuit_open_rejections")
+            raise CircuitOpenError("Gemini is recovering; background calls wait until the circuit closes.")
+        is_probe = self.breaker.acquire()
+        if is_probe is None:
+            self._count("circuit_open_rejections")
+            raise CircuitOpenError("Gemini is temporarily unavailable (circuit open). Please try again shortly.")
+        self._count("attempts")
+        return is_probe
+
+    def _on_abandoned(self, is_probe: bool):
+        # Cancelled or closed mid-attempt: nothing was learned about the upstream, so hand the probe back.
+        if is_probe:
+            self.breaker.release_probe()
+
+    def _reserve(self) -> Optional[float]:
+        """Takes a token for this attempt and returns how long to wait before making it.
+
+        Returns None for a background call when no token is free; it should ask again later.
+        """
+        priority = current_priority.get()
+        if priority == BACKGROUND:
+            if not self.limiter.try_take():
+                return None
+            self._count("background_attempts")
+            return 0.0
+        if self.emergency_limiter is None or priority != EMERGENCY:
+            wait = self.limiter.reserve()
+            self._count("rate_limit_wait_seconds", wait)
+            return wait
+        self._count("emergency_attempts")
+        if self.emergency_limiter.try_take() or self.limiter.try_take():
+            return 0.0
+        wait = self.emergency_limiter.reserve()
+        self._count("emergency_rate_limit_wait_seconds", wait)
+        return wait
+
+    def _background_poll(self) -> float:
+        # About the time the bucket takes to refill one token
+        return 1 / self.limiter.rate if self.limiter.rate > 0 else 1.0
+
+    def _wait_for_token(self):
+        wait = self._reserve()
+        while wait is None:
+            poll = self._background_poll()
+            time.sleep(poll)
+            self._count("background_rate_limit_wait_seconds", poll)
+            wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def _wait_for_token_async(self):
+        wait = self._reserve()
+        while wait is None:
+            poll = self._background_poll()
+            await asyncio.sleep(poll)
+            self._count("background_rate_limit_wait_seconds", poll)
+            wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+    def _on_failure(self, attempt: int, exc: Exception) -> Optional[float]:
+        """Records a failed attempt and returns the backoff delay, or None if the error should propagate."""
+        if not is_transient_error(exc):
+            # The upstream answered (e.g. a 400), so it is healthy even though this call failed.
+            self.breaker.record_success()
+            self._count("failures")
+            return None
+        self._count("transient_errors")
+        self.breaker.record_failure()
+        if attempt + 1 >= self.max_attempts or self.breaker.state == CircuitBreaker.OPEN:
+            self._count("failures")
+            return None
+        self._count("retries")
+        delay = self._backoff(attempt, exc)
+        self._count("backoff_wait_seconds", delay)
+        return delay
+
+    def _on_success(self):
+        self.breaker.record_success()
+        self._count("successes")
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Calls `fn`, retrying transient failures. Blocks the calling thread while waiting."""
+        self._count("calls")
+        for attempt in range(self.max_attempts):
+            is_probe = self._before_attempt()
+            try:
+                self._wait_for_token()
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_failure(attempt, e)
+                if delay is None:
+                    raise
+            except BaseException:
+                self._on_abandoned(is_probe)
+                raise
+            else:
+                self._on_success()
+                return result
+            time.sleep(delay)
+
+    async def call_async(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Async variant of `call` for coroutine functions; waits without blocking the event loop."""
+        self._count("calls")
+        for attempt in range(self.max_attempts):
+            is_probe = self._before_attempt()
+            try:
+                await self._wait_for_token_async()
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_failure(attempt, e)
+                if delay is None:
+                    raise
+            except BaseException:
+                self._on_abandoned(is_probe)
+                raise
+            else:
+                self._on_success()
+                return result
+            await asyncio.sleep(delay)
+
+    async def stream_async(self, make_stream: Callable[[], AsyncGenerator]) -> AsyncGenerator:
+        """Iterates an async response stream, retrying only if it fails before yielding anything."""
+        self._count("calls")
+        for attempt in range(self.max_attempts):
+            is_probe = self._before_attempt()
+            yielded = False
+            try:
+                await self._wait_for_token_async()
+                async for item in make_stream():
+                    yielded = True
+                    yield item
+            except Exception as e:
+                # Part of the response already reached the caller, so this attempt is the last one
+                delay = self._on_failure(self.max_attempts - 1 if yielded else attempt, e)
+                if delay is None:
+                    raise
+            except BaseException:
+                self._on_abandoned(is_probe)
+                raise
+            else:
+                self._on_success()
+                return
+            await asyncio.sleep(delay)
+
+
+_rate = REQUESTS_PER_MINUTE / 60.0
+if EMERGENCY_RESERVED_SHARE > 0:
+    _limiter = TokenBucket(_rate * (1 - EMERGENCY_RESERVED_SHARE), BURST - EMERGENCY_RESERVED_BURST)
+    _emergency_limiter = TokenBucket(_rate * EMERGENCY_RESERVED_SHARE, EMERGENCY_RESERVED_BURST)
+else:
+    _limiter, _emergency_limiter = TokenBucket(_rate, BURST), None
+
+model_guard = ModelCallGuard(
+    limiter=_limiter,
+    breaker=CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS),
+    emergency_limiter=_emergency_limiter,
+)
+
+_model_guards: Dict[str, ModelCallGuard] = {}
+_model_guards_lock = threading.Lock()
+
+
+def guard_for_model(model_name: str) -> ModelCallGuard:
+    """The guard for agent calls to `model_name`: the shared rate limits, with a circuit breaker of its own.
+
+    One model tripping its breaker then does not reject calls to the others,
+    so a failing tier can still fall back to another.
+    """
+    with _model_guards_lock:
+        guard = _model_guards.get(model_name)
+        if guard is None:
+            guard = _model_guards[model_name] = ModelCallGuard(
+                limiter=_limiter,
+                breaker=CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS),
+                emergency_limiter=_emergency_limiter,
+            )
+        return guard
+
+
+def get_metrics() -> dict:
+    """Metrics for all model calls made through the guards in this process, with each model's breaker state."""
+    metrics = model_guard.metrics()
+    with _model_guards_lock:
+        guards = dict(_model_guards)
+    circuits = {}
+    for model_name, guard in guards.items():
+        for key, value in guard.metrics().items():
+            if key == "circuit_state":
+                circuits[model_name] = value
+            else:
+                metrics[key] += value
+    metrics["model_circuit_states"] = circuits
+    return metrics
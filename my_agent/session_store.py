@@ -0,0 +1,153 @@
+"""SQLite-backed ADK sessions shared by several worker processes on one box.
+
+Storage is ADK's SqliteSessionService: sessions, app state and user state are
+keyed by app/user/session, and events are appended as rows. On top of that,
+this service:
+
+- switches the database to WAL, so one process reading does not block another writing;
+- indexes events by session and timestamp, which is the order sessions are loaded in;
+- keeps a bounded LRU of hot sessions in memory.
+
+A cached session is only served after a one-row check that neither the session
+nor its app or user state has changed since it was cached, for example because
+another worker appended to it.
+"""
+import os
+import sqlite3
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, Dict, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.adk.sessions.sqlite_session_service import CREATE_SCHEMA_SQL, SqliteSessionService
+from google.adk.sessions.state import State
+
+SESSION_DB_PATH = os.environ.get(
+    "SESSION_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), 'datasets', 'sessions.sqlite3')
+)
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "256"))
+
+_VERSIONS_SQL = """
+SELECT s.update_time,
+       (SELECT update_time FROM app_states WHERE app_name = ?),
+       (SELECT update_time FROM user_states WHERE app_name = ? AND user_id = ?)
+FROM sessions s WHERE s.app_name = ? AND s.user_id = ? AND s.id = ?
+"""
+
+# (session, app state, user state) update times
+Versions = Tuple[float, Optional[float], Optional[float]]
+
+
+class CachedSqliteSessionService(SqliteSessionService):
+    def __init__(self, db_path: str = SESSION_DB_PATH, cache_size: int = SESSION_CACHE_SIZE):
+        super().__init__(db_path)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str, str], Tuple[Session, Versions]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if self._db_path not in ("", ":memory:"):
+            os.makedirs(os.path.dirname(os.path.abspath(self._db_path)), exist_ok=True)
+            with closing(sqlite3.connect(self._db_path, timeout=30)) as conn:
+                # WAL is a property of the database file, so setting it once covers every connection.
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(CREATE_SCHEMA_SQL)
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS events_by_session_time "
+                    "ON events (app_name, user_id, session_id, timestamp)"
+                )
+                conn.commit()
+
+    # --- Hot-session cache ---
+
+    async def _versions(self, app_name: str, user_id: str, session_id: str) -> Optional[Versions]:
+        async with self._get_db_connection() as db:
+            async with db.execute(_VERSIONS_SQL, (app_name, app_name, user_id, app_name, user_id, session_id)) as cursor:
+                row = await cursor.fetchone()
+        return tuple(row) if row else None
+
+    def _remember(self, session: Session, versions: Versions):
+        cached = session.model_copy(deep=True)
+        # Temp state only lives for the invocation that set it; a reload would not have it either.
+        cached.state = {k: v for k, v in cached.state.items() if not k.startswith(State.TEMP_PREFIX)}
+        key = (session.app_name, session.user_id, session.id)
+        self._cache[key] = (cached, versions)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _forget(self, app_name: str, user_id: str, session_id: str):
+        self._cache.pop((app_name, user_id, session_id), None)
+
+    # --- BaseSessionService ---
+
+    async def create_session(
+        self, *, app_name: str, user_id: str, state: Optional[Dict[str, Any]] = None, session_id: Optional[str] = None
+    ) -> Session:
+        session = await super().create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+        versions = await self._versions(app_name, user_id, session.id)
+        if versions is not None:
+            self._remember(session, versions)
+        return session
+
+    async def get_session(
+        self, *, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig] = None
+    ) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        entry = self._cache.get(key)
+        if entry is not None:
+            versions = await self._versions(app_name, user_id, session_id)
+            if versions == entry[1]:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                session = entry[0].model_copy(deep=True)
+                if config and config.after_timestamp:
+                    session.events = [e for e in session.events if e.timestamp >= config.after_timestamp]
+                if config and config.num_recent_events is not None:
+                    session.events = session.events[-config.num_recent_events:] if config.num_recent_events else []
+                return session
+            self._forget(*key)
+
+        self.misses += 1
+        session = await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        # Only full sessions are cached; padded ids resolve to another row and are left uncached.
+        if session is not None and config is None and session.id == session_id:
+            versions = await self._versions(app_name, user_id, session_id)
+            if versions is not None and versions[0] == session.last_update_time:
+                self._remember(session, versions)
+        return session
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self._forget(app_name, user_id, session_id)
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        key = (session.app_name, session.user_id, session.id)
+        entry = self._cache.pop(key, None)
+        event = await super().append_event(session, event)
+        if entry is None or event.partial:
+            return event
+
+        # Keep the entry only if storage changed exactly as this append changed it, i.e. no other worker wrote in between.
+        delta = event.actions.state_delta if event.actions else {}
+        _, app_version, user_version = entry[1]
+        expected = (
+            session.last_update_time,
+            event.timestamp if any(k.startswith(State.APP_PREFIX) for k in delta) else app_version,
+            event.timestamp if any(k.startswith(State.USER_PREFIX) for k in delta) else user_version,
+        )
+        if await self._versions(*key) == expected:
+            self._remember(session, expected)
+        return event
+
+    def stats(self) -> dict:
+        return {"cached_sessions": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+def session_service_factory(uri: str, **kwargs) -> CachedSqliteSessionService:
+    """Factory for ADK's service registry: `cachedsqlite:///path/to/sessions.sqlite3`, or the default path."""
+    path = uri.split("://", 1)[1] if "://" in uri else ""
+    if path.startswith("/"):
+        path = path[1:]
+    return CachedSqliteSessionService(path or SESSION_DB_PATH)
@@ -0,0 +1,112 @@
+"""Coalesces concurrent identical calls so an expensive operation runs once per key."""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+# Result of an async call whose leader was cancelled; waiters run the call again
+_ABANDONED = object()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # Set when the leader was interrupted (KeyboardInterrupt, SystemExit) rather than finishing
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Runs one execution per key at a time; callers arriving while it is in flight share its outcome.
+
+    The result object is handed to every waiter as-is, so callers that mutate it
+    must copy it first. Once the call finishes the key is forgotten, so later
+    calls execute again (caching is left to the caller).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Runs `fn` or waits for the call in flight; if that one's leader is interrupted, tries again."""
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                return self._lead(key, call, fn, *args, **kwargs)
+            call.done.wait()
+            if call.abandoned:
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+    def _join(self, key: Hashable):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+        return call, leader
+
+    def _lead(self, key: Hashable, call: _Call, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            # The interruption belongs to the leader's thread; waiters run the call themselves.
+            call.abandoned = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Async variant for callers on one event loop.
+
+        Waiters are shielded, so one cancelling does not cancel the rest. If the leader is
+        cancelled or interrupted, waiters run the call again, one of them as the new leader.
+        """
+        while True:
+            future = self._async_calls.get(key)
+            if future is None:
+                break
+            self.shared += 1
+            result = await asyncio.shield(future)
+            if result is not _ABANDONED:
+                return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_calls[key] = future
+        self.executions += 1
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it.
+            future.exception()
+            raise
+        except BaseException:
+            # Cancellation belongs to the leader's task, not to the callers sharing its result
+            future.set_result(_ABANDONED)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._async_calls[key]
+
+    def stats(self) -> dict:
+        return {"executions": self.executions, "shared": self.shared, "in_flight": len(self._calls) + len(self._async_calls)}
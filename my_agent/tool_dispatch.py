@@ -0,0 +1,162 @@
+"""Ordering and a concurrency cap for the tool calls in one model response.
+
+ADK starts every function call in a response at once. These callbacks let
+read-only calls run side by side, at most `max_parallel` at a time. A
+mutating call waits for every call before it, and holds back every call after
+it, so "book, then list appointments" sees the booking and two bookings happen
+in the order the model asked for them.
+
+A call counts as finished when any after-tool or tool-error callback sees it,
+including calls answered by another callback before the tool ran. A call that
+no callback ever reports, for example one answered by a plugin's error
+callback, only holds the others back for `TOOL_ORDER_WAIT_SECONDS`.
+"""
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from google.adk.tools import BaseTool, ToolContext
+
+logger = logging.getLogger(__name__)
+
+TOOL_MAX_PARALLEL = int(os.environ.get("TOOL_MAX_PARALLEL", "4"))
+TOOL_ORDER_WAIT_SECONDS = float(os.environ.get("TOOL_ORDER_WAIT_SECONDS", "60"))
+
+
+class _Turn:
+    """The function calls of one model response, in the order the model emitted them."""
+
+    def __init__(self, calls: List[Tuple[str, bool]], max_parallel: int):
+        self.order = [call_id for call_id, _ in calls]
+        self.mutating = dict(calls)
+        self.done = {call_id: asyncio.Event() for call_id in self.order}
+        self.semaphore = asyncio.Semaphore(max_parallel)
+        self.pending = len(self.order)
+        # Calls that passed before_tool_callback, and those of them holding a semaphore slot
+        self.started = set()
+        self.holding = set()
+
+    def prerequisites(self, call_id: str) -> List[str]:
+        earlier = self.order[:self.order.index(call_id)]
+        if self.mutating[call_id]:
+            return earlier
+        return [c for c in earlier if self.mutating[c]]
+
+
+class ToolDispatcher:
+    """Tools named in `read_only` may overlap; every other tool is treated as mutating."""
+
+    def __init__(self, read_only: FrozenSet[str], max_parallel: int = TOOL_MAX_PARALLEL,
+                 wait_timeout: float = TOOL_ORDER_WAIT_SECONDS):
+        self.read_only = frozenset(read_only)
+        self.max_parallel = max(1, max_parallel)
+        self.wait_timeout = wait_timeout
+        self._turns: Dict[str, _Turn] = {}
+        # function_call_id -> key of the turn it belongs to, for every call of every known turn
+        self._call_turns: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {"calls": 0, "ordered_waits": 0, "max_in_flight": 0, "wait_timeouts": 0}
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _turn(self, tool_context: ToolContext) -> Optional[Tuple[str, _Turn]]:
+        call_id = tool_context.function_call_id
+        # The response that made this call is among the latest events of the session.
+        for event in reversed(tool_context.session.events[-10:]):
+            calls = event.get_function_calls()
+            if not any(c.id == call_id for c in calls):
+                continue
+            with self._lock:
+                turn = self._turns.get(event.id)
+                if turn is None:
+                    turn = self._turns[event.id] = _Turn(
+                        [(c.id, c.name not in self.read_only) for c in calls], self.max_parallel
+                    )
+                    self._call_turns.update((c.id, event.id) for c in calls)
+                    # Turns cut short by cancellation never finish; drop the oldest so this stays bounded.
+                    if len(self._turns) > 1000:
+                        self._drop(next(iter(self._turns)))
+            return event.id, turn
+        return None
+
+    async def _wait(self, awaitable, call_id: str, what: str) -> bool:
+        try:
+            await asyncio.wait_for(awaitable, self.wait_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self._count("wait_timeouts")
+            logger.warning("Tool call %s gave up waiting for %s after %.0f s", call_id, what, self.wait_timeout)
+            return False
+
+    async def before_tool_callback(self, tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext) -> Optional[dict]:
+        found = self._turn(tool_context)
+        if found is None:
+            return None
+        key, turn = found
+        call_id = tool_context.function_call_id
+        if type(tool) is BaseTool:
+            # ADK's placeholder for an unknown tool name: nothing will run, and no after-tool callback follows
+            self._finish(call_id)
+            return None
+        try:
+            waits = [turn.done[c].wait() for c in turn.prerequisites(call_id) if not turn.done[c].is_set()]
+            if waits:
+                self._count("ordered_waits")
+                await self._wait(asyncio.gather(*waits), call_id, "the calls before it")
+            if await self._wait(turn.semaphore.acquire(), call_id, "a free slot"):
+                turn.holding.add(call_id)
+        except BaseException:
+            self._finish(call_id)
+            raise
+        with self._lock:
+            turn.started.add(call_id)
+            self._in_flight += 1
+            self._stats["calls"] += 1
+            self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._in_flight)
+        return None
+
+    def after_tool_callback(self, tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext, tool_response: Any) -> Optional[dict]:
+        # The call may have been answered by an earlier before-tool callback, so its turn may be new here.
+        if self._turn(tool_context) is not None:
+            self._finish(tool_context.function_call_id)
+        return None
+
+    def on_tool_error_callback(self, tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext, error: Exception) -> Optional[dict]:
+        # Returning None lets the error propagate as usual; the call's slot just has to be freed.
+        # An unknown tool was already marked finished by before_tool_callback.
+        if type(tool) is not BaseTool and self._turn(tool_context) is not None:
+            self._finish(tool_context.function_call_id)
+        return None
+
+    def _finish(self, call_id: str):
+        """Marks the call finished, whether or not before_tool_callback saw it, and frees its slot."""
+        with self._lock:
+            key = self._call_turns.get(call_id)
+            turn = self._turns.get(key) if key else None
+            if turn is None or turn.done[call_id].is_set():
+                return
+            turn.done[call_id].set()
+            if call_id in turn.started:
+                self._in_flight -= 1
+            turn.pending -= 1
+            if turn.pending == 0:
+                self._drop(key)
+        if call_id in turn.holding:
+            turn.holding.discard(call_id)
+            turn.semaphore.release()
+
+    def _drop(self, key: str):
+        # Called with the lock held
+        turn = self._turns.pop(key, None)
+        if turn is not None:
+            for call_id in turn.order:
+                self._call_turns.pop(call_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, in_flight=self._in_flight)
@@ -0,0 +1,80 @@
+"""Per-session memoization of read-only tool results.
+
+The first call to a memoized tool in a session runs normally and records the
+data version it saw in session state. A repeat call with the same arguments,
+made while that version is unchanged, skips the tool and returns a short
+marker pointing the model at the result it already has in context.
+"""
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from google.adk.tools import BaseTool, ToolContext
+
+STATE_TOOL_MEMO = "tool_memo"
+
+
+def is_unchanged_marker(response: Any) -> bool:
+    """Whether a tool response is the memo's marker rather than the tool's own result."""
+    return isinstance(response, dict) and response.get("unchanged") is True
+
+
+def _memo_key(tool_name: str, args: Dict[str, Any]) -> str:
+    return f"{tool_name}:{json.dumps(args, sort_keys=True, default=str)}"
+
+
+class SessionToolMemo:
+    """`versions` maps each memoized tool name to a function returning the current version of the data it reads."""
+
+    def __init__(self, versions: Dict[str, Callable[[], Hashable]]):
+        self.versions = versions
+        self.hits = 0
+        self.misses = 0
+        # Version observed before each call, so a change made during the call invalidates its result.
+        self._pending: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _version(self, tool_name: str) -> str:
+        return repr(self.versions[tool_name]())
+
+    def before_tool_callback(self, tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext) -> Optional[dict]:
+        if tool.name not in self.versions:
+            return None
+        version = self._version(tool.name)
+        memo = tool_context.state.get(STATE_TOOL_MEMO) or {}
+        if memo.get(_memo_key(tool.name, args)) == version:
+            with self._lock:
+                self.hits += 1
+            return {
+                "status": "success",
+                "unchanged": True,
+                "message": f"Unchanged since the last {tool.name} call with these arguments in this conversation. Use that result."
+            }
+        with self._lock:
+            self.misses += 1
+            self._pending[tool_context.function_call_id] = version
+        return None
+
+    def after_tool_callback(self, tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext, tool_response: Any) -> Optional[dict]:
+        with self._lock:
+            version = self._pending.pop(tool_context.function_call_id, None)
+        if version is None or not isinstance(tool_response, dict) or tool_response.get("status") != "success":
+            return None
+        memo = dict(tool_context.state.get(STATE_TOOL_MEMO) or {})
+        memo[_memo_key(tool.name, args)] = version
+        # Reassign rather than mutate so the change is recorded in the event's state delta.
+        tool_context.state[STATE_TOOL_MEMO] = memo
+        return None
+
+    def on_tool_error_callback(self, tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext, error: Exception) -> Optional[dict]:
+        # No after-tool callback follows a failed call; nothing is memoized and the error propagates as usual.
+        with self._lock:
+            self._pending.pop(tool_context.function_call_id, None)
+        return None
+
+    def forget(self, state, calls: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Drops the memo for these (tool name, args) calls, e.g. once their results are no longer in context."""
+        memo = state.get(STATE_TOOL_MEMO) or {}
+        keys = {_memo_key(name, args) for name, args in calls} & set(memo)
+        if keys:
+            state[STATE_TOOL_MEMO] = {k: v for k, v in memo.items() if k not in keys}
@@ -0,0 +1,292 @@
+"""Per-turn spans for agents, model calls and tool calls.
+
+`Tracer.instrument` adds callbacks to an agent tree that time each agent run,
+each model call (with token counts) and each tool call (with payload sizes).
+Finished spans go to a ring buffer that can be queried in process, and to a
+size-rotated JSONL file. Spans from one user turn share its invocation id as
+their `trace_id`.
+
+The file is opened when the first span is written, again in each process, so
+importing this module creates nothing on disk. Server workers may share the
+file: each write and rotation holds a lock on `<file>.lock`, and a process
+reopens the file when another one has rotated it.
+"""
+import inspect
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes are only safe within one process
+    fcntl = None
+
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "1").lower() not in ("0", "false", "no")
+TRACE_FILE = os.environ.get(
+    "TRACE_FILE", os.path.join(os.path.dirname(os.path.dirname(__file__)), 'datasets', 'traces.jsonl')
+)
+TRACE_MAX_BYTES = int(os.environ.get("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.environ.get("TRACE_BACKUP_COUNT", "3"))
+TRACE_BUFFER_SPANS = int(os.environ.get("TRACE_BUFFER_SPANS", "2000"))
+
+# Spans whose end callback never runs (e.g. a turn that was cancelled) are dropped past this.
+_MAX_OPEN_SPANS = 1000
+
+
+def _payload_bytes(value: Any) -> int:
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class _SharedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """A RotatingFileHandler that several processes can append to and rotate."""
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        self._lock_file = open(f"{path}.lock", 'a') if fcntl else None
+
+    def emit(self, record):
+        if self._lock_file is None:
+            return super().emit(record)
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            if self.stream is not None and not self._is_current():
+                # Another process rotated the file; write to the new one
+                self.stream.close()
+                self.stream = None
+            super().emit(record)
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _is_current(self) -> bool:
+        try:
+            return os.stat(self.baseFilename).st_ino == os.fstat(self.stream.fileno()).st_ino
+        except OSError:
+            return False
+
+    def close(self):
+        super().close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class Tracer:
+    def __init__(
+        self,
+        path: Optional[str] = TRACE_FILE,
+        max_bytes: int = TRACE_MAX_BYTES,
+        backup_count: int = TRACE_BACKUP_COUNT,
+        buffer_size: int = TRACE_BUFFER_SPANS,
+        enabled: bool = TRACING_ENABLED,
+    ):
+        self.path = path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._buffer = deque(maxlen=buffer_size)
+        self._open: Dict[Tuple, dict] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Created by the first span written in each process
+        self._file_logger = None
+        self._file_pid = None
+
+    def _file(self) -> Optional[logging.Logger]:
+        if not (self.enabled and self.path):
+            return None
+        with self._lock:
+            if self._file_pid != os.getpid():
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                handler = _SharedRotatingFileHandler(self.path, self.max_bytes, self.backup_count)
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                file_logger = logging.getLogger(f"{__name__}.spans.{id(self)}")
+                file_logger.propagate = False
+                file_logger.setLevel(logging.INFO)
+                # A forked worker drops the handler (and lock) it inherited
+                for inherited in list(file_logger.handlers):
+                    file_logger.removeHandler(inherited)
+                file_logger.addHandler(handler)
+                self._file_logger, self._file_pid = file_logger, os.getpid()
+            return self._file_logger
+
+    # --- Spans ---
+
+    def _start(self, key: Tuple, trace_id: str, kind: str, name: str, parent_key: Optional[Tuple] = None, **attrs):
+        with self._lock:
+            parent = self._open.get(parent_key) if parent_key else None
+            self._open[key] = {
+                "trace_id": trace_id,
+                "span_id": next(self._ids),
+                "parent_id": parent["span_id"] if parent else None,
+                "kind": kind,
+                "name": name,
+                "start": time.time(),
+                "_started": time.perf_counter(),
+                **attrs,
+            }
+            if len(self._open) > _MAX_OPEN_SPANS:
+                del self._open[next(iter(self._open))]
+
+    def _end(self, key: Tuple, status: str = "ok", **attrs):
+        with self._lock:
+            span = self._open.pop(key, None)
+        if span is None:
+            return
+        span["duration_ms"] = round((time.perf_counter() - span.pop("_started")) * 1000, 3)
+        span["status"] = status
+        span.update(attrs)
+        self._buffer.append(span)
+        file_logger = self._file()
+        if file_logger is not None:
+            file_logger.info(json.dumps(span, default=str))
+
+    # --- Callbacks ---
+
+    def before_agent_callback(self, callback_context) -> None:
+        invocation_id = callback_context.invocation_id
+        self._start(("agent", invocation_id, callback_context.agent_name), invocation_id, "agent", callback_context.agent_name)
+        return None
+
+    def _traced_before_agent(self, callbacks: list):
+        """Wraps an agent's before_agent_callbacks so a turn they answer themselves still ends its span."""
+        async def before_agent_callback(callback_context):
+            self.before_agent_callback(callback_context)
+            for callback in callbacks:
+                result = callback(callback_context)
+                if inspect.isawaitable(result):
+                    result = await result
+                if result is not None:
+                    # after_agent_callback does not run for a skipped agent
+                    self._end(("agent", callback_context.invocation_id, callback_context.agent_name), status="answered_by_callback")
+                    return result
+            return None
+        return before_agent_callback
+
+    def after_agent_callback(self, callback_context) -> None:
+        self._end(("agent", callback_context.invocation_id, callback_context.agent_name))
+        return None
+
+    def before_model_callback(self, callback_context, llm_request) -> None:
+        invocation_id, agent_name = callback_context.invocation_id, callback_context.agent_name
+        self._start(
+            ("model", invocation_id, agent_name), invocation_id, "model", llm_request.model or "model",
+            parent_key=("agent", invocation_id, agent_name), agent=agent_name,
+        )
+        return None
+
+    def after_model_callback(self, callback_context, llm_response) -> None:
+        if llm_response.partial:
+            return None
+        usage = llm_response.usage_metadata
+        self._end(
+            ("model", callback_context.invocation_id, callback_context.agent_name),
+            status="error" if llm_response.error_code else "ok",
+            input_tokens=usage.prompt_token_count if usage else None,
+            output_tokens=usage.candidates_token_count if usage else None,
+        )
+        return None
+
+    def on_model_error_callback(self, callback_context, llm_request, error: Exception) -> None:
+        self._end(("model", callback_context.invocation_id, callback_context.agent_name), status="error", error=repr(error))
+        return None
+
+    def before_tool_callback(self, tool, args: Dict[str, Any], tool_context) -> None:
+        invocation_id = tool_context.invocation_id
+        self._start(
+            ("tool", tool_context.function_call_id), invocation_id, "tool", tool.name,
+            parent_key=("agent", invocation_id, tool_context.agent_name), agent=tool_context.agent_name,
+            request_bytes=_payload_bytes(args),
+        )
+        return None
+
+    def after_tool_callback(self, tool, args: Dict[str, Any], tool_context, tool_response: Any) -> None:
+        failed = isinstance(tool_response, dict) and tool_response.get("status") == "error"
+        self._end(("tool", tool_context.function_call_id), status="error" if failed else "ok", response_bytes=_payload_bytes(tool_response))
+        return None
+
+    def on_tool_error_callback(self, tool, args: Dict[str, Any], tool_context, error: Exception) -> None:
+        self._end(("tool", tool_context.function_call_id), status="error", error=repr(error))
+        return None
+
+    def instrument(self, agent):
+        """Adds the tracing callbacks to `agent` and its sub-agents, ahead of their existing callbacks."""
+        if not self.enabled:
+            return agent
+        existing = agent.before_agent_callback
+        existing = list(existing) if isinstance(existing, list) else [existing] if existing else []
+        agent.before_agent_callback = self._traced_before_agent(existing)
+        hooks = [("after_agent_callback", self.after_agent_callback)]
+        if hasattr(agent, "before_model_callback"):
+            hooks += [
+                ("before_model_callback", self.before_model_callback),
+                ("after_model_callback", self.after_model_callback),
+                ("on_model_error_callback", self.on_model_error_callback),
+                ("before_tool_callback", self.before_tool_callback),
+                ("after_tool_callback", self.after_tool_callback),
+                ("on_tool_error_callback", self.on_tool_error_callback),
+            ]
+        for attr, hook in hooks:
+            current = getattr(agent, attr)
+            current = list(current) if isinstance(current, list) else [current] if current else []
+            # Tracing callbacks always return None, so running first never stops the others.
+            setattr(agent, attr, [hook] + current)
+        for sub_agent in agent.sub_agents:
+            self.instrument(sub_agent)
+        return agent
+
+    # --- Queries ---
+
+    def recent(
+        self,
+        limit: int = 100,
+        trace_id: Optional[str] = None,
+        kind: Optional[str] = None,
+        name: Optional[str] = None,
+        min_duration_ms: float = 0,
+    ) -> List[dict]:
+        """Most recent finished spans first, optionally filtered."""
+        spans = [
+            s for s in reversed(list(self._buffer))
+            if (trace_id is None or s["trace_id"] == trace_id)
+            and (kind is None or s["kind"] == kind)
+            and (name is None or s["name"] == name)
+            and s["duration_ms"] >= min_duration_ms
+        ]
+        return spans[:max(0, limit)]
+
+    def summary(self) -> dict:
+        """Span count, total and max duration per (kind, name) over the ring buffer."""
+        totals: Dict[str, dict] = {}
+        for span in list(self._buffer):
+            entry = totals.setdefault(f"{span['kind']}:{span['name']}", {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + span["duration_ms"], 3)
+            entry["max_ms"] = max(entry["max_ms"], span["duration_ms"])
+        return totals
+
+
+def read_trace_file(path: str = TRACE_FILE, limit: int = 100) -> List[dict]:
+    """Last `limit` spans from the current JSONL trace file, most recent first."""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        lines = deque(f, maxlen=max(0, limit))
+    spans = []
+    for line in reversed(lines):
+        try:
+            spans.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return spans
+
+
+tracer = Tracer()
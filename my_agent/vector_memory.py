@@ -0,0 +1,310 @@
+"""Local vector memory behind PreloadMemoryTool.
+
+Memories are short texts: one per conversation turn ("User: ... / Assistant:
+..."), one per saved report summary, or any entry added directly. Each is
+embedded with a deterministic hashed bag-of-words embedder and kept in one
+NumPy matrix per user, so a search only scores that user's rows with a single
+matrix-vector product. A report summary is kept in the shard of the user who
+saved the report, like their turns.
+
+Entries and their vectors are persisted to SQLite. A shard is loaded from it
+on first use and then only picks up rows added since, so updates from other
+processes are seen without reloading everything.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.events import Event
+from google.adk.memory import BaseMemoryService
+from google.adk.memory.base_memory_service import SearchMemoryResponse
+from google.adk.memory.memory_entry import MemoryEntry
+from google.adk.sessions import Session
+from google.genai import types
+
+from .report_index import tokenize
+
+MEMORY_DB_PATH = os.environ.get(
+    "MEMORY_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), 'datasets', 'memory.sqlite3')
+)
+MEMORY_EMBED_DIM = int(os.environ.get("MEMORY_EMBED_DIM", "256"))
+MEMORY_TOP_K = int(os.environ.get("MEMORY_TOP_K", "5"))
+MEMORY_MIN_SCORE = float(os.environ.get("MEMORY_MIN_SCORE", "0.1"))
+# Longest text kept per memory; turns with long tool output are cut to this.
+MEMORY_MAX_CHARS = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    text TEXT NOT NULL,
+    author TEXT,
+    timestamp TEXT,
+    metadata TEXT NOT NULL DEFAULT '{}',
+    vector BLOB NOT NULL,
+    UNIQUE (app_name, user_id, key)
+);
+CREATE INDEX IF NOT EXISTS memories_by_shard ON memories (app_name, user_id, seq);
+"""
+
+
+class HashingEmbedder:
+    """Signed feature hashing of unigrams and bigrams, with sublinear term weights. No model, no network."""
+
+    def __init__(self, dim: int = MEMORY_EMBED_DIM):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        tokens = tokenize(text)
+        features = Counter(tokens)
+        features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in features.items():
+            digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            weight = (1 + math.log(count)) * (0.5 if " " in feature else 1.0)
+            vector[digest % self.dim] += weight if digest >> 63 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+# (key, text, author, timestamp, metadata JSON), as stored; turned into a MemoryEntry only when found
+_Row = Tuple[str, str, Optional[str], Optional[str], str]
+
+
+def _entry(row: _Row) -> MemoryEntry:
+    key, text, author, timestamp, metadata = row
+    return MemoryEntry(
+        id=key,
+        content=types.Content(role="user" if author == "user" else "model", parts=[types.Part(text=text)]),
+        author=author,
+        timestamp=timestamp,
+        custom_metadata=json.loads(metadata),
+    )
+
+
+class _Shard:
+    """One user's memories: a growable matrix of unit vectors plus the rows they belong to."""
+
+    def __init__(self, dim: int):
+        self.matrix = np.zeros((64, dim), dtype=np.float32)
+        self.entries: List[_Row] = []
+        self.rows: Dict[str, int] = {}
+        self.last_seq = 0
+
+    def upsert(self, key: str, vector: np.ndarray, entry: _Row):
+        row = self.rows.get(key)
+        if row is None:
+            row = self.rows[key] = len(self.entries)
+            self.entries.append(entry)
+            if row >= len(self.matrix):
+                self.matrix = np.vstack([self.matrix, np.zeros_like(self.matrix)])
+        else:
+            self.entries[row] = entry
+        self.matrix[row] = vector
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[float, MemoryEntry]]:
+        n = len(self.entries)
+        if not n:
+            return []
+        scores = self.matrix[:n] @ query
+        top = np.argpartition(-scores, k - 1)[:k] if n > k else np.arange(n)
+        return [(float(scores[i]), _entry(self.entries[i])) for i in top]
+
+
+def _text(content: Optional[types.Content]) -> str:
+    if not content or not content.parts:
+        return ""
+    return " ".join(p.text for p in content.parts if p.text and not p.thought)
+
+
+def _turns(events: Sequence[Event]) -> Dict[str, Tuple[str, Optional[float]]]:
+    """Groups events by invocation into "User: ... / Assistant: ..." texts, with each turn's first timestamp."""
+    turns: Dict[str, List[str]] = {}
+    started: Dict[str, float] = {}
+    for event in events:
+        text = _text(event.content)
+        if not text or event.partial:
+            continue
+        speaker = "User" if event.author == "user" else "Assistant"
+        turns.setdefault(event.invocation_id, []).append(f"{speaker}: {text}")
+        started.setdefault(event.invocation_id, event.timestamp)
+    return {
+        invocation_id: ("\n".join(lines)[:MEMORY_MAX_CHARS], started.get(invocation_id))
+        for invocation_id, lines in turns.items()
+    }
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp)) if timestamp else None
+
+
+class VectorMemoryService(BaseMemoryService):
+    def __init__(self, db_path: str = MEMORY_DB_PATH, embedder: Optional[HashingEmbedder] = None):
+        self.db_path = db_path
+        self.embedder = embedder or HashingEmbedder()
+        self._shards: Dict[Tuple[str, str], _Shard] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # --- Storage ---
+
+    def _write(self, app_name: str, user_id: str, rows: List[Tuple[str, str, Optional[str], Optional[str], dict]]):
+        """Upserts (key, text, author, timestamp, metadata) rows. A changed row gets a new seq, so shards reload it."""
+        rows = [row for row in rows if row[1]]
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN")
+            for key, text, author, timestamp, metadata in rows:
+                existing = conn.execute(
+                    "SELECT text FROM memories WHERE app_name = ? AND user_id = ? AND key = ?", (app_name, user_id, key)
+                ).fetchone()
+                if existing is not None and existing[0] == text:
+                    continue
+                conn.execute("DELETE FROM memories WHERE app_name = ? AND user_id = ? AND key = ?", (app_name, user_id, key))
+                conn.execute(
+                    "INSERT INTO memories (app_name, user_id, key, text, author, timestamp, metadata, vector) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (app_name, user_id, key, text, author, timestamp, json.dumps(metadata, default=str),
+                     self.embedder.embed(text).tobytes()),
+                )
+            conn.execute("COMMIT")
+
+    def _shard(self, app_name: str, user_id: str) -> _Shard:
+        """Returns the shard with any rows written since it was last read, by this or another process."""
+        with self._lock:
+            shard = self._shards.get((app_name, user_id))
+            if shard is None:
+                shard = self._shards[(app_name, user_id)] = _Shard(self.embedder.dim)
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT seq, key, text, author, timestamp, metadata, vector FROM memories "
+                    "WHERE app_name = ? AND user_id = ? AND seq > ? ORDER BY seq",
+                    (app_name, user_id, shard.last_seq),
+                ).fetchall()
+            for seq, key, text, author, timestamp, metadata, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                if len(vector) != self.embedder.dim:
+                    # Stored with another MEMORY_EMBED_DIM
+                    vector = self.embedder.embed(text)
+                shard.upsert(key, vector, (key, text, author, timestamp, metadata))
+                shard.last_seq = seq
+            return shard
+
+    # --- BaseMemoryService ---
+
+    async def add_session_to_memory(self, session: Session) -> None:
+        await self.add_events_to_memory(
+            app_name=session.app_name, user_id=session.user_id, events=session.events, session_id=session.id
+        )
+
+    async def add_events_to_memory(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        events: Sequence[Event],
+        session_id: Optional[str] = None,
+        custom_metadata: Optional[Mapping[str, object]] = None,
+    ) -> None:
+        rows = [
+            # No author: the text already names who said what
+            (f"turn:{session_id}:{invocation_id}", text, None, _iso(started),
+             {"session_id": session_id, **(custom_metadata or {})})
+            for invocation_id, (text, started) in _turns(events).items()
+        ]
+        if rows:
+            # SQLite writes and embedding block, so they run off the event loop
+            await asyncio.to_thread(self._write, app_name, user_id, rows)
+
+    async def add_memory(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        memories: Sequence[MemoryEntry],
+        custom_metadata: Optional[Mapping[str, object]] = None,
+    ) -> None:
+        rows = [
+            (memory.id or f"memory:{hashlib.sha1(_text(memory.content).encode()).hexdigest()}", _text(memory.content),
+             memory.author, memory.timestamp, {**memory.custom_metadata, **(custom_metadata or {})})
+            for memory in memories if _text(memory.content)
+        ]
+        if rows:
+            await asyncio.to_thread(self._write, app_name, user_id, rows)
+
+    def add_report_summary(self, app_name: str, user_id: str, filename: str, summary: dict):
+        """Adds or replaces the memory for one report's summary, seen only by the user who saved it."""
+        text = f"Medical report {filename}: " + "; ".join(f"{k}: {v}" for k, v in summary.items() if v)
+        self._write(app_name, user_id, [(f"report:{filename}", text[:MEMORY_MAX_CHARS], "report", summary.get("date"), {"filename": filename})])
+
+    def search(self, app_name: str, user_id: str, query: str, k: int = MEMORY_TOP_K, min_score: float = MEMORY_MIN_SCORE) -> List[Tuple[float, MemoryEntry]]:
+        """Top-k (score, entry) pairs by cosine similarity over the user's shard, best first."""
+        vector = self.embedder.embed(query)
+        if not vector.any():
+            return []
+        hits = [h for h in self._shard(app_name, user_id).search(vector, k) if h[0] >= min_score]
+        return sorted(hits, key=lambda h: h[0], reverse=True)
+
+    async def search_memory(self, *, app_name: str, user_id: str, query: str) -> SearchMemoryResponse:
+        # Loading a shard reads SQLite, so it runs off the event loop
+        hits = await asyncio.to_thread(self.search, app_name, user_id, query)
+        return SearchMemoryResponse(memories=[entry for _, entry in hits])
+
+
+_services: Dict[str, VectorMemoryService] = {}
+_services_lock = threading.Lock()
+
+
+def get_memory_service(db_path: str = MEMORY_DB_PATH) -> VectorMemoryService:
+    """One service per database file in each process, so the agent and the ADK server share shards."""
+    db_path = os.path.abspath(db_path)
+    with _services_lock:
+        if db_path not in _services:
+            _services[db_path] = VectorMemoryService(db_path)
+        return _services[db_path]
+
+
+def memory_service_factory(uri: str, **kwargs) -> VectorMemoryService:
+    """Factory for ADK's service registry: `vectormemory:///path/to/memory.sqlite3`, or the default path."""
+    path = uri.split("://", 1)[1] if "://" in uri else ""
+    if path.startswith("/"):
+        path = path[1:]
+    return get_memory_service(path or MEMORY_DB_PATH)
+
+
+async def remember_turn(callback_context: CallbackContext, reply: Optional[types.Content] = None) -> None:
+    """after_agent_callback that adds the turn that just finished to the runner's memory service, if it has one.
+
+    A before_agent_callback that answers the turn itself passes its `reply`, which is not in the session yet.
+    """
+    events = [e for e in callback_context.session.events if e.invocation_id == callback_context.invocation_id]
+    if reply is not None:
+        events.append(Event(invocation_id=callback_context.invocation_id, author=callback_context.agent_name, content=reply))
+    try:
+        await callback_context.add_events_to_memory(events=events)
+    except (ValueError, NotImplementedError):
+        # No memory service configured, or one that only ingests whole sessions
+        pass
+    return None
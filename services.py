@@ -0,0 +1,11 @@
+"""Custom ADK services, loaded by `adk web` / `adk api_server` when run from this folder."""
+from google.adk.cli.service_registry import get_service_registry
+
+from my_agent.session_store import session_service_factory
+from my_agent.vector_memory import memory_service_factory
+
+# adk api_server --session_service_uri cachedsqlite:///datasets/sessions.sqlite3 .
+get_service_registry().register_session_service("cachedsqlite", session_service_factory)
+
+# adk api_server --memory_service_uri vectormemory:///datasets/memory.sqlite3 .
+get_service_registry().register_memory_service("vectormemory", memory_service_factory)